@@ -1,17 +1,39 @@
-from flask import Flask, render_template, send_file, jsonify, request, session, send_from_directory, make_response
-import mido
+from flask import Flask, render_template, send_file, jsonify, request, session, make_response, Response, stream_with_context, g
 import random
 import os
 import subprocess
 import time
 import string
 from flask_cors import CORS
+from render_queue import RenderQueue, RenderJobStore, render_with_timidity, render_coalesced, STATUS_QUEUED
+from synth import render_with_synth, get_synthesizer, warm_synthesizer
+from renderer_pool import RendererPool
+from singleflight import SingleFlight
+from render_cache import RenderCache
+from janitor import ArtifactIndex, Janitor
+from artifact_store import ArtifactStore
 import datetime
 import logging
+import io
+import threading
+import re
+import base64
+import json
+import zipfile
+from collections import OrderedDict
+from functools import lru_cache
+import itertools
+import atexit
 
 app = Flask(__name__)
 
-from flask_session import Session
+from session_backend import configure_session
+from midi_timeline import NoteEvent, build_note_timeline, DEFAULT_TEMPO
+from melody_generation import (
+    NOTE_COUNT_RANGE, VELOCITY_RANGE, DURATIONS, NOTE_CLAMP_RANGE, SCALES, get_scale_table,
+    TICKS_PER_BEAT, encode_smf, generate_batch, artifact_id_for,
+)
+from metrics import LabeledHistogram, TimedSessionInterface, render_gauges, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # ロギング設定
 logging.basicConfig(
@@ -23,10 +45,61 @@ UPLOAD_FOLDER = 'static'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# セッションの設定
+# セッションの設定（SESSION_BACKEND: 'filesystem' / 'memory' / 'cookie'）
+# 'memory' はプロセス内に保持するため、ワーカー1つでのみ使える（複数ワーカーでは 'filesystem' か 'cookie'）
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'filesystem')
 app.config['SESSION_TYPE'] = 'filesystem'
+app.config['SESSION_LRU_SIZE'] = int(os.environ.get('SESSION_LRU_SIZE', 10000))
 app.config['PERMANENT_SESSION_LIFETIME'] = datetime.timedelta(hours=1)
-Session(app)
+
+# 処理段階ごと・エンドポイントごとの所要時間（/metrics で公開）
+stage_timings = LabeledHistogram('melody_stage_duration_seconds', 'Time spent in each request processing stage.', 'stage')
+request_timings = LabeledHistogram('melody_request_duration_seconds', 'Request latency by endpoint.', 'endpoint')
+
+configure_session(app)
+app.session_interface = TimedSessionInterface(app.session_interface, stage_timings)
+
+# 生成ファイルのクリーンアップ間隔（秒、0で無効）と UPLOAD_FOLDER の容量上限（0で無制限）
+app.config['JANITOR_INTERVAL'] = float(os.environ.get('JANITOR_INTERVAL', 300))
+app.config['JANITOR_MAX_BYTES'] = int(os.environ.get('JANITOR_MAX_BYTES', 1024 * 1024 * 1024))
+
+# 成果物ストアのシャーディング階層数（UPLOAD_FOLDER/ab/cd/... の階層）
+app.config['ARTIFACT_SHARD_DEPTH'] = int(os.environ.get('ARTIFACT_SHARD_DEPTH', 2))
+
+# 生成中の成果物を /random.mp3 が待つ最大秒数
+app.config['ARTIFACT_READY_TIMEOUT'] = float(os.environ.get('ARTIFACT_READY_TIMEOUT', 10))
+# 別のワーカーが投入したレンダリングジョブの状態を確認する間隔（秒）
+RENDER_STATUS_POLL_INTERVAL = 0.05
+
+# 音声レンダラー（'none' または AUDIO_RENDERERS のキー: 'timidity', 'synth'）とレンダリングワーカー数
+app.config['AUDIO_RENDERER'] = os.environ.get('AUDIO_RENDERER', 'none')
+app.config['RENDER_WORKERS'] = int(os.environ.get('RENDER_WORKERS', 2))
+
+# レンダリング設定とレンダリング結果キャッシュの容量上限（0で無効）
+app.config['AUDIO_SAMPLE_RATE'] = int(os.environ.get('AUDIO_SAMPLE_RATE', 44100))
+app.config['RENDER_CACHE_MAX_BYTES'] = int(os.environ.get('RENDER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# 常駐レンダリングワーカー数（0で無効）と、作り直すまでのジョブ数・メモリ増加量（MB）の上限
+app.config['RENDER_POOL_SIZE'] = int(os.environ.get('RENDER_POOL_SIZE', 0))
+app.config['RENDER_POOL_MAX_JOBS'] = int(os.environ.get('RENDER_POOL_MAX_JOBS', 1000))
+app.config['RENDER_POOL_MAX_MEMORY_MB'] = int(os.environ.get('RENDER_POOL_MAX_MEMORY_MB', 256))
+
+# 内蔵シンセサイザーで常駐ワーカーに分けて並列に合成する区間の長さ（秒、0で分割しない）
+app.config['RENDER_SEGMENT_SECONDS'] = float(os.environ.get('RENDER_SEGMENT_SECONDS', 15))
+
+# /random.mp3 で合成しながら音声を送るか（?stream=1/0 で上書き可）と、1回に送る長さ（秒）
+app.config['AUDIO_STREAMING'] = os.environ.get('AUDIO_STREAMING', 'false').lower() in ('1', 'true', 'yes', 'on')
+app.config['AUDIO_STREAM_CHUNK_SECONDS'] = float(os.environ.get('AUDIO_STREAM_CHUNK_SECONDS', 0.25))
+
+# MIDIの保存先: 'disk' はUPLOAD_FOLDERへ書き出し、'memory' はプロセス内バッファのみで保持
+# 'memory' のバッファは他のワーカープロセスから見えないため、ワーカー1つ（gunicorn --workers 1）でのみ使える
+# （複数ワーカーでの起動は gunicorn.conf.py の on_starting で拒否する）
+app.config['MIDI_STORAGE'] = os.environ.get('MIDI_STORAGE', 'disk')
+# メモリ保持するMIDIバッファの最大数（古いものから破棄）
+app.config['MIDI_BUFFER_LIMIT'] = int(os.environ.get('MIDI_BUFFER_LIMIT', 1024))
+
+# 一括生成（/generate_batch）で1リクエストあたりに生成できるメロディ数の上限
+app.config['BATCH_MAX_COUNT'] = int(os.environ.get('BATCH_MAX_COUNT', 10000))
 
 # 本番環境では、環境変数からセッションキーを取得
 import datetime
@@ -48,17 +121,44 @@ port = int(os.environ.get('PORT', 5001))
 def is_safe_path(filepath):
     """ファイルパスがUPLOAD_FOLDER内にあることを確認"""
     try:
-        base = os.path.abspath(UPLOAD_FOLDER)
+        base = os.path.abspath(app.config['UPLOAD_FOLDER'])
         target = os.path.abspath(filepath)
-        return target.startswith(base) and os.path.isfile(target)
+        return target.startswith(base + os.sep) and os.path.isfile(target)
     except (ValueError, OSError):
         return False
 
+# 生成ファイルの作成時刻の索引と、期限切れ・容量超過分を削除するバックグラウンド処理
+artifact_index = ArtifactIndex()
+janitor = Janitor(
+    UPLOAD_FOLDER,
+    artifact_index,
+    max_age=app.config['PERMANENT_SESSION_LIFETIME'].total_seconds(),
+    max_bytes=app.config['JANITOR_MAX_BYTES'],
+    interval=app.config['JANITOR_INTERVAL'],
+    exclude=('render_cache', 'locks'),  # レンダリングキャッシュは自身の容量上限で管理、ロックファイルは使い回す
+)
+if app.config['JANITOR_INTERVAL'] > 0:
+    janitor.start()
+
+# UPLOAD_FOLDER ごとの成果物ストア（ファイルはIDのハッシュでサブディレクトリに分散）
+_artifact_stores = {}
+_artifact_stores_lock = threading.Lock()
+
+def get_artifact_store():
+    """現在の UPLOAD_FOLDER に対応する成果物ストアを返す"""
+    root = app.config['UPLOAD_FOLDER']
+    with _artifact_stores_lock:
+        store = _artifact_stores.get(root)
+        if store is None:
+            store = _artifact_stores[root] = ArtifactStore(root, depth=app.config['ARTIFACT_SHARD_DEPTH'])
+        return store
+
 def safe_remove_file(filepath):
     """安全にファイルを削除"""
     try:
         if is_safe_path(filepath):
-            os.remove(filepath)
+            get_artifact_store().remove(filepath)
+            artifact_index.discard(filepath)
             logger.info(f"Deleted file: {filepath}")
             return True
         else:
@@ -71,100 +171,442 @@ def safe_remove_file(filepath):
         logger.error(f"Error deleting {filepath}: {e}")
         return False
 
-def generate_random_midi(scale, base_note, filename_prefix):
-    # ファイル名に時分秒とランダム文字列を追加
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    random_str = ''.join(random.choices(string.ascii_letters + string.digits, k=6))
-    filename = f"{filename_prefix}_{timestamp}_{random_str}.mid"
-    mid = mido.MidiFile()
-    track = mido.MidiTrack()
-    mid.tracks.append(track)
+def register_scale(name, intervals):
+    """スケールを登録（同名は上書き）し、確率テーブルのキャッシュを破棄する"""
+    if not intervals or not all(isinstance(i, int) and 0 <= i < 12 for i in intervals):
+        raise ValueError("intervals must be integers between 0 and 11")
+    intervals = tuple(sorted(set(intervals)))
+    SCALES[name] = intervals
+    VALID_SCALES.add(name)
+    get_scale_table.cache_clear()
+    _generate_seeded_midi.cache_clear()
+    logger.info(f"Scale '{name}' registered: {intervals}")
 
-    # ピアノの音色を設定
-    track.append(mido.Message('program_change', program=0, time=0))
+class ArtifactReadiness:
+    """生成中の成果物を追跡し、完了を待てるようにする"""
 
-    num_notes = random.randint(10, 30)
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = {}
+
+    def begin(self, key):
+        """成果物の生成開始を記録"""
+        with self._condition:
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+    def finish(self, key):
+        """成果物の生成完了（または失敗）を通知"""
+        with self._condition:
+            count = self._pending.get(key, 0) - 1
+            if count > 0:
+                self._pending[key] = count
+            else:
+                self._pending.pop(key, None)
+            self._condition.notify_all()
+
+    def is_pending(self, key):
+        with self._condition:
+            return key in self._pending
+
+    def wait(self, key, timeout):
+        """生成中であれば完了まで最大 timeout 秒待つ。完了済みならTrue"""
+        with self._condition:
+            return self._condition.wait_for(lambda: key not in self._pending, timeout=timeout)
+
+
+artifact_readiness = ArtifactReadiness()
+
+
+def _build_random_midi(scale, base_note, rng=random):
+    """ランダムなメロディを生成し、(SMFバイト列, ノートのタイムライン) を返す
+
+    rng に random.Random インスタンスを渡すと、その乱数列で決定的に生成する。
+    """
+    num_notes = rng.randint(*NOTE_COUNT_RANGE)
     prev_note = None
-    if scale == "major":
-        scale_notes = [0, 2, 4, 5, 7, 9, 11]  # Cメジャースケールの相対音程
-    elif scale == "minor":
-        scale_notes = [0, 2, 3, 5, 7, 8, 10]  # Cマイナースケールの相対音程
-    else:
-        scale_notes = [0, 2, 4, 5, 7, 9, 11]  # デフォルトはCメジャー
-    note_probabilities = {}
-    for i in range(12):
-        if i in scale_notes:
-            note_probabilities[i] = 0.95 / len(scale_notes)  # スケールの音程は80%の確率で均等に選択
-        else:
-            note_probabilities[i] = 0.05 / (12 - len(scale_notes))  # それ以外の音程は20%の確率で均等に選択
+    table = get_scale_table(scale)
 
+    pitches = []
+    velocities = []
+    durations = []
     for _ in range(num_notes):
-        velocity = random.randint(40, 100)
-        duration = random.choice([120, 240, 480])  # Quarter, half, whole notes
+        velocity = rng.randint(*VELOCITY_RANGE)
+        duration = rng.choice(DURATIONS)
         if prev_note is not None:
             # 確率に基づいて音程を選択
-            note_offset = random.choices(list(note_probabilities.keys()), weights=list(note_probabilities.values()), k=1)[0]
-            note = max(24, min(base_note + note_offset, 108))
+            note_offset = rng.choices(table.offsets, cum_weights=table.cum_weights, k=1)[0]
+            note = max(NOTE_CLAMP_RANGE[0], min(base_note + note_offset, NOTE_CLAMP_RANGE[1]))
         else:
             # 最初の音符は確率に基づいて選択
-            note_offset = random.choices(list(note_probabilities.keys()), weights=list(note_probabilities.values()), k=1)[0]
+            note_offset = rng.choices(table.offsets, cum_weights=table.cum_weights, k=1)[0]
             note = base_note + note_offset  # C4を基準とする
-        track.append(mido.Message('note_on', note=note, velocity=velocity, time=0))
-        track.append(mido.Message('note_off', note=note, velocity=0, time=duration))
+        pitches.append(note)
+        velocities.append(velocity)
+        durations.append(duration)
         prev_note = note
 
+    # ピアノの音色（program 0）でエンコードし、同じノート列からタイムラインを作る（SMFを解析し直さない）
+    midi_bytes = encode_smf(pitches, velocities, durations)
+    return midi_bytes, sequence_timeline(pitches, velocities, durations)
+
+
+def generate_random_midi_timeline(scale, base_note):
+    """ディスクを介さずにMIDIを生成し、(SMFバイト列, ノートのタイムライン) を返す"""
+    return _build_random_midi(scale, base_note)
+
+
+def generate_random_midi_bytes(scale, base_note):
+    """ディスクを介さずにMIDIを生成し、(SMFバイト列, notes) を返す"""
+    midi_bytes, timeline = generate_random_midi_timeline(scale, base_note)
+    return midi_bytes, timeline_notation(timeline)
+
+
+@lru_cache(maxsize=1024)
+def _generate_seeded_midi(scale, base_note, seed):
+    midi_bytes, timeline = _build_random_midi(scale, base_note, random.Random(seed))
+    return midi_bytes, tuple(timeline), tuple(timeline_notation(timeline))
+
+
+def generate_seeded_midi(scale, base_note, seed):
+    """シードから決定的にMIDIを生成し、(SMFバイト列, notes) を返す
+
+    (scale, base_note, seed) ごとに結果をメモ化するため、同じシードは再生成・再解析しない。
+    """
+    midi_bytes, _, notes = _generate_seeded_midi(scale, base_note, seed)
+    return midi_bytes, list(notes)
+
+
+def _generate_melody(scale, base_note_value, seed_value=None):
+    """seed の有無に応じてメロディを生成し、(SMFバイト列, notes, ノートのタイムライン) を返す"""
+    with stage_timings.time('generation'):
+        if seed_value is not None:
+            midi_bytes, timeline, notes = _generate_seeded_midi(scale, base_note_value, seed_value)
+            return midi_bytes, list(notes), timeline
+        midi_bytes, timeline = generate_random_midi_timeline(scale, base_note_value)
+        return midi_bytes, timeline_notation(timeline), timeline
+
+
+def _melody_result(artifact_id, notes, seed_value, timeline):
+    """/generate_music のレスポンスを組み立てる
+
+    seed を指定した場合はそれを含め、events パラメータが指定されていれば
+    生成時のタイムラインから再生用のイベント列を加える。
+    """
+    result = {'wav_file': 'mp3_file', 'midi_file': '/download/midi', 'notes': notes,
+              'artifact_id': artifact_id, 'artifact_url': f'/artifacts/{artifact_id}.mid'}
+    if seed_value is not None:
+        result['seed'] = seed_value
+    if request.form.get('events', '').strip().lower() in TRUTHY_VALUES:
+        result['events'] = playback_events(timeline)
+    return result
 
-    mid.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-    filename = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+
+def save_midi_bytes(midi_bytes, filename_prefix):
+    """MIDIバイト列を成果物ストアに書き出し、ファイルパスを返す"""
+    # ファイル名に時分秒とランダム文字列を追加
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    random_str = ''.join(random.choices(string.ascii_letters + string.digits, k=6))
+    name = f"{filename_prefix}_{timestamp}_{random_str}"
+
+    store = get_artifact_store()
+    filename = store.path_for(name)
+    artifact_readiness.begin(filename)
+    try:
+        # 一時ファイルに書いてからリネームし、存在するファイルは常に完全な状態にする
+        store.write(name, midi_bytes)
+        artifact_index.record(filename, len(midi_bytes), time.time())
+    finally:
+        artifact_readiness.finish(filename)
     logger.info(f"MIDI file '{filename}' created.")
     return filename
 
 
+def generate_random_midi(scale, base_note, filename_prefix):
+    midi_bytes, _ = _build_random_midi(scale, base_note)
+    return save_midi_bytes(midi_bytes, filename_prefix)
+
+
+BATCH_CHUNK_SIZE = 256  # iter_batch_melodies が1回にまとめて生成する数
+
+def iter_batch_melodies(scales, base_notes, count, seed=None, chunk_size=BATCH_CHUNK_SIZE):
+    """(scale, base_note) の全組み合わせについて count 個ずつメロディを生成し、
+    (通し番号, scale, base_note, melody) を順に返す
+
+    generate_batch で chunk_size 個ずつまとめて生成するため、count が大きくてもメモリ使用量は一定。
+    seed を指定すると組み合わせ・チャンクごとに派生したシードを使い、結果は決定的になる。
+    """
+    index = 0
+    for grid_index, (scale, base_note) in enumerate(itertools.product(scales, base_notes)):
+        for chunk_index, chunk_start in enumerate(range(0, count, chunk_size)):
+            chunk_seed = None if seed is None else (seed, grid_index, chunk_index)
+            for melody in generate_batch(scale, base_note, min(chunk_size, count - chunk_start), chunk_seed):
+                yield index, scale, base_note, melody
+                index += 1
+
+
+class _ZipChunkWriter:
+    """ZipFile の書き込み先。書かれたバイト列を溜めておき、take() で取り出す
+
+    tell/seek を持たないため、ZipFile はシーク不可のストリームとして扱い、
+    各エントリのサイズとCRCをデータ記述子としてエントリの後ろに書く。
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def iter_zip_stream(entries, compression=zipfile.ZIP_DEFLATED):
+    """(ファイル名, バイト列) の列からZIPアーカイブを組み立て、エントリごとにバイト列を返す
+
+    アーカイブ全体を一時ファイルやメモリに保持しないため、エントリ数によらずメモリ使用量は一定
+    （セントラルディレクトリのエントリ情報のみ増える）。
+    """
+    writer = _ZipChunkWriter()
+    with zipfile.ZipFile(writer, 'w', compression=compression) as archive:
+        for name, data in entries:
+            archive.writestr(zipfile.ZipInfo(name, date_time=time.localtime()[:6]), data, compress_type=compression)
+            chunk = writer.take()
+            if chunk:
+                yield chunk
+    chunk = writer.take()
+    if chunk:
+        yield chunk
+
+
+# 成果物ID（MIDIバイト列のハッシュ）とコンテンツアドレス型の保存先
+ARTIFACT_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+ARTIFACT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def _artifact_path(artifact_id):
+    return get_artifact_store().path_for(artifact_id)
+
+def publish_artifact(midi_bytes, source_path=None):
+    """MIDIを成果物として公開し、成果物IDを返す
+
+    source_path が同じ内容のファイルであれば、コピーせずにハードリンクを張る。
+    """
+    artifact_id = artifact_id_for(midi_bytes)
+    store = get_artifact_store()
+    path = store.lookup(artifact_id)
+    if path is not None:
+        # 再利用した成果物は新しく渡したものとして扱い、クリーンアップの期限を延ばす
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            pass  # 直前に削除された場合は書き直す
+        else:
+            artifact_index.record(path, len(midi_bytes), now)
+            return artifact_id
+    path = store.write(artifact_id, midi_bytes, link_from=source_path)
+    artifact_index.record(path, len(midi_bytes), time.time())
+    return artifact_id
+
+
+# メモリ上のMIDIバッファ（MIDI_STORAGE='memory' 時に使用）
+_midi_buffers = OrderedDict()
+_midi_buffers_lock = threading.Lock()
+
+def store_midi_buffer(midi_bytes):
+    """MIDIバイト列をプロセス内に保持し、バッファID（成果物ID）を返す"""
+    buffer_id = artifact_id_for(midi_bytes)
+    with _midi_buffers_lock:
+        _midi_buffers[buffer_id] = midi_bytes
+        _midi_buffers.move_to_end(buffer_id)
+        while len(_midi_buffers) > app.config['MIDI_BUFFER_LIMIT']:
+            _midi_buffers.popitem(last=False)
+    return buffer_id
+
+def get_midi_buffer(buffer_id):
+    """バッファIDに対応するMIDIバイト列を返す（存在しなければNone）"""
+    with _midi_buffers_lock:
+        return _midi_buffers.get(buffer_id)
+
+def discard_midi_buffer(buffer_id):
+    """MIDIバッファを破棄"""
+    with _midi_buffers_lock:
+        return _midi_buffers.pop(buffer_id, None) is not None
+
+
+# 音声レンダラー（AUDIO_RENDERER で選択。'none' はMIDIをそのまま配信）
+AUDIO_RENDERERS = {
+    'timidity': render_with_timidity,
+    'synth': render_with_synth,
+}
+# 数ミリ秒で終わるため、キューに積まずリクエスト内で実行するレンダラー
+INLINE_RENDERERS = {'synth'}
+
+# 常駐レンダリングワーカー（RENDER_POOL_SIZE > 0 のとき、最初のレンダリングで起動）
+_renderer_pool = None
+_renderer_pool_lock = threading.Lock()
+
+def get_renderer_pool():
+    """常駐レンダリングワーカーのプールを返す（RENDER_POOL_SIZE が0ならNone）"""
+    global _renderer_pool
+    if app.config['RENDER_POOL_SIZE'] <= 0:
+        return None
+    with _renderer_pool_lock:
+        if _renderer_pool is None:
+            max_memory = app.config['RENDER_POOL_MAX_MEMORY_MB']
+            _renderer_pool = RendererPool(
+                app.config['RENDER_POOL_SIZE'],
+                initializer=warm_synthesizer,
+                initargs=(app.config['AUDIO_SAMPLE_RATE'],),
+                max_jobs=app.config['RENDER_POOL_MAX_JOBS'],
+                max_memory_growth=max_memory * 1024 * 1024 if max_memory > 0 else None,
+            )
+        return _renderer_pool
+
+def shutdown_renderer_pool():
+    """常駐レンダリングワーカーを停止する"""
+    global _renderer_pool
+    with _renderer_pool_lock:
+        pool, _renderer_pool = _renderer_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+atexit.register(shutdown_renderer_pool)
+
+# バックグラウンドのレンダリングも、常駐ワーカーがあればそちらで実行する
+render_queue = RenderQueue(max_workers=app.config['RENDER_WORKERS'], executor=get_renderer_pool(),
+                           readiness=artifact_readiness)
+
+def _run_renderer(midi_file, audio_file):
+    """AUDIO_RENDERER でMIDIファイルを音声ファイルに変換する（常駐ワーカーがあればそこで実行）
+
+    内蔵シンセサイザーでは、RENDER_SEGMENT_SECONDS ごとの区間に分けて常駐ワーカーで並列に合成する。
+    """
+    renderer = app.config['AUDIO_RENDERER']
+    sample_rate = app.config['AUDIO_SAMPLE_RATE']
+    pool = get_renderer_pool()
+    if pool is None:
+        return AUDIO_RENDERERS[renderer](midi_file, audio_file, sample_rate=sample_rate)
+    segment_samples = int(app.config['RENDER_SEGMENT_SECONDS'] * sample_rate)
+    if renderer == 'synth' and segment_samples > 0:
+        return render_with_synth(midi_file, audio_file, sample_rate=sample_rate,
+                                 executor=pool, segment_samples=segment_samples)
+    return pool.submit(AUDIO_RENDERERS[renderer], midi_file, audio_file, sample_rate=sample_rate).result()
+
+
+# 同じ出力先へのレンダリングをまとめる（ロックファイルは UPLOAD_FOLDER/locks に置き、他のワーカーとも共有）
+_render_flights = {}
+_render_flights_lock = threading.Lock()
+
+def get_render_flight():
+    """現在の UPLOAD_FOLDER に対応するレンダリングの single-flight を返す"""
+    lock_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'locks')
+    with _render_flights_lock:
+        flight = _render_flights.get(lock_dir)
+        if flight is None:
+            flight = _render_flights[lock_dir] = SingleFlight(lock_dir)
+        return flight
+
+# メモリ上で合成したWAVの同時要求をまとめる（プロセス内のみ）
+_wav_flight = SingleFlight()
+
+def _render_once(midi_file_path, audio_file_path):
+    """内容から決まる出力先へのレンダリングを、同時に要求されても1回だけ行う
+
+    他のスレッド・ワーカーが同じ出力先をレンダリング中であれば完了を待ち、その結果を使う。
+    他の実行の結果を使った場合は True を返す。
+    """
+    _, shared = get_render_flight().do(
+        audio_file_path,
+        lambda: _run_renderer(midi_file_path, audio_file_path),
+        lookup=lambda: audio_file_path if os.path.isfile(audio_file_path) else None,
+    )
+    if shared:
+        logger.info(f"Joined in-flight render: {audio_file_path}")
+    return shared
+
 def _generate_mp3_sync(midi_file, mp3_file_prefix):
-    """MP3生成処理（実装簡略化版：MIDIファイルをそのまま返す）"""
-    logger.info(f'MIDI file ready for playback: {midi_file}')
-    return midi_file
+    """音声生成処理
+
+    AUDIO_RENDERER がインラインで実行できるレンダラー（'synth'）であれば、MIDIの隣にWAVを書き出して
+    そのパスを返す。それ以外はMIDIファイルをそのまま返す（レンダリングはバックグラウンドで行う）。
+    """
+    renderer = app.config['AUDIO_RENDERER']
+    if renderer not in INLINE_RENDERERS:
+        logger.info(f'MIDI file ready for playback: {midi_file}')
+        return midi_file
+    audio_file = os.path.splitext(midi_file)[0] + '.wav'
+    _run_renderer(midi_file, audio_file)
+    artifact_index.record(audio_file)
+    logger.info(f'Audio rendered with {renderer}: {audio_file}')
+    return audio_file
+
+def _render_wav_bytes(midi_bytes):
+    """インラインレンダラーでMIDIバイト列をメモリ上でWAVに変換する（同じ内容の同時要求は1回だけ合成）"""
+    sample_rate = app.config['AUDIO_SAMPLE_RATE']
+    wav_bytes, _ = _wav_flight.do((artifact_id_for(midi_bytes), sample_rate),
+                                  lambda: get_synthesizer(sample_rate).render_midi(midi_bytes))
+    return wav_bytes
+
+def _audio_mimetype(path):
+    return "audio/wav" if path.endswith('.wav') else "audio/mpeg"
 
 def parse_midi(midi_file):
     try:
-        mid = mido.MidiFile(midi_file)
-        notes = []
-        for track in mid.tracks:
-            for msg in track:
-                if msg.type == 'note_off':
-                    note_name = notetoname(msg.note)
-                    note_duration = noteduration(msg.time)
-                    notes.append(f'{note_name}/4,{note_duration}')  # 例: C/4, D#/5
-        return notes
+        with stage_timings.time('parse'):
+            with open(midi_file, 'rb') as f:
+                data = f.read()
+            return scan_midi_notes(data)
     except Exception as e:
         logger.error(f"MIDI parsing error: {e}")
         return None
 
+# 音名・音長の変換表（呼び出しごとに辞書を作らないよう事前に用意）
+NOTE_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+NOTE_LABELS = tuple(f'{NOTE_NAMES[note % 12]}/{note // 12 - 1},' for note in range(128))  # 例: C/4, D#/5（60 = C4）
+DURATION_CODES = {
+    120: "q",
+    240: "h",
+    480: "w"
+}
+
+def sequence_timeline(pitches, velocities, durations):
+    """生成したノート列（1音ずつ順に鳴らす）から NoteEvent のリストを作る"""
+    timeline = []
+    tick = 0
+    for note, velocity, duration in zip(pitches, velocities, durations):
+        note = int(note)
+        duration = int(duration)
+        timeline.append(NoteEvent(note, note // 12 - 1, tick, duration, int(velocity)))
+        tick += duration
+    return timeline
+
+def timeline_notation(timeline):
+    """タイムラインを譜面用の表記（例: "C/4,q"）のリストにする"""
+    note_labels = NOTE_LABELS
+    duration_codes = DURATION_CODES
+    return [note_labels[event.pitch] + duration_codes.get(event.duration, "q") for event in timeline]
+
+def playback_events(timeline, ticks_per_beat=TICKS_PER_BEAT, tempo=DEFAULT_TEMPO):
+    """タイムラインをクライアントがそのままスケジュールできる [ノート番号, 開始秒, 長さ秒, ベロシティ] のリストにする"""
+    seconds_per_tick = tempo / 1_000_000 / ticks_per_beat
+    return [[event.pitch, round(event.start * seconds_per_tick, 4), round(event.duration * seconds_per_tick, 4),
+             event.velocity] for event in timeline]
+
+def scan_midi_notes(data):
+    """SMFのバイト列から譜面用の表記のリストを返す（parse_midi と同じ形式）"""
+    return timeline_notation(build_note_timeline(data))
+
 def notetoname(note):
-    work = note % 12
-    notes_map = {
-        0: "C",
-        1: "C#",
-        2: "D",
-        3: "D#",
-        4: "E",
-        5: "F",
-        6: "F#",
-        7: "G",
-        8: "G#",
-        9: "A",
-        10: "A#",
-        11: "B"
-    }
-    return notes_map.get(work, "C")
+    return NOTE_NAMES[note % 12]
 
 def noteduration(duration):
-    dur_map = {
-        120: "q",
-        240: "h",
-        480: "w"
-    }
-    return dur_map.get(duration, "q")
+    return DURATION_CODES.get(duration, "q")
 
 
 @app.route('/')
@@ -180,6 +622,9 @@ def index():
 
 # バリデーション定数
 VALID_SCALES = {'major', 'minor'}
+MAX_SEED = 2 ** 32 - 1
+TRUTHY_VALUES = ('1', 'true', 'yes', 'on')
+
 VALID_NOTES = {'C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B'}
 
 @app.route('/generate_music', methods=['POST'])
@@ -204,11 +649,31 @@ def generate_music():
     except ValueError:
         logger.warning(f"Invalid base note received: {base_note}")
         return jsonify({'error': 'base_note must be a valid integer'}), 400
+
+    # seed は任意。指定された場合は決定的に生成する
+    seed = request.form.get('seed', '').strip()
+    seed_value = None
+    if seed:
+        try:
+            seed_value = int(seed)
+        except ValueError:
+            logger.warning(f"Invalid seed received: {seed}")
+            return jsonify({'error': 'seed must be a valid integer'}), 400
+        if not (0 <= seed_value <= MAX_SEED):
+            logger.warning(f"seed out of range: {seed_value}")
+            return jsonify({'error': f'seed must be between 0 and {MAX_SEED}'}), 400
     midi_file_prefix = "random_midi"
     mp3_file_prefix = "random_mp3"
 
     try:
-        midi_file_path = generate_random_midi(scale, base_note_value, midi_file_prefix)
+        if app.config['SESSION_BACKEND'] == 'cookie':
+            return _generate_music_stateless(scale, base_note_value, seed_value)
+        if app.config['MIDI_STORAGE'] == 'memory':
+            return _generate_music_in_memory(scale, base_note_value, seed_value)
+        midi_bytes, notes, timeline = _generate_melody(scale, base_note_value, seed_value)
+        with stage_timings.time('file_save'):
+            midi_file_path = save_midi_bytes(midi_bytes, midi_file_prefix)
+            artifact_id = publish_artifact(midi_bytes, midi_file_path)
         if midi_file_path: # midi_file_path が None でないことを確認
             if 'midi_file' in session:
                 logger.info("Previous MIDI file found in session, removing")
@@ -219,11 +684,13 @@ def generate_music():
             if 'mp3_file' in session:
                 safe_remove_file(session['mp3_file'])
                 session.pop('mp3_file', None)
+            _discard_render_job()
             
             mp3_file_path = None  # 初期化
             logger.info("Calling generate_mp3 function")
             try:
-                mp3_file_path = _generate_mp3_sync(midi_file_path, mp3_file_prefix)
+                with stage_timings.time('render'):
+                    mp3_file_path = _generate_mp3_sync(midi_file_path, mp3_file_prefix)
                 logger.info(f"generate_mp3 returned: {mp3_file_path}")
             except Exception as e:
                 logger.error(f"Error during MP3 generation: {e}")
@@ -232,14 +699,26 @@ def generate_music():
 
             if mp3_file_path:
                 logger.info("MP3 file generation succeeded")
-                notes = parse_midi(midi_file_path)
                 if notes:
                     logger.info("MIDI parsing succeeded")
                     session['midi_file'] = midi_file_path
                     session['mp3_file'] = mp3_file_path
                     logger.debug(f"session['mp3_file']: {session['mp3_file']}")
+                    result = _melody_result(artifact_id, notes, seed_value, timeline)
+                    render_func = AUDIO_RENDERERS.get(app.config['AUDIO_RENDERER'])
+                    if render_func is not None and app.config['AUDIO_RENDERER'] not in INLINE_RENDERERS:
+                        # 音声レンダリングはバックグラウンドで行い、完了後に /random.mp3 から配信
+                        with stage_timings.time('render_submit'):
+                            job_id, audio_file_path = _submit_render(render_func, midi_file_path, midi_bytes)
+                        session['audio_file'] = audio_file_path
+                        if job_id:
+                            session['render_job'] = job_id
+                            result['render_job'] = job_id
+                            result['render_status'] = f'/render_status/{job_id}'
+                        else:
+                            result['render_cached'] = True
                     # MP3ファイルの実際のパスを返すように変更
-                    return jsonify({'wav_file': 'mp3_file', 'midi_file': '/download/midi', 'notes': notes})
+                    return jsonify(result)
                 else:
                     logger.error("MIDI parsing failed")
                     return jsonify({'error': 'Failed to generate score'}), 500
@@ -254,21 +733,438 @@ def generate_music():
         logger.exception("Full traceback:")
         return jsonify({'error': f"Unexpected error: {str(e)}"}), 500
 
+def _get_render_cache():
+    """レンダリングキャッシュを返す（RENDER_CACHE_MAX_BYTES が0なら無効でNone）"""
+    max_bytes = app.config['RENDER_CACHE_MAX_BYTES']
+    if max_bytes <= 0:
+        return None
+    directory = os.path.join(app.config['UPLOAD_FOLDER'], 'render_cache')
+    return RenderCache(directory, max_bytes)
+
+def _render_cache_key(artifact_id):
+    """成果物IDと現在のレンダリング設定からキャッシュキーを求める"""
+    return RenderCache.make_key(artifact_id.encode(), renderer=app.config['AUDIO_RENDERER'],
+                                sample_rate=app.config['AUDIO_SAMPLE_RATE'])
+
+def _artifact_audio_path(artifact_id):
+    """成果物をレンダリングした音声の保存先（成果物IDから一意に決まる）"""
+    cache = _get_render_cache()
+    if cache is None:
+        return os.path.splitext(_artifact_path(artifact_id))[0] + '.wav'
+    return cache.path_for(_render_cache_key(artifact_id))
+
+def _submit_render(render_func, midi_file_path, midi_bytes):
+    """レンダリングジョブを投入し、(job_id, 音声ファイルパス) を返す
+
+    キャッシュ済み、または同じ内容をレンダリング中の場合はジョブを作らず job_id は None。
+    """
+    sample_rate = app.config['AUDIO_SAMPLE_RATE']
+    cache = _get_render_cache()
+    if cache is None:
+        audio_file_path = os.path.splitext(midi_file_path)[0] + '.wav'
+        if app.config['AUDIO_RENDERER'] in INLINE_RENDERERS:
+            _run_renderer(midi_file_path, audio_file_path)
+            artifact_index.record(audio_file_path)
+            return None, audio_file_path
+        job_id = render_queue.submit(render_func, midi_file_path, audio_file_path, sample_rate=sample_rate)
+        _time_render_job(job_id)
+        _share_render_job(job_id, audio_file_path)
+        render_queue.add_done_callback(job_id, lambda job: artifact_index.record(job.output_path))
+        return job_id, audio_file_path
+
+    key = _render_cache_key(artifact_id_for(midi_bytes))
+    cache.ensure_directory()
+    audio_file_path = cache.path_for(key)
+    if cache.lookup(key) or artifact_readiness.is_pending(audio_file_path):
+        logger.info(f"Render cache hit: {key}")
+        return None, audio_file_path
+    if app.config['AUDIO_RENDERER'] in INLINE_RENDERERS:
+        if not _render_once(midi_file_path, audio_file_path):
+            cache.evict()
+        return None, audio_file_path
+    # キャッシュの出力先は全ワーカーで共有されるため、ジョブ内でも他のワーカーとまとめる
+    job_id = render_queue.submit(render_coalesced, midi_file_path, audio_file_path, renderer=render_func,
+                                 lock_dir=get_render_flight().lock_dir, sample_rate=sample_rate)
+    _time_render_job(job_id)
+    _share_render_job(job_id, audio_file_path)
+    render_queue.add_done_callback(job_id, lambda job: cache.evict())
+    return job_id, audio_file_path
+
+def _render_job_store():
+    """全ワーカーで共有するジョブ状態の保存先（UPLOAD_FOLDER/render_jobs）"""
+    return RenderJobStore(os.path.join(app.config['UPLOAD_FOLDER'], 'render_jobs'))
+
+def _share_render_job(job_id, audio_file_path):
+    """ジョブ状態を他のワーカーからも参照できるよう書き出し、完了時に更新する"""
+    store = _render_job_store()
+    store.write(job_id, STATUS_QUEUED, audio_file_path)
+    render_queue.add_done_callback(job_id, store.write_result)
+
+def _wait_for_render(audio_file_path, job_id, timeout):
+    """レンダリング中であれば完了まで最大 timeout 秒待つ。完了済み（失敗を含む）ならTrue
+
+    別のワーカーが投入したジョブは、共有のジョブ状態と出力ファイルを見て待つ。
+    """
+    deadline = time.monotonic() + timeout
+    if not artifact_readiness.wait(audio_file_path, timeout):
+        return False
+    if not job_id:
+        return True
+    store = _render_job_store()
+    while True:
+        record = store.read(job_id)
+        if record is None or record['status'] != STATUS_QUEUED or os.path.isfile(audio_file_path):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(RENDER_STATUS_POLL_INTERVAL, remaining))
+
+def _time_render_job(job_id):
+    """投入から完了（待ち時間を含む）までのバックグラウンドレンダリング時間を記録する"""
+    submitted = time.perf_counter()
+    render_queue.add_done_callback(job_id, lambda job: stage_timings.observe('render_job', time.perf_counter() - submitted))
+
+def _discard_render_job():
+    """セッションのレンダリングジョブを取り消し、出力ファイルを削除
+
+    キャッシュ上の音声は他のセッションと共有されるため削除せず、容量上限で破棄する。
+    """
+    job_id = session.pop('render_job', None)
+    audio_file = session.pop('audio_file', None)
+    cache = _get_render_cache()
+    if cache is not None and audio_file and cache.contains(audio_file):
+        return
+    if job_id:
+        render_queue.cancel(job_id)
+    if audio_file:
+        safe_remove_file(audio_file)
+
+def _generate_music_in_memory(scale, base_note_value, seed_value=None):
+    """ディスクに書き出さずにMIDIを生成し、セッションにはバッファIDのみを保持"""
+    midi_bytes, notes, timeline = _generate_melody(scale, base_note_value, seed_value)
+    with stage_timings.time('file_save'):
+        buffer_id = store_midi_buffer(midi_bytes)
+    logger.info(f"MIDI buffer '{buffer_id}' created ({len(midi_bytes)} bytes)")
+
+    # 以前の生成物を破棄
+    if 'midi_buffer' in session:
+        discard_midi_buffer(session.pop('midi_buffer'))
+    if 'midi_file' in session:
+        safe_remove_file(session.pop('midi_file'))
+    if 'mp3_file' in session:
+        safe_remove_file(session.pop('mp3_file'))
+    _discard_render_job()
+
+    session['midi_buffer'] = buffer_id
+    result = _melody_result(buffer_id, notes, seed_value, timeline)
+    return jsonify(result)
+
+def _generate_music_stateless(scale, base_note_value, seed_value=None):
+    """サーバー側にセッション状態を持たずに生成し、セッションには成果物IDのみを保持"""
+    midi_bytes, notes, timeline = _generate_melody(scale, base_note_value, seed_value)
+    with stage_timings.time('file_save'):
+        if app.config['MIDI_STORAGE'] == 'memory':
+            artifact_id = store_midi_buffer(midi_bytes)
+        else:
+            artifact_id = publish_artifact(midi_bytes)
+
+    session.clear()
+    session['artifact_id'] = artifact_id
+    result = _melody_result(artifact_id, notes, seed_value, timeline)
+
+    render_func = AUDIO_RENDERERS.get(app.config['AUDIO_RENDERER'])
+    if render_func is not None and app.config['MIDI_STORAGE'] != 'memory':
+        job_id, _ = _submit_render(render_func, _artifact_path(artifact_id), midi_bytes)
+        if job_id:
+            result['render_job'] = job_id
+            result['render_status'] = f'/render_status/{job_id}'
+        else:
+            result['render_cached'] = True
+    return jsonify(result)
+
+BATCH_OUTPUTS = ('midi', 'artifact')
+
+def _split_param(value):
+    """リストまたはカンマ区切り文字列を値のリストにする"""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [item.strip() for item in str(value).split(',') if item.strip()]
+
+def _parse_batch_params():
+    """一括生成のパラメータ（JSON またはフォーム）を検証し、(params, None) か (None, エラーレスポンス) を返す
+
+    count は (scales × base_notes) の組み合わせごとの生成数。
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = request.form
+
+    def error(message):
+        logger.warning(f"Invalid batch request: {message}")
+        return None, (jsonify({'error': message}), 400)
+
+    try:
+        count = int(data.get('count', 1))
+    except (TypeError, ValueError):
+        return error('count must be a valid integer')
+    scales = _split_param(data.get('scales', data.get('scale', 'major')))
+    invalid = [scale for scale in scales if scale not in VALID_SCALES]
+    if not scales or invalid:
+        return error(f'Invalid scale. Must be one of: {", ".join(sorted(VALID_SCALES))}')
+    try:
+        base_notes = [int(note) for note in _split_param(data.get('base_notes', data.get('base_note', 60)))]
+    except (TypeError, ValueError):
+        return error('base_note must be a valid integer')
+    if not base_notes or not all(0 <= note <= 127 for note in base_notes):
+        return error('base_note must be between 0 and 127')
+    max_count = app.config['BATCH_MAX_COUNT']
+    if count <= 0 or count * len(scales) * len(base_notes) > max_count:
+        return error(f'count must be positive and the total number of melodies must not exceed {max_count}')
+    seed = data.get('seed')
+    if seed is not None and str(seed).strip() != '':
+        try:
+            seed = int(seed)
+        except (TypeError, ValueError):
+            return error('seed must be a valid integer')
+        if not (0 <= seed <= MAX_SEED):
+            return error(f'seed must be between 0 and {MAX_SEED}')
+    else:
+        seed = None
+    output = str(data.get('output', 'midi')).strip()
+    if output not in BATCH_OUTPUTS:
+        return error(f'output must be one of: {", ".join(BATCH_OUTPUTS)}')
+    events = str(data.get('events', '')).strip().lower() in TRUTHY_VALUES
+    return {'count': count, 'scales': scales, 'base_notes': base_notes, 'seed': seed,
+            'output': output, 'events': events}, None
+
+def _batch_record(index, scale, base_note, melody, output, events):
+    """一括生成したメロディ1件分のレコード"""
+    record = {'index': index, 'scale': scale, 'base_note': base_note}
+    try:
+        midi_bytes = encode_smf(**melody)
+    except ValueError as e:
+        record['error'] = str(e)
+        return record
+    timeline = sequence_timeline(melody['pitches'], melody['velocities'], melody['durations'])
+    record['notes'] = timeline_notation(timeline)
+    if events:
+        record['events'] = playback_events(timeline)
+    if output == 'artifact':
+        if app.config['MIDI_STORAGE'] == 'memory':
+            artifact_id = store_midi_buffer(midi_bytes)
+        else:
+            artifact_id = publish_artifact(midi_bytes)
+        record['artifact_id'] = artifact_id
+        record['artifact_url'] = f'/artifacts/{artifact_id}.mid'
+    else:
+        record['midi'] = base64.b64encode(midi_bytes).decode('ascii')
+    return record
+
+@app.route('/generate_batch', methods=['POST'])
+def generate_batch_endpoint():
+    """メロディを一括生成し、1件1行のNDJSONで生成順にストリーミングする
+
+    セッションは使わない。output='midi' はBase64のSMF、'artifact' は成果物IDを返す。
+    """
+    params, error_response = _parse_batch_params()
+    if error_response is not None:
+        return error_response
+    logger.info(f"generate_batch: {params['count']} x {len(params['scales'])} scales x "
+                f"{len(params['base_notes'])} base notes")
+
+    def generate():
+        for index, scale, base_note, melody in iter_batch_melodies(
+                params['scales'], params['base_notes'], params['count'], params['seed']):
+            record = _batch_record(index, scale, base_note, melody, params['output'], params['events'])
+            yield json.dumps(record, separators=(',', ':')) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/export_zip', methods=['POST'])
+def export_zip():
+    """複数のMIDIをZIPアーカイブとしてストリーミングする
+
+    artifact_ids を指定すると既存の成果物をまとめ、指定しなければ /generate_batch と同じ
+    パラメータ（count, scales, base_notes, seed）でメロディを生成してまとめる。
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = request.form
+    artifact_ids = _split_param(data.get('artifact_ids', ''))
+    if artifact_ids:
+        if len(artifact_ids) > app.config['BATCH_MAX_COUNT']:
+            return jsonify({'error': f"artifact_ids must not exceed {app.config['BATCH_MAX_COUNT']}"}), 400
+        invalid = [artifact_id for artifact_id in artifact_ids
+                   if not isinstance(artifact_id, str) or not ARTIFACT_ID_PATTERN.fullmatch(artifact_id)]
+        if invalid:
+            return jsonify({'error': 'Invalid artifact id'}), 400
+        missing = [artifact_id for artifact_id in artifact_ids if _read_artifact(artifact_id) == (None, None)]
+        if missing:
+            logger.warning(f"export_zip: {len(missing)} artifacts not found")
+            return jsonify({'error': 'Artifact not found', 'missing': missing}), 404
+
+        def entries():
+            for artifact_id in dict.fromkeys(artifact_ids):
+                midi_bytes, path = _read_artifact(artifact_id)
+                if midi_bytes is None:
+                    if path is None:
+                        # 確認後に削除された成果物は飛ばす
+                        continue
+                    with open(path, 'rb') as f:
+                        midi_bytes = f.read()
+                yield f'{artifact_id}.mid', midi_bytes
+    else:
+        params, error_response = _parse_batch_params()
+        if error_response is not None:
+            return error_response
+
+        def entries():
+            for index, scale, base_note, melody in iter_batch_melodies(
+                    params['scales'], params['base_notes'], params['count'], params['seed']):
+                try:
+                    midi_bytes = encode_smf(**melody)
+                except ValueError as e:
+                    logger.warning(f"export_zip: skipped melody {index}: {e}")
+                    continue
+                yield f'{index:05d}_{scale}_{base_note}.mid', midi_bytes
+
+    response = Response(stream_with_context(iter_zip_stream(entries())), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=melodies.zip'
+    return response
+
+def _session_artifact_id():
+    """セッションの成果物IDを返す（無い、または不正な場合はNone）"""
+    artifact_id = session.get('artifact_id')
+    if artifact_id and ARTIFACT_ID_PATTERN.fullmatch(artifact_id):
+        return artifact_id
+    return None
+
+def _read_artifact(artifact_id):
+    """成果物のMIDIを (バイト列, ファイルパス) のどちらかで返す（無ければ両方None）"""
+    midi_bytes = get_midi_buffer(artifact_id)
+    if midi_bytes is not None:
+        return midi_bytes, None
+    path = _artifact_path(artifact_id)
+    if os.path.isfile(path):
+        return None, path
+    return None, None
+
+def _render_artifact_inline(midi_file_path, audio_file_path):
+    """インラインレンダラーで成果物の音声を書き出す"""
+    os.makedirs(os.path.dirname(audio_file_path), exist_ok=True)
+    if _render_once(midi_file_path, audio_file_path):
+        return
+    cache = _get_render_cache()
+    if cache is not None and cache.contains(audio_file_path):
+        cache.evict()
+    else:
+        artifact_index.record(audio_file_path)
+
+def _send_artifact_audio(artifact_id):
+    """成果物IDから音声（レンダリング済みであればWAV、なければMIDI）を返す"""
+    if AUDIO_RENDERERS.get(app.config['AUDIO_RENDERER']) is not None and app.config['MIDI_STORAGE'] != 'memory':
+        audio_file_path = _artifact_audio_path(artifact_id)
+        if not artifact_readiness.wait(audio_file_path, app.config['ARTIFACT_READY_TIMEOUT']):
+            logger.warning(f"Timed out waiting for render: {audio_file_path}")
+            return jsonify({'error': 'MP3 file is not ready'}), 503
+        if os.path.isfile(audio_file_path):
+            return send_file(audio_file_path, mimetype="audio/wav")
+        midi_file_path = _artifact_path(artifact_id)
+        if app.config['AUDIO_RENDERER'] in INLINE_RENDERERS and os.path.isfile(midi_file_path):
+            # キャッシュから破棄された音声はその場で作り直す
+            with stage_timings.time('render'):
+                _render_artifact_inline(midi_file_path, audio_file_path)
+            return send_file(audio_file_path, mimetype="audio/wav")
+    midi_bytes, path = _read_artifact(artifact_id)
+    if midi_bytes is not None:
+        if app.config['AUDIO_RENDERER'] in INLINE_RENDERERS:
+            return send_file(io.BytesIO(_render_wav_bytes(midi_bytes)), mimetype="audio/wav")
+        return send_file(io.BytesIO(midi_bytes), mimetype="audio/mpeg")
+    if path is not None:
+        return send_file(path, mimetype="audio/mpeg")
+    logger.warning(f"Artifact not found: {artifact_id}")
+    return jsonify({'error': 'MP3 file not found'}), 404
+
+def _streaming_requested():
+    """/random.mp3 を合成しながらストリーミングするか"""
+    if app.config['AUDIO_RENDERER'] not in INLINE_RENDERERS:
+        return False
+    stream = request.args.get('stream')
+    if stream is None:
+        return app.config['AUDIO_STREAMING']
+    return stream.strip().lower() in TRUTHY_VALUES
+
+def _session_midi_bytes():
+    """セッションのMIDIバイト列（成果物・メモリバッファ・ファイルのいずれか。無ければNone）"""
+    artifact_id = _session_artifact_id()
+    if artifact_id:
+        midi_bytes, path = _read_artifact(artifact_id)
+    elif 'midi_buffer' in session:
+        midi_bytes, path = get_midi_buffer(session['midi_buffer']), None
+    elif 'midi_file' in session and is_safe_path(session['midi_file']):
+        midi_bytes, path = None, session['midi_file']
+    else:
+        return None
+    if midi_bytes is None and path is not None:
+        with open(path, 'rb') as f:
+            midi_bytes = f.read()
+    return midi_bytes
+
+def _stream_audio(midi_bytes):
+    """タイムラインを区間ごとに合成しながら、WAVをチャンク転送で送る"""
+    synthesizer = get_synthesizer(app.config['AUDIO_SAMPLE_RATE'])
+    chunk_samples = max(1, int(app.config['AUDIO_STREAM_CHUNK_SECONDS'] * synthesizer.sample_rate))
+    response = Response(synthesizer.iter_wav(midi_bytes, chunk_samples), mimetype="audio/wav")
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/random.mp3')
 def get_mp3():
     logger.info("GET /random.mp3 requested")
     try:
+        if _streaming_requested():
+            midi_bytes = _session_midi_bytes()
+            if midi_bytes is not None:
+                return _stream_audio(midi_bytes)
+        artifact_id = _session_artifact_id()
+        if artifact_id:
+            return _send_artifact_audio(artifact_id)
+        if 'midi_buffer' in session:
+            midi_bytes = get_midi_buffer(session['midi_buffer'])
+            if midi_bytes is None:
+                logger.warning("MIDI buffer expired or not found")
+                return jsonify({'error': 'MP3 file not found'}), 404
+            if app.config['AUDIO_RENDERER'] in INLINE_RENDERERS:
+                with stage_timings.time('render'):
+                    wav_bytes = _render_wav_bytes(midi_bytes)
+                return send_file(io.BytesIO(wav_bytes), mimetype="audio/wav")
+            return send_file(io.BytesIO(midi_bytes), mimetype="audio/mpeg")
+        if 'audio_file' in session:
+            audio_file_path = session['audio_file']
+            # レンダリング中であれば完了を待つ（別のワーカーが投入したジョブも含む）
+            if not _wait_for_render(audio_file_path, session.get('render_job'), app.config['ARTIFACT_READY_TIMEOUT']):
+                logger.warning(f"Timed out waiting for render: {audio_file_path}")
+                return jsonify({'error': 'MP3 file is not ready'}), 503
+            if is_safe_path(audio_file_path):
+                return send_file(audio_file_path, mimetype="audio/wav")
+            # レンダリングに失敗した場合はMIDIをそのまま返す
+            logger.warning(f"Rendered audio unavailable, falling back to MIDI: {audio_file_path}")
         if 'mp3_file' in session:
             mp3_file_path = session['mp3_file']
             logger.debug(f"Attempting to send file: {mp3_file_path}")
-            
+
+            # 生成中の場合のみ完了を待つ（既に存在すれば即座に返る）
+            if not artifact_readiness.wait(mp3_file_path, app.config['ARTIFACT_READY_TIMEOUT']):
+                logger.warning(f"Timed out waiting for artifact: {mp3_file_path}")
+                return jsonify({'error': 'MP3 file is not ready'}), 503
+
             if not is_safe_path(mp3_file_path):
                 logger.warning(f"Unsafe path access attempted: {mp3_file_path}")
                 return jsonify({'error': 'Invalid file path'}), 403
-            
-            time.sleep(1)
+
             try:
-                return send_file(mp3_file_path, mimetype="audio/mpeg")
+                return send_file(mp3_file_path, mimetype=_audio_mimetype(mp3_file_path))
             except FileNotFoundError as e:
                 logger.warning("FileNotFoundError occurred")
                 logger.debug(f"FileNotFoundError details: {str(e)}")
@@ -284,6 +1180,29 @@ def get_mp3():
 @app.route('/download/midi')
 def download_midi():
     logger.info("GET /download/midi requested")
+    artifact_id = _session_artifact_id()
+    if artifact_id:
+        midi_bytes, path = _read_artifact(artifact_id)
+        if midi_bytes is None and path is None:
+            logger.warning(f"Artifact not found: {artifact_id}")
+            return jsonify({'error': 'MIDI file not found'}), 404
+        return send_file(
+            io.BytesIO(midi_bytes) if midi_bytes is not None else path,
+            as_attachment=True,
+            download_name='music.mid',
+            mimetype='audio/midi'
+        )
+    if 'midi_buffer' in session:
+        midi_bytes = get_midi_buffer(session['midi_buffer'])
+        if midi_bytes is None:
+            logger.warning("MIDI buffer expired or not found")
+            return jsonify({'error': 'MIDI file not found'}), 404
+        return send_file(
+            io.BytesIO(midi_bytes),
+            as_attachment=True,
+            download_name='music.mid',
+            mimetype='audio/midi'
+        )
     if 'midi_file' in session:
         midi_file_path = session['midi_file']
         
@@ -291,12 +1210,9 @@ def download_midi():
             logger.warning(f"Unsafe path access attempted: {midi_file_path}")
             return jsonify({'error': 'Invalid file path'}), 403
         
-        # ファイル名を取得
-        filename = os.path.basename(midi_file_path)
-        logger.info(f"Sending MIDI file: {filename}")
-        return send_from_directory(
-            app.config['UPLOAD_FOLDER'],
-            filename,
+        logger.info(f"Sending MIDI file: {midi_file_path}")
+        return send_file(
+            midi_file_path,
             as_attachment=True,
             download_name='music.mid',  # ダウンロード時のファイル名
             mimetype='audio/midi'
@@ -305,16 +1221,76 @@ def download_midi():
         logger.warning("MIDI file not found in session")
         return jsonify({'error': 'MIDI file not found'}), 404
 
+@app.route('/render_status/<job_id>')
+def render_status(job_id):
+    """レンダリングジョブの状態を返す（他のワーカーが投入したジョブは共有のジョブ状態から返す）"""
+    status = render_queue.status(job_id)
+    if status is None:
+        record = _render_job_store().read(job_id)
+        if record is None:
+            return jsonify({'error': 'Render job not found'}), 404
+        status = {'job_id': job_id, 'status': record['status'], 'error': record['error']}
+    if status['status'] == 'done':
+        status['audio_url'] = '/random.mp3'
+    return jsonify(status)
+
+@app.route('/artifacts/<artifact_id>.mid')
+def get_artifact(artifact_id):
+    """成果物IDでMIDIを配信（内容不変のため強いETagと長期キャッシュを付与）"""
+    if not ARTIFACT_ID_PATTERN.fullmatch(artifact_id):
+        return jsonify({'error': 'MIDI file not found'}), 404
+    midi_bytes, path = _read_artifact(artifact_id)
+    if midi_bytes is not None:
+        response = make_response(midi_bytes)
+        response.mimetype = 'audio/midi'
+        response.set_etag(artifact_id)
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(midi_bytes))
+    elif path is not None:
+        response = send_file(path, mimetype='audio/midi', etag=artifact_id, conditional=True)
+    else:
+        return jsonify({'error': 'MIDI file not found'}), 404
+    response.headers['Cache-Control'] = ARTIFACT_CACHE_CONTROL
+    return response
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_timings.observe(request.endpoint or 'unknown', time.perf_counter() - started)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """処理段階ごとの所要時間とクリーンアップ統計を Prometheus テキスト形式で返す"""
+    lines = stage_timings.render() + request_timings.render()
+    lines += render_gauges('melody_janitor', janitor.stats())
+    with _midi_buffers_lock:
+        buffers = len(_midi_buffers)
+    lines += render_gauges('melody', {'midi_buffers': buffers})
+    pool = _renderer_pool
+    if pool is not None:
+        lines += render_gauges('melody_renderer_pool', pool.stats())
+    return Response('\n'.join(lines) + '\n', content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/clear_session', methods=['POST'])
 def clear_session():
     logger.info("POST /clear_session requested")
+    # 成果物は内容不変で共有されるため、IDのみを破棄する
+    session.pop('artifact_id', None)
     # セッションクリア時にファイルを削除する処理
+    if 'midi_buffer' in session:
+        discard_midi_buffer(session.pop('midi_buffer'))
     if 'midi_file' in session:
         safe_remove_file(session['midi_file'])
         session.pop('midi_file', None)
     if 'mp3_file' in session:
         safe_remove_file(session['mp3_file'])
         session.pop('mp3_file', None)
+    _discard_render_job()
     logger.info("Session cleared successfully")
     return jsonify({'message': 'Session cleared'}), 200
 
@@ -0,0 +1,94 @@
+"""
+シャーディングされた成果物ストア
+
+生成ファイルを UPLOAD_FOLDER 直下に平置きすると、ファイル数が増えるにつれて
+ディレクトリ操作が遅くなるため、IDのハッシュで決まるサブディレクトリに分散して保存する。
+"""
+import os
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class ArtifactStore:
+    """ID -> パスを管理する成果物ストア
+
+    パスは root/<ハッシュ先頭2文字>/<次の2文字>/<ID><拡張子> の形式（depth, width で変更可能）。
+    最近使ったIDのパスは小さな索引に保持する。
+    """
+
+    def __init__(self, root, depth=2, width=2, index_size=10000):
+        self.root = root
+        self.depth = depth
+        self.width = width
+        self.index_size = index_size
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shard_dir(self, artifact_id):
+        digest = hashlib.md5(artifact_id.encode()).hexdigest()
+        parts = [digest[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return os.path.join(self.root, *parts)
+
+    def path_for(self, artifact_id, ext='.mid'):
+        """IDに対応する保存先パス（ファイルの有無は問わない）"""
+        key = (artifact_id, ext)
+        with self._lock:
+            path = self._index.get(key)
+            if path is not None:
+                self._index.move_to_end(key)
+                return path
+        path = os.path.join(self._shard_dir(artifact_id), artifact_id + ext)
+        self._remember(key, path)
+        return path
+
+    def _remember(self, key, path):
+        with self._lock:
+            self._index[key] = path
+            self._index.move_to_end(key)
+            while len(self._index) > self.index_size:
+                self._index.popitem(last=False)
+
+    def _forget(self, path):
+        artifact_id, ext = os.path.splitext(os.path.basename(path))
+        with self._lock:
+            self._index.pop((artifact_id, ext), None)
+
+    def lookup(self, artifact_id, ext='.mid'):
+        """保存済みであればパスを、なければNoneを返す"""
+        path = self.path_for(artifact_id, ext)
+        return path if os.path.isfile(path) else None
+
+    def exists(self, artifact_id, ext='.mid'):
+        return self.lookup(artifact_id, ext) is not None
+
+    def write(self, artifact_id, data, ext='.mid', link_from=None):
+        """データを書き込み、パスを返す（一時ファイル経由で置き換えるため途中の状態は見えない）
+
+        link_from に同じ内容のファイルを渡すと、コピーせずにハードリンクを張る。
+        """
+        path = self.path_for(artifact_id, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            if link_from is None:
+                raise OSError
+            os.link(link_from, temp_path)
+        except OSError:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+        os.replace(temp_path, path)
+        return path
+
+    def contains(self, path):
+        """path がストアのルート配下か"""
+        base = os.path.abspath(self.root)
+        return os.path.abspath(path).startswith(base + os.sep)
+
+    def remove(self, path):
+        """ストア内のファイルを削除（ストア外のパスは ValueError）"""
+        if not self.contains(path):
+            raise ValueError(f"Path outside artifact store: {path}")
+        os.remove(path)
+        self._forget(path)
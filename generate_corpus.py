@@ -0,0 +1,161 @@
+"""
+学習用コーパスの一括生成（オフラインCLI）
+
+Flask アプリと同じ生成ロジック（melody_generation の generate_batch / encode_smf）で大量のメロディを作り、
+シャーディングしたディレクトリに保存してマニフェストを書き出す。
+
+使用例:
+    python generate_corpus.py --count 1000000 --output corpus \\
+        --scales major:0.7,minor:0.3 --base-notes 48-72 --workers 8 --seed 1
+"""
+import os
+import sys
+import time
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from melody_generation import SCALES, generate_batch, encode_smf, artifact_id_for
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+def parse_distribution(spec, parse_value=str):
+    """"値[:重み],..." 形式の分布指定を (値のタプル, 確率のタプル) にする
+
+    parse_value=int の場合は "48-72" のような範囲指定（範囲内は均等）も受け付ける。
+    """
+    values = []
+    weights = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        value, _, weight = item.partition(':')
+        weight = float(weight) if weight else 1.0
+        if weight < 0:
+            raise ValueError(f"weight must not be negative: {item}")
+        if parse_value is int and '-' in value.strip()[1:]:
+            low, high = (int(v) for v in value.split('-', 1))
+            expanded = list(range(low, high + 1))
+            if not expanded:
+                raise ValueError(f"empty range: {value}")
+            values.extend(expanded)
+            weights.extend([weight / len(expanded)] * len(expanded))
+        else:
+            values.append(parse_value(value.strip()))
+            weights.append(weight)
+    total = sum(weights)
+    if not values or total <= 0:
+        raise ValueError(f"distribution must have a positive total weight: {spec}")
+    return tuple(values), tuple(w / total for w in weights)
+
+
+def generate_shard(task):
+    """1シャード分のメロディを生成・保存し、マニフェストの行のリストを返す（ワーカープロセスで実行）"""
+    output, shard, start, count, scales, base_notes, seed = task
+    rng = np.random.default_rng(None if seed is None else (seed, shard))
+    shard_name = f'{shard:05d}'
+    shard_dir = os.path.join(output, shard_name)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    # 各メロディの (scale, base_note) を分布から選び、組み合わせごとにまとめて生成
+    scale_choices = rng.choice(len(scales[0]), size=count, p=scales[1])
+    base_choices = rng.choice(len(base_notes[0]), size=count, p=base_notes[1])
+    melodies = [None] * count
+    for scale_index, base_index in sorted(set(zip(scale_choices.tolist(), base_choices.tolist()))):
+        positions = np.flatnonzero((scale_choices == scale_index) & (base_choices == base_index))
+        scale = scales[0][scale_index]
+        base_note = base_notes[0][base_index]
+        batch_seed = None if seed is None else (seed, shard, scale_index, base_index)
+        for position, melody in zip(positions, generate_batch(scale, base_note, len(positions), batch_seed)):
+            melodies[position] = (scale, base_note, melody)
+
+    rows = []
+    for offset, (scale, base_note, melody) in enumerate(melodies):
+        try:
+            midi_bytes = encode_smf(**melody)
+        except ValueError:
+            # 基準音が高すぎて音域を超えたメロディは保存しない
+            continue
+        name = f'{start + offset:08d}.mid'
+        with open(os.path.join(shard_dir, name), 'wb') as f:
+            f.write(midi_bytes)
+        rows.append({
+            'path': f'{shard_name}/{name}',
+            'scale': scale,
+            'base_note': base_note,
+            'notes': len(melody['pitches']),
+            'artifact_id': artifact_id_for(midi_bytes),
+        })
+    return count, rows
+
+
+def iter_tasks(output, count, shard_size, scales, base_notes, seed):
+    for shard, start in enumerate(range(0, count, shard_size)):
+        yield output, shard, start, min(shard_size, count - start), scales, base_notes, seed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Generate a MIDI melody corpus.')
+    parser.add_argument('--count', type=int, required=True, help='number of melodies to generate')
+    parser.add_argument('--output', required=True, help='output directory')
+    parser.add_argument('--scales', default='major', help='scale distribution, e.g. major:0.7,minor:0.3')
+    parser.add_argument('--base-notes', default='60', help='base note distribution, e.g. 48-72 or 48:1,60:2')
+    parser.add_argument('--shard-size', type=int, default=1000, help='files per output directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--seed', type=int, default=None, help='seed for deterministic output')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.count <= 0 or args.shard_size <= 0 or args.workers <= 0:
+        parser.error('--count, --shard-size and --workers must be positive')
+    try:
+        scales = parse_distribution(args.scales)
+        base_notes = parse_distribution(args.base_notes, int)
+    except ValueError as e:
+        parser.error(str(e))
+    invalid = [scale for scale in scales[0] if scale not in SCALES]
+    if invalid:
+        parser.error(f"unknown scales: {', '.join(invalid)}")
+    if not all(0 <= note <= 127 for note in base_notes[0]):
+        parser.error('base notes must be between 0 and 127')
+
+    os.makedirs(args.output, exist_ok=True)
+    tasks = iter_tasks(args.output, args.count, args.shard_size, scales, base_notes, args.seed)
+    started = time.perf_counter()
+    generated = 0
+    written = 0
+    with open(os.path.join(args.output, MANIFEST_NAME), 'w') as manifest:
+        if args.workers == 1:
+            results = map(generate_shard, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=args.workers)
+            results = executor.map(generate_shard, tasks)
+        try:
+            # シャード順に受け取り、マニフェストの順序を決定的にする
+            for count, rows in results:
+                generated += count
+                written += len(rows)
+                manifest.writelines(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+                elapsed = time.perf_counter() - started
+                print(f'\r{generated}/{args.count} melodies ({generated / elapsed:.0f}/s)',
+                      end='', file=sys.stderr, flush=True)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+    print(f'Wrote {written} melodies to {args.output} in {elapsed:.2f}s '
+          f'({written / elapsed:.0f} melodies/s, {generated - written} skipped)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
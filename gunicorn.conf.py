@@ -0,0 +1,48 @@
+"""
+gunicorn の設定
+
+起動時（on_starting）に、プロセス内にしか状態を持たない設定を複数ワーカーで使っていないかを確認する。
+ワーカー数はコマンドライン・GUNICORN_CMD_ARGS・WEB_CONCURRENCY・設定ファイルのどれで
+指定しても server.cfg.workers に反映されるため、ここで確認すればすべての指定方法を扱える。
+Flask アプリはマスタープロセスでは読み込まない（アプリの設定と同じ環境変数を読む）。
+
+使用例:
+    gunicorn --config gunicorn.conf.py --workers 3 app:app
+"""
+import os
+
+# 環境変数名 -> (ワーカー間で共有できない値, 代わりに使える値)
+PER_PROCESS_SETTINGS = {
+    'MIDI_STORAGE': ('memory', 'disk'),
+    'SESSION_BACKEND': ('memory', 'cookie'),
+}
+# アプリの既定値（app.py の os.environ.get の既定値と同じ）
+SETTING_DEFAULTS = {
+    'MIDI_STORAGE': 'disk',
+    'SESSION_BACKEND': 'filesystem',
+}
+
+
+def check_worker_settings(workers, environ):
+    """プロセス内にしか状態を持たない設定を複数ワーカーで使う構成を拒否する
+
+    該当する設定があれば RuntimeError。
+    """
+    if workers <= 1:
+        return
+    for name, (per_process, alternative) in PER_PROCESS_SETTINGS.items():
+        if environ.get(name, SETTING_DEFAULTS[name]) == per_process:
+            raise RuntimeError(
+                f"{name}='{per_process}' keeps state in per-process memory and requires a single worker "
+                f"(configured: {workers}); use {name}='{alternative}' or run gunicorn with --workers 1"
+            )
+
+
+def on_starting(server):
+    # --env / raw_env で渡した値はワーカーの環境変数を上書きする
+    environ = {**os.environ, **server.cfg.env}
+    try:
+        check_worker_settings(server.cfg.workers, environ)
+    except RuntimeError as e:
+        server.log.error(str(e))
+        raise SystemExit(1)
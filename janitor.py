@@ -0,0 +1,160 @@
+"""
+生成ファイルのバックグラウンドクリーンアップ
+
+放置されたセッションの生成物は safe_remove_file で消されないまま残るため、
+作成時刻の索引をもとに、期限切れのファイルと容量上限を超えた分を定期的に削除する。
+"""
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactIndex:
+    """生成ファイルのパス -> (作成時刻, サイズ) の索引"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, path, size=None, created=None):
+        """生成したファイルを登録"""
+        if size is None or created is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+            size = stat.st_size if size is None else size
+            created = stat.st_mtime if created is None else created
+        with self._lock:
+            self._entries[os.path.abspath(path)] = (created, size)
+
+    def discard(self, path):
+        with self._lock:
+            self._entries.pop(os.path.abspath(path), None)
+
+    def snapshot(self):
+        """(作成時刻, サイズ, パス) のリストを作成時刻の古い順で返す"""
+        with self._lock:
+            return sorted((created, size, path) for path, (created, size) in self._entries.items())
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def rescan(self, directory, exclude=()):
+        """ディレクトリを走査して索引を実際のファイルと一致させる
+
+        他のワーカーが作成したファイルや、再起動前のファイルも索引に取り込む。
+        """
+        excluded = {os.path.abspath(os.path.join(directory, name)) for name in exclude}
+        entries = {}
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in excluded]
+            for name in files:
+                path = os.path.abspath(os.path.join(root, name))
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries[path] = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            # 索引済みの作成時刻を優先する
+            for path, value in entries.items():
+                if path in self._entries:
+                    entries[path] = self._entries[path]
+            self._entries = entries
+
+
+class Janitor:
+    """期限切れ・容量超過の生成ファイルを定期的に削除する"""
+
+    def __init__(self, directory, index, max_age, max_bytes=0, interval=300, exclude=(), rescan_every=10):
+        self.directory = directory
+        self.index = index
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.exclude = tuple(exclude)
+        self.rescan_every = rescan_every
+        self.runs = 0
+        self.removed_files = 0
+        self.reclaimed_bytes = 0
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self, now=None):
+        """1回分のクリーンアップを行い、{'removed_files', 'reclaimed_bytes'} を返す"""
+        now = time.time() if now is None else now
+        if self.runs % self.rescan_every == 0:
+            self.index.rescan(self.directory, self.exclude)
+        self.runs += 1
+
+        entries = self.index.snapshot()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        reclaimed = 0
+        for created, size, path in entries:
+            expired = now - created > self.max_age
+            over_quota = self.max_bytes > 0 and total > self.max_bytes
+            if not (expired or over_quota):
+                # 古い順に並んでいるため、以降も期限内かつ容量内
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Janitor failed to delete {path}: {e}")
+                continue
+            else:
+                removed += 1
+                reclaimed += size
+            self.index.discard(path)
+            total -= size
+
+        self.removed_files += removed
+        self.reclaimed_bytes += reclaimed
+        self.last_run = now
+        if removed:
+            logger.info(f"Janitor removed {removed} files ({reclaimed} bytes)")
+        return {'removed_files': removed, 'reclaimed_bytes': reclaimed}
+
+    def stats(self):
+        """累計のクリーンアップ統計"""
+        return {
+            'runs': self.runs,
+            'removed_files': self.removed_files,
+            'reclaimed_bytes': self.reclaimed_bytes,
+            'tracked_files': len(self.index),
+            'tracked_bytes': self.index.total_bytes(),
+            'last_run': self.last_run,
+        }
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Janitor run failed")
+
+    def start(self):
+        """バックグラウンドスレッドで定期実行を開始"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='janitor', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
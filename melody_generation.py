@@ -0,0 +1,124 @@
+"""
+メロディ生成とSMFエンコード
+
+スケールの確率テーブル、NumPyによるメロディの一括生成、SMFバイト列へのエンコード、
+成果物IDの計算をまとめる。Flask アプリに依存しないため、オフラインCLI（generate_corpus.py）や
+ワーカープロセスからも Flask アプリを読み込まずに使える。
+"""
+import hashlib
+import itertools
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+# メロディ生成のパラメータ
+NOTE_COUNT_RANGE = (10, 30)
+VELOCITY_RANGE = (40, 100)
+DURATIONS = (120, 240, 480)  # Quarter, half, whole notes
+NOTE_CLAMP_RANGE = (24, 108)
+
+# スケールレジストリ（名前 -> 12音中の相対音程）
+SCALES = {
+    'major': (0, 2, 4, 5, 7, 9, 11),  # Cメジャースケールの相対音程
+    'minor': (0, 2, 3, 5, 7, 8, 10),  # Cマイナースケールの相対音程
+}
+DEFAULT_SCALE = 'major'  # 未登録のスケールはCメジャーとして扱う
+IN_SCALE_WEIGHT = 0.95  # スケールの音程が選ばれる確率の合計
+
+ScaleTable = namedtuple('ScaleTable', ['offsets', 'weights', 'cum_weights', 'cumulative'])
+
+@lru_cache(maxsize=None)
+def get_scale_table(scale, in_scale_weight=IN_SCALE_WEIGHT):
+    """スケールごとの選択確率テーブルを返す（(scale, in_scale_weight) ごとに1回だけ計算）"""
+    scale_notes = SCALES.get(scale, SCALES[DEFAULT_SCALE])
+    out_of_scale = 12 - len(scale_notes)
+    weights = []
+    for i in range(12):
+        if i in scale_notes:
+            weights.append(in_scale_weight / len(scale_notes))  # スケールの音程は均等に選択
+        elif out_of_scale:
+            weights.append((1 - in_scale_weight) / out_of_scale)  # それ以外の音程も均等に選択
+        else:
+            weights.append(0.0)
+    cum_weights = tuple(itertools.accumulate(weights))
+    cumulative = np.array(cum_weights) / cum_weights[-1]
+    cumulative.flags.writeable = False
+    return ScaleTable(tuple(range(12)), tuple(weights), cum_weights, cumulative)
+
+
+# SMF（Standard MIDI File）の固定部分。mido.MidiFile の既定値（フォーマット1、1トラック、480 ticks/beat）と同じ
+TICKS_PER_BEAT = 480
+SMF_HEADER = b'MThd' + (6).to_bytes(4, 'big') + (1).to_bytes(2, 'big') + (1).to_bytes(2, 'big') + TICKS_PER_BEAT.to_bytes(2, 'big')
+END_OF_TRACK = b'\x00\xff\x2f\x00'
+
+@lru_cache(maxsize=None)
+def _vlq(value):
+    """可変長数値（デルタタイム）のバイト列"""
+    if not 0 <= value <= 0x0FFFFFFF:
+        raise ValueError(f"delta time out of range: {value}")
+    encoded = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        encoded.insert(0, (value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(encoded)
+
+def encode_smf(pitches, velocities, durations, program=0):
+    """ノート列をSMFバイト列に直接エンコードする
+
+    mido で program_change と note_on/note_off を並べて保存した場合と同じバイト列になる。
+    """
+    if not 0 <= program <= 127:
+        raise ValueError(f"program must be between 0 and 127: {program}")
+    track = bytearray(b'\x00\xc0')
+    track.append(program)
+    for note, velocity, duration in zip(pitches, velocities, durations):
+        note = int(note)
+        velocity = int(velocity)
+        if not (0 <= note <= 127 and 0 <= velocity <= 127):
+            raise ValueError(f"note and velocity must be between 0 and 127: {note}, {velocity}")
+        track += b'\x00\x90'
+        track.append(note)
+        track.append(velocity)
+        track += _vlq(int(duration))
+        track.append(0x80)
+        track.append(note)
+        track.append(0)
+    track += END_OF_TRACK
+    return SMF_HEADER + b'MTrk' + len(track).to_bytes(4, 'big') + bytes(track)
+
+
+def generate_batch(scale, base_note, count, seed=None):
+    """NumPyで count 個のメロディをまとめて生成する
+
+    各メロディは 'pitches', 'velocities', 'durations' のint配列を持つdictで返す
+    （encode_smf(**melody) でSMFバイト列になる）。
+    音程・ベロシティ・音長の分布は generate_random_midi と同じ。
+    """
+    if count <= 0:
+        return []
+    rng = np.random.default_rng(seed)
+    cumulative = get_scale_table(scale).cumulative
+
+    lengths = rng.integers(NOTE_COUNT_RANGE[0], NOTE_COUNT_RANGE[1] + 1, size=count)
+    total = int(lengths.sum())
+    offsets = np.searchsorted(cumulative, rng.random(total), side='right')
+    pitches = np.clip(base_note + offsets, *NOTE_CLAMP_RANGE)
+    velocities = rng.integers(VELOCITY_RANGE[0], VELOCITY_RANGE[1] + 1, size=total)
+    durations = np.asarray(DURATIONS)[rng.integers(0, len(DURATIONS), size=total)]
+
+    # 最初の音符はクランプしない（generate_random_midi と同じ挙動）
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    pitches[starts] = base_note + offsets[starts]
+
+    bounds = np.cumsum(lengths)[:-1]
+    return [
+        {'pitches': p, 'velocities': v, 'durations': d}
+        for p, v, d in zip(np.split(pitches, bounds), np.split(velocities, bounds), np.split(durations, bounds))
+    ]
+
+
+def artifact_id_for(midi_bytes):
+    """MIDIバイト列から成果物IDを求める（同じ内容なら同じID）"""
+    return hashlib.sha256(midi_bytes).hexdigest()[:32]
@@ -0,0 +1,144 @@
+"""
+処理段階ごとの所要時間の計測と Prometheus テキスト形式での出力
+
+各リクエストの生成・保存・レンダリング・解析・セッション書き込みの時間をプロセス内の
+ヒストグラムに集計し、/metrics で公開する（gunicorn ではワーカーごとの値になる）。
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# ヒストグラムのバケット上限（秒）
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Histogram:
+    """固定バケットのヒストグラム（スレッドセーフ）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 最後は +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """(累積カウントのリスト, 合計, 件数) を返す"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class LabeledHistogram:
+    """ラベル値ごとのヒストグラム（例: stage="generation"）"""
+
+    def __init__(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _get(self, value):
+        histogram = self._histograms.get(value)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(value, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, value, seconds):
+        self._get(value).observe(seconds)
+
+    @contextmanager
+    def time(self, value):
+        """with ブロックの所要時間を記録する（例外時も記録）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(value, time.perf_counter() - started)
+
+    def snapshot(self, value):
+        """ラベル値のヒストグラムの (累積カウント, 合計, 件数)（未記録ならNone）"""
+        histogram = self._histograms.get(value)
+        return histogram.snapshot() if histogram is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Prometheus テキスト形式の行のリスト"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted(self._histograms.items())
+        bounds = self.buckets + (float('inf'),)
+        for value, histogram in items:
+            label = f'{self.label}="{_escape_label(value)}"'
+            cumulative, total, count = histogram.snapshot()
+            for bound, bucket_count in zip(bounds, cumulative):
+                lines.append(f'{self.name}_bucket{{{label},le="{_format_value(bound)}"}} {bucket_count}')
+            lines.append(f'{self.name}_sum{{{label}}} {_format_value(total)}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+def render_gauges(prefix, values, documentation=None):
+    """{名前: 数値} をゲージとして Prometheus テキスト形式の行にする（None の値は出力しない）"""
+    lines = []
+    for name, value in values.items():
+        if value is None:
+            continue
+        metric = f'{prefix}_{name}'
+        if documentation and name in documentation:
+            lines.append(f'# HELP {metric} {documentation[name]}')
+        lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric} {_format_value(value)}')
+    return lines
+
+
+class TimedSessionInterface:
+    """セッションインターフェースをラップし、セッションの読み込み・書き込み時間を記録する"""
+
+    def __init__(self, interface, histogram, open_stage='session_open', save_stage='session_write'):
+        self.interface = interface
+        self.histogram = histogram
+        self.open_stage = open_stage
+        self.save_stage = save_stage
+
+    def __getattr__(self, name):
+        return getattr(self.interface, name)
+
+    def open_session(self, app, request):
+        with self.histogram.time(self.open_stage):
+            return self.interface.open_session(app, request)
+
+    def save_session(self, app, session, response):
+        with self.histogram.time(self.save_stage):
+            return self.interface.save_session(app, session, response)
@@ -0,0 +1,121 @@
+"""
+SMFのノートタイムライン
+
+SMFのバイト列を1回だけ走査し、note_on/note_off を対応付けたノートの一覧を作る。
+Flask アプリに依存しないため、レンダリング用のワーカープロセスからも使える。
+"""
+from collections import namedtuple
+
+DEFAULT_TEMPO = 500000  # マイクロ秒/拍（SMFの既定値 = 120BPM）
+DEFAULT_TICKS_PER_BEAT = 480
+
+# タイムライン上のノート1件（start, duration はティック単位）
+NoteEvent = namedtuple('NoteEvent', ['pitch', 'octave', 'start', 'duration', 'velocity'])
+
+# ステータスバイトごとのデータバイト数（-1 は未定義。0xF0/0xF7/0xFF は可変長で別処理）
+_DATA_LENGTHS = tuple(
+    (1 if 0xC0 <= status < 0xE0 else 2) if 0x80 <= status < 0xF0
+    else {0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0, 0xF8: 0, 0xFA: 0, 0xFB: 0, 0xFC: 0, 0xFE: 0}.get(status, -1)
+    for status in range(256)
+)
+
+
+def build_note_timeline(data):
+    """SMFのバイト列を1回だけ走査し、NoteEvent のリストを開始ティック順で返す
+
+    MidiFile を組み立てずに、ノートイベント以外は読み飛ばす。note_on と note_off
+    （ベロシティ0の note_on を含む）は絶対ティックで対応付けるため、複数トラックや
+    重なった音でも長さが正しくなる。閉じられないままトラックが終わった音はトラック末尾で閉じる。
+    不正なデータは ValueError/IndexError。
+    """
+    if data[:4] != b'MThd':
+        raise ValueError("MThd not found. Probably not a MIDI file")
+    header_size = int.from_bytes(data[4:8], 'big')
+    num_tracks = int.from_bytes(data[10:12], 'big')
+    pos = 8 + header_size
+    data_end = len(data)
+    data_lengths = _DATA_LENGTHS
+    timeline = []
+    tracks_read = 0
+    while tracks_read < num_tracks:
+        if pos + 8 > data_end:
+            raise ValueError("Unexpected end of file")
+        chunk_type = data[pos:pos + 4]
+        end = pos + 8 + int.from_bytes(data[pos + 4:pos + 8], 'big')
+        pos += 8
+        if end > data_end:
+            raise ValueError("Track chunk is truncated")
+        if chunk_type != b'MTrk':
+            # 未知のチャンクは読み飛ばす
+            pos = end
+            continue
+        tracks_read += 1
+        running_status = 0
+        tick = 0
+        open_notes = {}  # (チャンネル, ノート番号) -> [(開始ティック, ベロシティ), ...]
+        while pos < end:
+            # デルタタイム（可変長）
+            delta = 0
+            while True:
+                byte = data[pos]
+                pos += 1
+                delta = (delta << 7) | (byte & 0x7F)
+                if byte < 0x80:
+                    break
+            tick += delta
+            status = data[pos]
+            if status < 0x80:
+                # ランニングステータス
+                if not running_status:
+                    raise ValueError("Running status without last status")
+                status = running_status
+            else:
+                pos += 1
+                if status != 0xFF:
+                    running_status = status
+            if status == 0xFF or status == 0xF0 or status == 0xF7:
+                if status == 0xFF:
+                    pos += 1  # メタイベントの種類
+                length = 0
+                while True:
+                    byte = data[pos]
+                    pos += 1
+                    length = (length << 7) | (byte & 0x7F)
+                    if byte < 0x80:
+                        break
+                pos += length
+                continue
+            size = data_lengths[status]
+            if size < 0:
+                raise ValueError(f"Undefined status byte 0x{status:02x}")
+            kind = status & 0xF0
+            if kind == 0x90 or kind == 0x80:
+                note = data[pos]
+                velocity = data[pos + 1]
+                key = (status & 0x0F, note)
+                if kind == 0x90 and velocity:
+                    open_notes.setdefault(key, []).append((tick, velocity))
+                else:
+                    pending = open_notes.get(key)
+                    if pending:
+                        # 同じ音が重なっている場合は先に鳴らした方から閉じる
+                        start, on_velocity = pending.pop(0)
+                        timeline.append(NoteEvent(note, note // 12 - 1, start, tick - start, on_velocity))
+            pos += size
+        if pos != end:
+            raise ValueError("Track data overruns chunk length")
+        for (_, note), pending in open_notes.items():
+            for start, on_velocity in pending:
+                timeline.append(NoteEvent(note, note // 12 - 1, start, tick - start, on_velocity))
+    timeline.sort(key=lambda event: event.start)
+    return timeline
+
+
+def header_ticks_per_beat(data):
+    """SMFヘッダの分解能（拍あたりのティック数）。SMPTE形式などで読めなければ既定値"""
+    if data[:4] != b'MThd' or len(data) < 14:
+        raise ValueError("MThd not found. Probably not a MIDI file")
+    division = int.from_bytes(data[12:14], 'big')
+    if division & 0x8000 or division == 0:
+        return DEFAULT_TICKS_PER_BEAT
+    return division
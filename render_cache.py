@@ -0,0 +1,85 @@
+"""
+レンダリング結果のコンテンツアドレス型キャッシュ
+
+MIDIバイト列とレンダリング設定のハッシュをキーに音声ファイルを保存し、
+同じ内容の再レンダリングを省く。容量を超えたら最終利用が古いものから削除する。
+"""
+import os
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """ディスク上のレンダリング結果キャッシュ（容量上限付きLRU）"""
+
+    def __init__(self, directory, max_bytes, extension='.wav'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+
+    @staticmethod
+    def make_key(midi_bytes, **settings):
+        """MIDIバイト列とレンダリング設定からキャッシュキーを作る"""
+        digest = hashlib.sha256(midi_bytes)
+        for name in sorted(settings):
+            digest.update(f"\0{name}={settings[name]}".encode())
+        return digest.hexdigest()
+
+    def ensure_directory(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + self.extension)
+
+    def contains(self, path):
+        """path がキャッシュディレクトリ内のファイルか"""
+        base = os.path.abspath(self.directory)
+        return os.path.abspath(path).startswith(base + os.sep)
+
+    def lookup(self, key):
+        """キャッシュ済みならパスを返し、最終利用時刻を更新する（なければNone）"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _entries(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(self.extension):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def size(self):
+        """キャッシュの合計バイト数"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """容量上限を超えた分を最終利用が古い順に削除し、解放したバイト数を返す"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error evicting {path}: {e}")
+                continue
+            total -= size
+            freed += size
+        if freed:
+            logger.info(f"Render cache evicted {freed} bytes")
+        return freed
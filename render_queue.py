@@ -0,0 +1,219 @@
+"""
+MIDI→音声レンダリングのバックグラウンドキュー
+
+リクエスト処理中にレンダリングを待たないよう、ジョブをプロセスプールに投入し、
+状態を job_id で参照できるようにする。
+"""
+import os
+import re
+import json
+import subprocess
+import threading
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# ジョブ状態
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+DEFAULT_SAMPLE_RATE = 44100
+
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+def render_with_timidity(midi_path, output_path, sample_rate=DEFAULT_SAMPLE_RATE, timeout=60):
+    """Timidity++ でMIDIをWAVに変換し、出力パスを返す
+
+    一時ファイル名はジョブごとに変えるため、同じ出力先を同時にレンダリングしても混ざらない。
+    """
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+    result = subprocess.run(
+        ['timidity', midi_path, '-Ow', '-s', str(sample_rate), '-o', temp_path],
+        capture_output=True,
+        timeout=timeout,
+    )
+    if result.returncode != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        stderr = result.stderr.decode(errors='replace').strip()
+        raise RuntimeError(f"Timidity error: {stderr}")
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def render_coalesced(midi_path, output_path, renderer, lock_dir=None, **kwargs):
+    """同じ出力先へのレンダリングを、他のワーカープロセスも含めて1回にまとめる（ジョブとして実行）
+
+    lock_dir のロックファイルで排他を取り、その間に出力が出来ていればレンダリングしない。
+    """
+    value, _ = SingleFlight(lock_dir).do(
+        output_path,
+        lambda: renderer(midi_path, output_path, **kwargs),
+        lookup=lambda: output_path if os.path.isfile(output_path) else None,
+    )
+    return value
+
+
+class RenderJob:
+    """レンダリングジョブ1件分の情報"""
+
+    def __init__(self, job_id, midi_path, output_path, future):
+        self.job_id = job_id
+        self.midi_path = midi_path
+        self.output_path = output_path
+        self.future = future
+
+    @property
+    def status(self):
+        if self.future.done():
+            if self.future.cancelled() or self.future.exception() is not None:
+                return STATUS_FAILED
+            return STATUS_DONE
+        if self.future.running():
+            return STATUS_RUNNING
+        return STATUS_QUEUED
+
+    @property
+    def error(self):
+        if self.future.done() and not self.future.cancelled():
+            exc = self.future.exception()
+            return str(exc) if exc is not None else None
+        return None
+
+    def to_dict(self):
+        return {'job_id': self.job_id, 'status': self.status, 'error': self.error}
+
+
+class RenderJobStore:
+    """ジョブ状態をディレクトリに1ジョブ1ファイルで保存する
+
+    RenderQueue のジョブ情報は投入したプロセスにしかないため、gunicorn の他のワーカーは
+    ここから状態と出力先を読む。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, job_id):
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def write(self, job_id, status, output_path, error=None):
+        path = self._path(job_id)
+        if path is None:
+            raise ValueError(f"Invalid job id: {job_id}")
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        with open(temp_path, 'w') as f:
+            json.dump({'job_id': job_id, 'status': status, 'output_path': output_path, 'error': error}, f)
+        os.replace(temp_path, path)
+
+    def write_result(self, job):
+        """完了したジョブの状態を書き込む"""
+        self.write(job.job_id, job.status, job.output_path, job.error)
+
+    def read(self, job_id):
+        """ジョブ状態の dict（job_id, status, output_path, error）を返す（無ければNone）"""
+        path = self._path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+class RenderQueue:
+    """レンダリングジョブを受け付けてバックグラウンドで実行するキュー
+
+    readiness（ArtifactReadiness）を渡すと、出力ファイルを投入時に生成中として登録し、
+    ジョブ完了時に通知する。
+    """
+
+    def __init__(self, max_workers=2, executor=None, readiness=None, max_jobs=4096):
+        self._max_workers = max_workers
+        self._executor = executor
+        self._readiness = readiness
+        self._max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # gunicorn のワーカーごとに、最初のジョブ投入時にプールを作る
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            return self._executor
+
+    def submit(self, render_func, midi_path, output_path, **kwargs):
+        """レンダリングジョブを投入し、job_id を返す"""
+        job_id = uuid.uuid4().hex
+        if self._readiness is not None:
+            self._readiness.begin(output_path)
+        try:
+            future = self._get_executor().submit(render_func, midi_path, output_path, **kwargs)
+        except Exception:
+            if self._readiness is not None:
+                self._readiness.finish(output_path)
+            raise
+        job = RenderJob(job_id, midi_path, output_path, future)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune_locked()
+        future.add_done_callback(lambda f: self._on_done(job))
+        logger.info(f"Render job '{job_id}' queued for {midi_path}")
+        return job_id
+
+    def _on_done(self, job):
+        if self._readiness is not None:
+            self._readiness.finish(job.output_path)
+        if job.status == STATUS_FAILED:
+            logger.error(f"Render job '{job.job_id}' failed: {job.error}")
+        else:
+            logger.info(f"Render job '{job.job_id}' finished: {job.output_path}")
+
+    def _prune_locked(self):
+        # 上限を超えたら完了済みの古いジョブから情報を破棄
+        if len(self._jobs) <= self._max_jobs:
+            return
+        for job_id in [j for j, job in self._jobs.items() if job.future.done()]:
+            del self._jobs[job_id]
+            if len(self._jobs) <= self._max_jobs:
+                break
+
+    def get(self, job_id):
+        """job_id に対応する RenderJob を返す（存在しなければNone）"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """ジョブ状態を dict で返す（存在しなければNone）"""
+        job = self.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def add_done_callback(self, job_id, callback):
+        """ジョブ完了時に callback(job) を呼ぶ"""
+        job = self.get(job_id)
+        if job is not None:
+            job.future.add_done_callback(lambda f: callback(job))
+
+    def cancel(self, job_id):
+        """未実行のジョブを取り消す"""
+        job = self.get(job_id)
+        return job.future.cancel() if job is not None else False
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
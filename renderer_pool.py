@@ -0,0 +1,233 @@
+"""
+常駐レンダリングワーカーのプール
+
+ワーカープロセスを起動したままにし、パイプ経由でジョブを受け取る。起動時に一度だけ
+initializer（シンセサイザーの波形の準備など）を実行するため、各ジョブは合成の時間だけで済む。
+一定数のジョブを処理した後や、起動直後からのメモリ増加が上限を超えた後は、ワーカーを
+作り直す（異常終了した場合も作り直す）。
+
+concurrent.futures.Executor と同じ呼び出し方ができるため、RenderQueue の executor にも使える。
+"""
+import os
+import queue
+import logging
+import threading
+import itertools
+import multiprocessing
+from concurrent.futures import Executor, Future
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_JOBS = 1000
+
+
+def _rss_bytes():
+    """現在のプロセスの常駐メモリ量（バイト）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _worker_main(conn, initializer, initargs, max_jobs, max_memory_growth):
+    """ワーカープロセスの本体: (関数, 引数, キーワード引数) を受け取り、(状態, 値, 作り直すか) を返す"""
+    if initializer is not None:
+        initializer(*initargs)
+    baseline = _rss_bytes()
+    for handled in itertools.count(1):
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        func, args, kwargs = job
+        try:
+            status, value = 'ok', func(*args, **kwargs)
+        except Exception as e:
+            status, value = 'error', e
+        recycle = handled >= max_jobs or (
+            max_memory_growth is not None and _rss_bytes() - baseline > max_memory_growth
+        )
+        try:
+            conn.send((status, value, recycle))
+        except OSError:
+            # プール側がパイプを閉じた
+            break
+        except Exception as e:
+            # 戻り値や例外を pickle できない場合
+            conn.send(('error', RuntimeError(f"unpicklable render result: {e!r}"), recycle))
+        if recycle:
+            break
+    conn.close()
+
+
+class _Worker:
+    """ワーカープロセスとパイプの組"""
+
+    def __init__(self, context, initializer, initargs, max_jobs, max_memory_growth):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, initializer, initargs, max_jobs, max_memory_growth),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def run(self, func, args, kwargs):
+        self.conn.send((func, args, kwargs))
+        return self.conn.recv()
+
+    def close(self, timeout=5):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class RendererPool(Executor):
+    """常駐ワーカーでジョブを実行するプール
+
+    ワーカーは最初のジョブ投入時（または start() 呼び出し時）に起動する。
+    max_memory_growth（バイト）を指定すると、起動直後よりメモリがそれ以上増えたワーカーを作り直す。
+    """
+
+    def __init__(self, size=2, initializer=None, initargs=(), max_jobs=DEFAULT_MAX_JOBS,
+                 max_memory_growth=None, mp_context=None):
+        if size <= 0:
+            raise ValueError("size must be positive")
+        if max_jobs <= 0:
+            raise ValueError("max_jobs must be positive")
+        self.size = size
+        self._initializer = initializer
+        self._initargs = tuple(initargs)
+        self._max_jobs = max_jobs
+        self._max_memory_growth = max_memory_growth
+        self._context = mp_context or multiprocessing.get_context('spawn')
+        self._jobs = queue.SimpleQueue()
+        self._threads = []
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._stats = {'workers': 0, 'jobs_completed': 0, 'jobs_failed': 0,
+                       'workers_recycled': 0, 'workers_crashed': 0}
+
+    def start(self):
+        """ワーカーを起動しておく（最初のジョブで初期化を待たないように）"""
+        with self._lock:
+            self._start_locked()
+        return self
+
+    def _start_locked(self):
+        if self._shutdown:
+            raise RuntimeError('cannot schedule new futures after shutdown')
+        if self._threads:
+            return
+        for index in range(self.size):
+            thread = threading.Thread(target=self._dispatch, name=f'renderer-pool-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            self._start_locked()
+            future = Future()
+            self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self._stats[name] += delta
+
+    def _spawn(self):
+        try:
+            worker = _Worker(self._context, self._initializer, self._initargs,
+                             self._max_jobs, self._max_memory_growth)
+        except Exception as e:
+            logger.error(f"Failed to start renderer worker: {e}")
+            return None
+        self._count('workers')
+        return worker
+
+    def _retire(self, worker):
+        worker.close()
+        self._count('workers', -1)
+
+    def _dispatch(self):
+        """ワーカー1つを受け持ち、キューのジョブを順に実行するスレッド"""
+        worker = self._spawn()
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                break
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if worker is None:
+                worker = self._spawn()
+                if worker is None:
+                    future.set_exception(RuntimeError('renderer worker could not be started'))
+                    self._count('jobs_failed')
+                    continue
+            try:
+                status, value, recycle = worker.run(fn, args, kwargs)
+            except (EOFError, OSError):
+                exitcode = worker.process.exitcode
+                self._retire(worker)
+                self._count('workers_crashed')
+                logger.error(f"Renderer worker exited unexpectedly (exit code {exitcode})")
+                future.set_exception(RuntimeError(f'renderer worker exited unexpectedly (exit code {exitcode})'))
+                self._count('jobs_failed')
+                worker = self._spawn()
+                continue
+            except Exception as e:
+                # ジョブを pickle できない場合（ワーカーはそのまま使える）
+                future.set_exception(e)
+                self._count('jobs_failed')
+                continue
+            if status == 'ok':
+                future.set_result(value)
+                self._count('jobs_completed')
+            else:
+                future.set_exception(value)
+                self._count('jobs_failed')
+            if recycle:
+                self._retire(worker)
+                self._count('workers_recycled')
+                logger.info('Renderer worker recycled')
+                worker = self._spawn()
+        if worker is not None:
+            self._retire(worker)
+
+    def stats(self):
+        """起動中のワーカー数と処理件数の dict"""
+        with self._lock:
+            return dict(self._stats)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._lock:
+            if self._shutdown:
+                threads = []
+            else:
+                self._shutdown = True
+                threads = self._threads
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0].cancel()
+        for _ in threads:
+            self._jobs.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
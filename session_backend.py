@@ -0,0 +1,94 @@
+"""
+セッションバックエンドの切り替え
+
+SESSION_BACKEND で以下を選択する。
+- 'filesystem': Flask-Session のファイル保存（従来の動作）
+- 'memory': プロセス内のLRUストア（ディスク書き込みなし）。他のワーカープロセスからは見えないため、
+  ワーカー1つでのみ使える（複数ワーカーでの起動は gunicorn.conf.py の on_starting で拒否する）
+- 'cookie': 署名付きCookie（サーバー側の状態を持たず、成果物IDのみを保持）
+"""
+import secrets
+import threading
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SecureCookieSessionInterface, SecureCookieSession
+from flask_session import Session
+
+SESSION_BACKENDS = ('filesystem', 'memory', 'cookie')
+
+
+class LRUSession(SecureCookieSession):
+    """セッションIDを持つセッション"""
+
+    def __init__(self, initial=None, sid=None):
+        super().__init__(initial)
+        self.sid = sid
+
+
+class LRUSessionInterface(SessionInterface):
+    """プロセス内のLRUストアにセッションを保存する（ワーカー1つでのみ使える）
+
+    CookieにはランダムなセッションIDのみを載せ、内容は変更があったときだけ保存する。
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._store = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            with self._lock:
+                data = self._store.get(sid)
+                if data is not None:
+                    self._store.move_to_end(sid)
+                    return LRUSession(dict(data), sid=sid)
+        return LRUSession(sid=secrets.token_urlsafe(32))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified:
+                with self._lock:
+                    self._store.pop(session.sid, None)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not self.should_set_cookie(app, session):
+            return
+        if session.modified:
+            with self._lock:
+                self._store[session.sid] = dict(session)
+                self._store.move_to_end(session.sid)
+                while len(self._store) > self.maxsize:
+                    self._store.popitem(last=False)
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def __len__(self):
+        with self._lock:
+            return len(self._store)
+
+
+def configure_session(app):
+    """app.config['SESSION_BACKEND'] に応じてセッションインターフェースを設定する"""
+    backend = app.config.get('SESSION_BACKEND', 'filesystem')
+    if backend == 'filesystem':
+        Session(app)
+    elif backend == 'memory':
+        app.session_interface = LRUSessionInterface(app.config.get('SESSION_LRU_SIZE', 10000))
+    elif backend == 'cookie':
+        app.session_interface = SecureCookieSessionInterface()
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}. Must be one of: {', '.join(SESSION_BACKENDS)}")
+    return app.session_interface
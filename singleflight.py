@@ -0,0 +1,117 @@
+"""
+同じキーの同時実行をまとめる（single-flight）
+
+同じ内容（キー）のレンダリングなどが同時に要求されたとき、1つだけを実行し、
+残りはその完了を待って同じ結果を受け取る。プロセス内はスレッド間で結果を共有し、
+lock_dir を指定すると gunicorn の他のワーカープロセスともロックファイル（flock）で
+実行を1つにまとめる（他プロセスの結果は lookup で読み直す）。
+"""
+import os
+import hashlib
+import threading
+from contextlib import nullcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス内のみでまとめる
+    fcntl = None
+
+DEFAULT_LOCK_STRIPES = 256
+
+
+class _Call:
+    """実行中の呼び出し1件分"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """キーごとに同時実行を1つにまとめる
+
+    ロックファイルはキーのハッシュで lock_stripes 個に振り分けるため、ファイル数は増え続けない。
+    """
+
+    def __init__(self, lock_dir=None, lock_stripes=DEFAULT_LOCK_STRIPES):
+        self.lock_dir = lock_dir
+        self.lock_stripes = lock_stripes
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute, lookup=None):
+        """key の結果を (値, 他の実行結果を共有したか) で返す
+
+        同じプロセスで同じキーを実行中であれば、その完了を待って結果（例外も）を共有する。
+        lock_dir があれば他プロセスとの排他を取り、取得後に lookup() が None 以外を返せば
+        （他プロセスが先に作った結果として）compute() を実行せずにそれを返す。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        shared = False
+        try:
+            with self._process_lock(key):
+                value = lookup() if lookup is not None else None
+                if value is not None:
+                    shared = True
+                else:
+                    value = compute()
+            call.value = value
+            return value, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        """このプロセスで実行中のキーの数"""
+        with self._lock:
+            return len(self._calls)
+
+    def _lock_path(self, key):
+        digest = hashlib.sha256(str(key).encode()).digest()
+        stripe = int.from_bytes(digest[:4], 'big') % self.lock_stripes
+        return os.path.join(self.lock_dir, f'{stripe:03d}.lock')
+
+    def _process_lock(self, key):
+        if self.lock_dir is None or fcntl is None:
+            return nullcontext()
+        return _FileLock(self._lock_path(key))
+
+
+class _FileLock:
+    """flock による他プロセスとの排他ロック"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a+b')
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            self._file.close()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+        return False
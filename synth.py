@@ -0,0 +1,234 @@
+"""
+NumPy による内蔵シンセサイザー
+
+ノートのタイムラインを倍音加算のウェーブテーブルと ADSR エンベロープでPCMに変換する。
+timidity のようにジョブごとにプロセスを起動しないため、数ミリ秒でWAVを作れる。
+任意の区間だけを合成できる（区間をつなげると全体を合成した結果と一致する）ため、
+ストリーミング配信や区間ごとの並列レンダリングにも使う。
+"""
+import os
+import uuid
+import struct
+import threading
+
+import numpy as np
+
+from midi_timeline import build_note_timeline, header_ticks_per_beat, DEFAULT_TEMPO, DEFAULT_TICKS_PER_BEAT
+
+DEFAULT_SAMPLE_RATE = 44100
+WAVETABLE_SIZE = 2048
+HARMONICS = (1.0, 0.5, 0.25, 0.125, 0.0625)  # 基音からの倍音の振幅
+WAV_HEADER_SIZE = 44
+
+
+def wav_header(num_samples, sample_rate=DEFAULT_SAMPLE_RATE, channels=1, sample_width=2):
+    """PCM（リトルエンディアン）のWAVヘッダ。サンプル数が分かっていれば本体より先に送れる"""
+    data_size = num_samples * channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate,
+        sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b'data', data_size,
+    )
+
+
+def to_pcm16(samples):
+    """[-1, 1] の浮動小数点サンプルを16bit PCMのバイト列にする"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+class Synthesizer:
+    """ウェーブテーブル合成のモノラルシンセサイザー
+
+    ピッチごとの波形とノート長ごとのエンベロープはキャッシュして再利用する（スレッドセーフ）。
+    """
+
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, attack=0.01, decay=0.1, sustain=0.7,
+                 release=0.2, harmonics=HARMONICS, gain=0.25):
+        if attack <= 0 or release <= 0:
+            raise ValueError("attack and release must be positive")
+        self.sample_rate = sample_rate
+        self.attack = int(attack * sample_rate)
+        self.decay = int(decay * sample_rate)
+        self.sustain = sustain
+        self.release = int(release * sample_rate)
+        self.gain = gain
+        phase = np.arange(WAVETABLE_SIZE) / WAVETABLE_SIZE
+        table = sum(amplitude * np.sin(2 * np.pi * (k + 1) * phase) for k, amplitude in enumerate(harmonics))
+        self._wavetable = (table / np.abs(table).max()).astype(np.float32)
+        self._waves = {}
+        self._envelopes = {}
+        self._lock = threading.Lock()
+
+    def wave(self, pitch, length):
+        """ピッチの波形（先頭から length サンプル以上）。足りなければ倍の長さで作り直す"""
+        wave = self._waves.get(pitch)
+        if wave is None or len(wave) < length:
+            size = max(length, 2 * len(wave) if wave is not None else self.sample_rate)
+            frequency = 440.0 * 2 ** ((pitch - 69) / 12)
+            # 位相を table 上のインデックスに変換して1度に読み出す
+            step = frequency * WAVETABLE_SIZE / self.sample_rate
+            indices = (np.arange(size) * step).astype(np.int64) % WAVETABLE_SIZE
+            wave = self._wavetable[indices]
+            with self._lock:
+                self._waves[pitch] = wave
+        return wave
+
+    def envelope(self, held):
+        """held サンプル押さえたノートの ADSR エンベロープ（リリースを含む）"""
+        envelope = self._envelopes.get(held)
+        if envelope is None:
+            points = [0, self.attack, self.attack + self.decay]
+            levels = [0.0, 1.0, self.sustain]
+            t = np.arange(held + self.release)
+            release_level = np.interp(held, points, levels)
+            envelope = np.where(
+                t < held,
+                np.interp(t, points, levels),
+                release_level * (1 - (t - held) / self.release),
+            ).astype(np.float32)
+            with self._lock:
+                self._envelopes[held] = envelope
+        return envelope
+
+    def warm(self, pitches=range(128), seconds=2.0):
+        """よく使う波形を事前に作っておく"""
+        for pitch in pitches:
+            self.wave(pitch, int(seconds * self.sample_rate))
+        return self
+
+    def schedule(self, timeline, ticks_per_beat=DEFAULT_TICKS_PER_BEAT, tempo=DEFAULT_TEMPO):
+        """タイムラインを (開始サンプル, 押さえるサンプル数, ピッチ, 振幅) のリストにする"""
+        samples_per_tick = self.sample_rate * tempo / 1_000_000 / ticks_per_beat
+        return [
+            (int(round(event.start * samples_per_tick)), max(1, int(round(event.duration * samples_per_tick))),
+             event.pitch, self.gain * event.velocity / 127)
+            for event in timeline
+        ]
+
+    def total_samples(self, notes):
+        """schedule() の結果を最後のリリースまで鳴らしたときのサンプル数"""
+        return max((start + held + self.release for start, held, _, _ in notes), default=0)
+
+    def render(self, notes, start=0, end=None):
+        """schedule() の結果のうち [start, end) の区間を float32 のサンプル列として合成する
+
+        区間より前に鳴り始めた音の余韻も含めるため、区間ごとの結果をつなげると全体と一致する。
+        """
+        end = self.total_samples(notes) if end is None else end
+        out = np.zeros(max(0, end - start), dtype=np.float32)
+        for note_start, held, pitch, amplitude in notes:
+            length = held + self.release
+            lo = max(note_start, start)
+            hi = min(note_start + length, end)
+            if lo >= hi:
+                continue
+            envelope = self.envelope(held)
+            wave = self.wave(pitch, length)
+            out[lo - start:hi - start] += amplitude * wave[lo - note_start:hi - note_start] * envelope[lo - note_start:hi - note_start]
+        return out
+
+    def notes_in(self, notes, start, end):
+        """[start, end) の区間で鳴っている（余韻を含む）ノートだけを返す"""
+        return [note for note in notes if note[0] < end and note[0] + note[1] + self.release > start]
+
+    def iter_chunks(self, notes, chunk_samples):
+        """先頭から chunk_samples ずつ合成した float32 のサンプル列を順に返す
+
+        区間にかかるノートだけを合成するため、1区間あたりの計算量は曲の長さによらない。
+        """
+        notes = sorted(notes)
+        total = self.total_samples(notes)
+        active = []
+        next_note = 0
+        for start in range(0, total, chunk_samples):
+            end = min(start + chunk_samples, total)
+            while next_note < len(notes) and notes[next_note][0] < end:
+                active.append(notes[next_note])
+                next_note += 1
+            active = [note for note in active if note[0] + note[1] + self.release > start]
+            yield self.render(active, start, end)
+
+    def iter_wav(self, midi_bytes, chunk_samples):
+        """SMFのバイト列を合成しながら、WAVヘッダと chunk_samples ずつのPCMを順に返す
+
+        全体の長さはタイムラインから事前に分かるため、ヘッダは最初に確定した値で送れる。
+        MIDIの解析は呼び出し時に行う（不正なデータはここで ValueError になる）。
+        """
+        notes = self.schedule(build_note_timeline(midi_bytes), header_ticks_per_beat(midi_bytes))
+
+        def generate():
+            yield wav_header(self.total_samples(notes), self.sample_rate)
+            for samples in self.iter_chunks(notes, chunk_samples):
+                yield to_pcm16(samples)
+        return generate()
+
+    def render_midi(self, midi_bytes):
+        """SMFのバイト列を合成し、16bit PCM のWAVバイト列を返す"""
+        notes = self.schedule(build_note_timeline(midi_bytes), header_ticks_per_beat(midi_bytes))
+        samples = self.render(notes)
+        return wav_header(len(samples), self.sample_rate) + to_pcm16(samples)
+
+
+# プロセスごとのシンセサイザー（サンプリング周波数ごとに1つ）
+_synthesizers = {}
+_synthesizers_lock = threading.Lock()
+
+
+def get_synthesizer(sample_rate=DEFAULT_SAMPLE_RATE):
+    with _synthesizers_lock:
+        synthesizer = _synthesizers.get(sample_rate)
+        if synthesizer is None:
+            synthesizer = _synthesizers[sample_rate] = Synthesizer(sample_rate)
+        return synthesizer
+
+
+def warm_synthesizer(sample_rate=DEFAULT_SAMPLE_RATE):
+    """プロセスのシンセサイザーの波形を事前に作る（常駐ワーカーの初期化に使う）"""
+    get_synthesizer(sample_rate).warm()
+
+
+def render_segment(sample_rate, notes, start, end):
+    """プロセスのシンセサイザーで [start, end) の区間を16bit PCMのバイト列にする（ワーカーで実行）"""
+    return to_pcm16(get_synthesizer(sample_rate).render(notes, start, end))
+
+
+def render_midi_segments(midi_bytes, executor, segment_samples, sample_rate=DEFAULT_SAMPLE_RATE):
+    """SMFのバイト列を segment_samples ごとの区間に分けて executor で並列に合成し、WAVバイト列を返す
+
+    各区間はそれより前に鳴り始めた音の余韻も含めて合成されるため、区間の境目で重ね合わせや
+    クロスフェードをしなくても、つなげるだけで一括合成と同じ結果になる。
+    """
+    synthesizer = get_synthesizer(sample_rate)
+    notes = synthesizer.schedule(build_note_timeline(midi_bytes), header_ticks_per_beat(midi_bytes))
+    total = synthesizer.total_samples(notes)
+    futures = [
+        executor.submit(render_segment, sample_rate, synthesizer.notes_in(notes, start, end), start, end)
+        for start, end in ((start, min(start + segment_samples, total)) for start in range(0, total, segment_samples))
+    ]
+    return wav_header(total, sample_rate) + b''.join(future.result() for future in futures)
+
+
+def render_with_synth(midi_path, output_path, sample_rate=DEFAULT_SAMPLE_RATE, executor=None, segment_samples=None):
+    """内蔵シンセサイザーでMIDIをWAVに変換し、出力パスを返す（render_with_timidity と同じ呼び出し方）
+
+    executor と segment_samples を渡すと、区間ごとに executor のワーカーで並列に合成する。
+    """
+    with open(midi_path, 'rb') as f:
+        midi_bytes = f.read()
+    if executor is not None and segment_samples:
+        wav_bytes = render_midi_segments(midi_bytes, executor, segment_samples, sample_rate)
+    else:
+        wav_bytes = get_synthesizer(sample_rate).render_midi(midi_bytes)
+    # 一時ファイル名は呼び出しごとに変え、同じ出力先への同時書き込みが混ざらないようにする
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(wav_bytes)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return output_path
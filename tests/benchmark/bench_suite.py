@@ -0,0 +1,246 @@
+"""
+生成・解析・配信パスのベンチマーク
+
+シード固定のワークロードで、呼び出しごとのレイテンシ・スループット・メモリ割り当てを測定し、
+保存済みのベースラインと比較する。
+
+使用例:
+    python tests/benchmark/bench_suite.py                       # 測定して表示
+    python tests/benchmark/bench_suite.py --save baseline.json  # ベースラインを保存
+    python tests/benchmark/bench_suite.py --compare tests/benchmark/baseline.json
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from cachelib import FileSystemCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# ベンチマーク中はクリーンアップ処理を動かさない（アプリ読み込み前に設定）
+os.environ.setdefault('JANITOR_INTERVAL', '0')
+
+import app as app_module
+from session_backend import configure_session
+
+SEED = 20240101
+DEFAULT_ITERATIONS = 200
+DEFAULT_TOLERANCE = 0.25
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def _sample_midi(count):
+    """シード固定のMIDIバイト列を count 個作る"""
+    return [app_module.generate_seeded_midi('major', 60, SEED + i)[0] for i in range(count)]
+
+
+def _setup_generate_bytes(workdir):
+    return lambda i: app_module._build_random_midi('major', 60, random.Random(SEED + i))
+
+
+def _setup_generate_file(workdir):
+    random.seed(SEED)
+    return lambda i: app_module.generate_random_midi('major', 60, 'bench')
+
+
+def _setup_generate_batch(workdir):
+    return lambda i: app_module.generate_batch('major', 60, 100, seed=SEED + i)
+
+
+def _setup_encode_smf(workdir):
+    melodies = app_module.generate_batch('major', 60, 64, seed=SEED)
+    return lambda i: app_module.encode_smf(**melodies[i % len(melodies)])
+
+
+def _setup_scan_midi(workdir):
+    samples = _sample_midi(64)
+    return lambda i: app_module.scan_midi_notes(samples[i % len(samples)])
+
+
+def _setup_parse_midi(workdir):
+    paths = []
+    for i, midi_bytes in enumerate(_sample_midi(64)):
+        path = os.path.join(workdir, f'parse_{i}.mid')
+        with open(path, 'wb') as f:
+            f.write(midi_bytes)
+        paths.append(path)
+    return lambda i: app_module.parse_midi(paths[i % len(paths)])
+
+
+def _setup_generate_music(workdir):
+    client = app_module.app.test_client()
+
+    def request(i):
+        response = client.post('/generate_music', data={
+            'scale': 'major', 'base_note': '60', 'seed': str(SEED + i), 'events': '1'
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"/generate_music returned {response.status_code}")
+    return request
+
+
+# ワークロード名 -> setup(作業ディレクトリ) が返す func(呼び出し番号)
+WORKLOADS = {
+    'generate_bytes': _setup_generate_bytes,
+    'generate_file': _setup_generate_file,
+    'generate_batch_100': _setup_generate_batch,
+    'encode_smf': _setup_encode_smf,
+    'scan_midi_notes': _setup_scan_midi,
+    'parse_midi': _setup_parse_midi,
+    'generate_music_request': _setup_generate_music,
+}
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, iterations, warmup=None):
+    """func(i) を iterations 回呼び出し、レイテンシ（マイクロ秒）・スループット・割り当て量を返す
+
+    割り当て量は tracemalloc を有効にした別の周回で測るため、レイテンシには影響しない。
+    """
+    warmup = max(1, iterations // 10) if warmup is None else warmup
+    for i in range(warmup):
+        func(i)
+
+    gc.collect()
+    timings = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        func(i)
+        timings.append(time.perf_counter() - call_started)
+    total = time.perf_counter() - started
+
+    allocation_calls = max(1, min(iterations, 50))
+    tracemalloc.start()
+    try:
+        peak = 0
+        baseline, _ = tracemalloc.get_traced_memory()
+        for i in range(allocation_calls):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            func(i)
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - before)
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'mean_us': total / iterations * 1e6,
+        'p50_us': _percentile(timings, 0.5) * 1e6,
+        'p95_us': _percentile(timings, 0.95) * 1e6,
+        'min_us': timings[0] * 1e6,
+        'ops_per_sec': iterations / total,
+        'alloc_peak_kib': peak / 1024,
+        'alloc_retained_kib': (retained - baseline) / allocation_calls / 1024,
+    }
+
+
+def run(names=None, iterations=DEFAULT_ITERATIONS):
+    """ワークロードを実行し、{名前: 測定結果} を返す
+
+    生成ファイルとセッションファイルは一時ディレクトリに書き出し、終了後に削除する。
+    """
+    names = list(WORKLOADS) if names is None else names
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    flask_app = app_module.app
+    previous_folder = flask_app.config['UPLOAD_FOLDER']
+    previous_session_cache = flask_app.config.get('SESSION_CACHELIB')
+    previous_interface = flask_app.session_interface
+    flask_app.config['UPLOAD_FOLDER'] = workdir
+    flask_app.config['SESSION_CACHELIB'] = FileSystemCache(os.path.join(workdir, 'flask_session'))
+    configure_session(flask_app)
+    flask_app.session_interface = app_module.TimedSessionInterface(flask_app.session_interface,
+                                                                   app_module.stage_timings)
+    try:
+        results = {}
+        for name in names:
+            func = WORKLOADS[name](workdir)
+            results[name] = measure(func, iterations)
+        return results
+    finally:
+        flask_app.config['UPLOAD_FOLDER'] = previous_folder
+        if previous_session_cache is None:
+            flask_app.config.pop('SESSION_CACHELIB', None)
+        else:
+            flask_app.config['SESSION_CACHELIB'] = previous_session_cache
+        flask_app.session_interface = previous_interface
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """ベースラインより p50 が tolerance（割合）以上遅くなったワークロードを
+    (名前, 現在の p50, ベースラインの p50) のリストで返す"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            continue
+        if result['p50_us'] > reference['p50_us'] * (1 + tolerance):
+            regressions.append((name, result['p50_us'], reference['p50_us']))
+    return regressions
+
+
+def format_table(results, baseline=None):
+    lines = [f"{'workload':<24}{'p50 us':>12}{'p95 us':>12}{'ops/s':>12}{'peak KiB':>12}{'vs base':>10}"]
+    for name, r in results.items():
+        reference = (baseline or {}).get('results', {}).get(name)
+        ratio = f"{r['p50_us'] / reference['p50_us']:.2f}x" if reference else '-'
+        lines.append(f"{name:<24}{r['p50_us']:>12.1f}{r['p95_us']:>12.1f}{r['ops_per_sec']:>12.0f}"
+                     f"{r['alloc_peak_kib']:>12.1f}{ratio:>10}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run generation/parse/serve benchmarks.')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--only', action='append', choices=sorted(WORKLOADS), help='run only this workload')
+    parser.add_argument('--save', help='write results as a baseline JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed p50 slowdown as a fraction (default 0.25)')
+    args = parser.parse_args(argv)
+
+    results = run(args.only, args.iterations)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_table(results, baseline))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'iterations': args.iterations,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, current, reference in regressions:
+            print(f"REGRESSION {name}: p50 {current:.1f}us vs baseline {reference:.1f}us")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
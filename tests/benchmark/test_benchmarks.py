@@ -0,0 +1,91 @@
+"""
+ベンチマークスイートのテスト
+
+各ワークロードを少ない回数で実行し、測定結果の形式と、保存済みベースラインからの
+大幅な劣化（既定では10倍以上）がないことを確認する。厳密な比較は bench_suite.py --compare で行う。
+
+実行時間に依存するテストは環境によって結果が揺れるため、既定の pytest 実行では飛ばす。
+RUN_BENCHMARKS=1 を設定したときだけ実行する。
+"""
+import pytest
+import json
+import os
+from bench_suite import WORKLOADS, BASELINE_PATH, run, compare, measure, format_table
+
+SMOKE_ITERATIONS = 5
+SMOKE_TOLERANCE = 9.0  # ベースラインの10倍まで
+
+requires_benchmarks = pytest.mark.skipif(
+    os.environ.get('RUN_BENCHMARKS', '').strip().lower() not in ('1', 'true', 'yes', 'on'),
+    reason='set RUN_BENCHMARKS=1 to run timed benchmarks',
+)
+
+
+@pytest.fixture(scope='module')
+def smoke_results():
+    return run(iterations=SMOKE_ITERATIONS)
+
+
+@pytest.fixture(scope='module')
+def baseline():
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+@pytest.mark.benchmark
+class TestBenchmarkSuite:
+    """ベンチマークスイートテストクラス"""
+
+    @requires_benchmarks
+    def test_all_workloads_measured(self, smoke_results):
+        """全ワークロードの結果が揃うテスト"""
+        assert set(smoke_results) == set(WORKLOADS)
+        for result in smoke_results.values():
+            assert result['iterations'] == SMOKE_ITERATIONS
+            assert 0 < result['min_us'] <= result['p50_us'] <= result['p95_us']
+            assert result['ops_per_sec'] > 0
+            assert result['alloc_peak_kib'] >= 0
+
+    def test_baseline_covers_all_workloads(self, baseline):
+        """ベースラインに全ワークロードが含まれるテスト"""
+        assert set(baseline['results']) == set(WORKLOADS)
+
+    @requires_benchmarks
+    def test_no_large_regression(self, smoke_results, baseline):
+        """ベースラインから大幅に劣化していないテスト"""
+        assert compare(smoke_results, baseline, SMOKE_TOLERANCE) == []
+
+    def test_compare_detects_regression(self):
+        """p50 が許容範囲を超えたワークロードを検出するテスト"""
+        baseline = {'results': {'a': {'p50_us': 100.0}, 'b': {'p50_us': 100.0}}}
+        results = {'a': {'p50_us': 130.0}, 'b': {'p50_us': 120.0}, 'c': {'p50_us': 1.0}}
+        assert compare(results, baseline, 0.25) == [('a', 130.0, 100.0)]
+
+    def test_measure_counts_calls(self):
+        """ウォームアップ・計測・割り当て計測の呼び出し回数のテスト"""
+        calls = []
+        result = measure(calls.append, 20, warmup=3)
+        assert len(calls) == 3 + 20 + 20
+        assert result['iterations'] == 20
+
+    def test_generated_files_are_cleaned_up(self, test_app):
+        """生成ファイルを一時ディレクトリに書き、UPLOAD_FOLDER を元に戻すテスト"""
+        folder = test_app.config['UPLOAD_FOLDER']
+        run(['generate_file'], iterations=2)
+        assert test_app.config['UPLOAD_FOLDER'] == folder
+        assert os.listdir(folder) == []
+
+    def test_sessions_are_written_to_workdir(self, test_app, temp_dir, monkeypatch):
+        """リクエストのワークロードがセッションを作業ディレクトリに書き、セッション設定を元に戻すテスト"""
+        monkeypatch.chdir(temp_dir)
+        interface = test_app.session_interface
+        run(['generate_music_request'], iterations=2)
+        assert test_app.session_interface is interface
+        assert os.listdir(temp_dir) == []
+
+    @requires_benchmarks
+    def test_format_table(self, smoke_results, baseline):
+        """ベースライン比を含む表を出力するテスト"""
+        table = format_table(smoke_results, baseline)
+        for name in WORKLOADS:
+            assert name in table
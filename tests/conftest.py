@@ -10,6 +10,9 @@ import shutil
 # テスト実行時に親ディレクトリをパスに追加
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + '/..'))
 
+# テスト中はバックグラウンドのクリーンアップを起動しない
+os.environ.setdefault('JANITOR_INTERVAL', '0')
+
 from flask import Flask
 from app import app, generate_random_midi
 
@@ -39,6 +42,30 @@ def client(test_app):
             yield test_client
 
 
+@pytest.fixture
+def memory_client(test_app):
+    """MIDI_STORAGE='memory' で動作するテストクライアント"""
+    previous = test_app.config['MIDI_STORAGE']
+    test_app.config['MIDI_STORAGE'] = 'memory'
+    with test_app.test_client() as test_client:
+        yield test_client
+    test_app.config['MIDI_STORAGE'] = previous
+
+
+@pytest.fixture
+def session_backend_client(test_app, request):
+    """指定したセッションバックエンドで動作するテストクライアント（間接パラメータで指定）"""
+    from session_backend import configure_session
+    previous_backend = test_app.config['SESSION_BACKEND']
+    previous_interface = test_app.session_interface
+    test_app.config['SESSION_BACKEND'] = request.param
+    configure_session(test_app)
+    with test_app.test_client() as test_client:
+        yield test_client
+    test_app.config['SESSION_BACKEND'] = previous_backend
+    test_app.session_interface = previous_interface
+
+
 @pytest.fixture
 def runner(test_app):
     """Flask CLI テストランナー"""
@@ -0,0 +1,104 @@
+"""
+成果物ID指定のMIDI配信エンドポイントの統合テスト
+"""
+import pytest
+import os
+import time
+import app as app_module
+from janitor import Janitor
+from app import artifact_id_for, publish_artifact, generate_seeded_midi, get_artifact_store
+
+
+def generate(client, **extra):
+    data = {'scale': 'major', 'base_note': '60'}
+    data.update(extra)
+    return client.post('/generate_music', data=data).get_json()
+
+
+@pytest.mark.integration
+class TestArtifacts:
+    """/artifacts エンドポイント統合テストクラス"""
+
+    def test_generate_music_returns_artifact_url(self, client):
+        """生成レスポンスに成果物URLが含まれるテスト"""
+        data = generate(client)
+        assert data['artifact_url'] == f"/artifacts/{data['artifact_id']}.mid"
+
+    def test_artifact_served_with_immutable_headers(self, client):
+        """強いETagとimmutableなCache-Controlで配信されるテスト"""
+        data = generate(client)
+        response = client.get(data['artifact_url'])
+        assert response.status_code == 200
+        assert response.data.startswith(b'MThd')
+        assert response.headers['ETag'] == f'"{data["artifact_id"]}"'
+        assert 'immutable' in response.headers['Cache-Control']
+        assert artifact_id_for(response.data) == data['artifact_id']
+
+    def test_if_none_match_returns_304(self, client):
+        """If-None-Match 一致で304を返すテスト"""
+        data = generate(client)
+        response = client.get(data['artifact_url'], headers={'If-None-Match': f'"{data["artifact_id"]}"'})
+        assert response.status_code == 304
+
+    def test_range_request(self, client):
+        """Rangeリクエストで部分レスポンスを返すテスト"""
+        data = generate(client)
+        response = client.get(data['artifact_url'], headers={'Range': 'bytes=0-3'})
+        assert response.status_code == 206
+        assert response.data == b'MThd'
+
+    def test_artifact_survives_session_regeneration(self, client):
+        """再生成してもセッションと独立して取得できるテスト"""
+        first = generate(client)
+        generate(client)
+        assert client.get(first['artifact_url']).status_code == 200
+
+    def test_same_content_same_artifact(self, client):
+        """同じシードは同じ成果物IDになるテスト"""
+        assert generate(client, seed='11')['artifact_id'] == generate(client, seed='11')['artifact_id']
+
+    def test_unknown_artifact(self, client):
+        """存在しない成果物で404のテスト"""
+        assert client.get(f"/artifacts/{'0' * 32}.mid").status_code == 404
+
+    @pytest.mark.parametrize("artifact_id", ['..%2F..%2Fapp', 'ABC', 'x' * 32])
+    def test_invalid_artifact_id(self, client, artifact_id):
+        """不正な成果物IDで404のテスト"""
+        assert client.get(f'/artifacts/{artifact_id}.mid').status_code == 404
+
+    def test_memory_mode_artifact(self, memory_client):
+        """メモリ保持モードの成果物をRange付きで配信するテスト"""
+        data = generate(memory_client)
+        response = memory_client.get(data['artifact_url'])
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+        partial = memory_client.get(data['artifact_url'], headers={'Range': 'bytes=4-7'})
+        assert partial.status_code == 206
+        assert partial.data == response.data[4:8]
+
+    def test_publish_artifact_is_idempotent(self, test_app):
+        """同じ内容の公開は既存ファイルを再利用するテスト"""
+        with test_app.app_context():
+            midi_bytes, _ = generate_seeded_midi('minor', 48, 1)
+            first = publish_artifact(midi_bytes)
+            path = get_artifact_store().path_for(first)
+            inode = os.stat(path).st_ino
+            assert publish_artifact(midi_bytes) == first
+            assert os.stat(path).st_ino == inode
+
+    @pytest.mark.parametrize("session_backend_client", ["cookie"], indirect=True)
+    def test_reused_artifact_survives_janitor(self, test_app, session_backend_client):
+        """古い成果物を再利用したとき、クリーンアップで削除されないテスト"""
+        first = generate(session_backend_client, seed='7')
+        path = get_artifact_store().path_for(first['artifact_id'])
+        max_age = test_app.config['PERMANENT_SESSION_LIFETIME'].total_seconds()
+        old = time.time() - max_age - 60
+        os.utime(path, (old, old))
+        app_module.artifact_index.record(path, os.path.getsize(path), old)
+
+        second = generate(session_backend_client, seed='7')
+        assert second['artifact_id'] == first['artifact_id']
+        janitor = Janitor(test_app.config['UPLOAD_FOLDER'], app_module.artifact_index, max_age=max_age, interval=0)
+        assert janitor.run_once()['removed_files'] == 0
+        assert session_backend_client.get(second['artifact_url']).status_code == 200
+        assert session_backend_client.get('/download/midi').status_code == 200
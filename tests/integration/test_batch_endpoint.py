@@ -0,0 +1,111 @@
+"""
+一括生成エンドポイントの統合テスト
+"""
+import pytest
+import base64
+import json
+from app import scan_midi_notes, iter_batch_melodies
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+@pytest.mark.integration
+class TestGenerateBatch:
+    """/generate_batch エンドポイント統合テストクラス"""
+
+    def test_streams_ndjson_with_midi(self, client):
+        """NDJSONでBase64のMIDIを返すテスト"""
+        response = client.post('/generate_batch', json={'count': 5, 'scales': ['major'], 'base_notes': [60]})
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        records = read_ndjson(response)
+        assert [r['index'] for r in records] == list(range(5))
+        for record in records:
+            midi_bytes = base64.b64decode(record['midi'])
+            assert midi_bytes.startswith(b'MThd')
+            assert scan_midi_notes(midi_bytes) == record['notes']
+
+    def test_parameter_grid(self, client):
+        """スケール × 基準音の全組み合わせを生成するテスト"""
+        response = client.post('/generate_batch', json={
+            'count': 3, 'scales': ['major', 'minor'], 'base_notes': [48, 60, 72]
+        })
+        records = read_ndjson(response)
+        assert len(records) == 18
+        combos = {(r['scale'], r['base_note']) for r in records}
+        assert combos == {(s, n) for s in ('major', 'minor') for n in (48, 60, 72)}
+
+    def test_form_parameters(self, client):
+        """フォーム（カンマ区切り）でも指定できるテスト"""
+        response = client.post('/generate_batch', data={'count': '2', 'scales': 'major,minor', 'base_notes': '60'})
+        assert len(read_ndjson(response)) == 4
+
+    def test_seed_is_deterministic(self, client):
+        """シード指定で同じ結果になるテスト"""
+        params = {'count': 4, 'scales': ['minor'], 'base_notes': [57], 'seed': 99}
+        first = read_ndjson(client.post('/generate_batch', json=params))
+        second = read_ndjson(client.post('/generate_batch', json=params))
+        assert first == second
+
+    def test_artifact_output(self, client):
+        """output='artifact' で成果物IDを返し、配信できるテスト"""
+        records = read_ndjson(client.post('/generate_batch', json={'count': 2, 'output': 'artifact'}))
+        for record in records:
+            assert 'midi' not in record
+            response = client.get(record['artifact_url'])
+            assert response.status_code == 200
+            assert scan_midi_notes(response.data) == record['notes']
+
+    def test_artifact_output_in_memory(self, memory_client):
+        """メモリ保持でも成果物IDを返すテスト"""
+        records = read_ndjson(memory_client.post('/generate_batch', json={'count': 2, 'output': 'artifact'}))
+        for record in records:
+            assert memory_client.get(record['artifact_url']).status_code == 200
+
+    def test_events(self, client):
+        """events 指定で再生イベントを含むテスト"""
+        records = read_ndjson(client.post('/generate_batch', json={'count': 2, 'events': True}))
+        for record in records:
+            assert len(record['events']) == len(record['notes'])
+
+    def test_does_not_touch_session(self, client):
+        """セッションに何も保存しないテスト"""
+        client.post('/generate_batch', json={'count': 2})
+        with client.session_transaction() as session:
+            assert 'midi_file' not in session
+            assert 'artifact_id' not in session
+
+    @pytest.mark.parametrize("params", [
+        {'count': 0},
+        {'count': 'abc'},
+        {'count': 1, 'scales': ['dorian']},
+        {'count': 1, 'base_notes': [128]},
+        {'count': 1, 'base_notes': ['x']},
+        {'count': 1, 'seed': -1},
+        {'count': 1, 'output': 'wav'},
+        {'count': 10001},
+        {'count': 5001, 'scales': ['major', 'minor'], 'base_notes': [60]},
+    ])
+    def test_invalid_parameters(self, client, params):
+        """不正なパラメータで400を返すテスト"""
+        response = client.post('/generate_batch', json=params)
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+@pytest.mark.unit
+class TestIterBatchMelodies:
+    """iter_batch_melodies テストクラス"""
+
+    def test_chunking_does_not_change_count(self):
+        """チャンク分割しても指定数を生成するテスト"""
+        melodies = list(iter_batch_melodies(['major'], [60, 62], 7, seed=1, chunk_size=3))
+        assert [index for index, _, _, _ in melodies] == list(range(14))
+
+    def test_seeded_results_are_deterministic(self):
+        """シード指定で決定的に生成されるテスト"""
+        first = [m['pitches'].tolist() for _, _, _, m in iter_batch_melodies(['minor'], [48], 5, seed=3)]
+        second = [m['pitches'].tolist() for _, _, _, m in iter_batch_melodies(['minor'], [48], 5, seed=3)]
+        assert first == second
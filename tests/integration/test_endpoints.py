@@ -174,3 +174,54 @@ class TestEndpoints:
         # JSONをパース可能
         data = response.get_json()
         assert isinstance(data, dict)
+
+    def test_generate_music_without_events(self, client):
+        """events 未指定では再生イベントを返さないテスト"""
+        response = client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        assert 'events' not in response.get_json()
+
+    def test_generate_music_with_events(self, client):
+        """events 指定で再生イベントを返すテスト"""
+        response = client.post('/generate_music', data={
+            'scale': 'major',
+            'base_note': '60',
+            'seed': '11',
+            'events': '1'
+        })
+        assert response.status_code == 200
+        data = response.get_json()
+        events = data['events']
+        assert len(events) == len(data['notes'])
+        expected_start = 0.0
+        for note, start, duration, velocity in events:
+            assert 0 <= note <= 127
+            assert start == pytest.approx(expected_start, abs=1e-3)
+            assert duration in (0.125, 0.25, 0.5)
+            assert 40 <= velocity <= 100
+            expected_start += duration
+
+    @pytest.mark.parametrize("session_backend_client", ["cookie"], indirect=True)
+    def test_generate_music_with_events_stateless(self, session_backend_client):
+        """Cookieセッションでも再生イベントを返すテスト"""
+        response = session_backend_client.post('/generate_music', data={'scale': 'minor', 'base_note': '48', 'events': 'true'})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['events']) == len(data['notes'])
+
+    def test_generate_music_with_events_in_memory(self, memory_client):
+        """メモリ保持でも再生イベントを返すテスト"""
+        response = memory_client.post('/generate_music', data={'scale': 'minor', 'base_note': '48', 'events': 'yes'})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['events']) == len(data['notes'])
+
+    def test_events_built_from_generation_timeline(self, client, mocker):
+        """再生イベントを生成時のタイムラインから作り、SMFを解析し直さないテスト"""
+        import app as app_module
+        build = mocker.spy(app_module, 'build_note_timeline')
+        response = client.post('/generate_music', data={'scale': 'major', 'base_note': '60', 'seed': '7', 'events': '1'})
+        assert response.status_code == 200
+        assert build.call_count == 0
+        midi_bytes, _ = app_module.generate_seeded_midi('major', 60, 7)
+        expected = app_module.playback_events(app_module.build_note_timeline(midi_bytes))
+        assert response.get_json()['events'] == expected
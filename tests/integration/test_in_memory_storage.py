@@ -0,0 +1,115 @@
+"""
+メモリ保持モード（MIDI_STORAGE='memory'）の統合テスト
+"""
+import pytest
+import os
+import io
+import logging
+import importlib.util
+from types import SimpleNamespace
+from mido import MidiFile
+import app as app_module
+
+
+@pytest.mark.integration
+class TestInMemoryStorage:
+    """メモリ保持モード統合テストクラス"""
+
+    def test_generate_music_returns_notes(self, memory_client):
+        """生成レスポンスにノートが含まれるテスト"""
+        response = memory_client.post('/generate_music', data={
+            'scale': 'major',
+            'base_note': '60'
+        })
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['notes']) > 0
+        assert data['midi_file'] == '/download/midi'
+
+    def test_no_file_written_to_upload_folder(self, memory_client, test_app):
+        """UPLOAD_FOLDERにファイルが書き出されないテスト"""
+        memory_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        assert os.listdir(test_app.config['UPLOAD_FOLDER']) == []
+        with memory_client.session_transaction() as session:
+            assert 'midi_buffer' in session
+            assert 'midi_file' not in session
+
+    def test_download_midi_served_from_buffer(self, memory_client):
+        """/download/midi がバッファから配信されるテスト"""
+        memory_client.post('/generate_music', data={'scale': 'minor', 'base_note': '48'})
+        response = memory_client.get('/download/midi')
+        assert response.status_code == 200
+        assert response.mimetype == 'audio/midi'
+        midi = MidiFile(file=io.BytesIO(response.data))
+        assert len(midi.tracks) > 0
+
+    def test_random_mp3_served_from_buffer(self, memory_client):
+        """/random.mp3 がバッファから配信されるテスト"""
+        memory_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        response = memory_client.get('/random.mp3')
+        assert response.status_code == 200
+        assert response.data.startswith(b'MThd')
+
+    def test_clear_session_discards_buffer(self, memory_client):
+        """セッションクリアでバッファが破棄されるテスト"""
+        memory_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        memory_client.post('/clear_session')
+        assert memory_client.get('/download/midi').status_code == 404
+        assert memory_client.get('/random.mp3').status_code == 404
+
+
+@pytest.fixture(scope='module')
+def gunicorn_conf():
+    """gunicorn.conf.py をモジュールとして読み込む"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'gunicorn.conf.py')
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_server(workers, raw_env=()):
+    """on_starting に渡す gunicorn の Arbiter の代わり"""
+    from gunicorn.config import Config
+    cfg = Config()
+    cfg.set('workers', workers)
+    cfg.set('raw_env', list(raw_env))
+    return SimpleNamespace(cfg=cfg, log=logging.getLogger('gunicorn.error'))
+
+
+@pytest.mark.unit
+class TestWorkerCountCheck:
+    """複数ワーカーでのプロセス内保持（MIDI・セッション）を拒否するテスト"""
+
+    def test_memory_storage_rejected_with_multiple_workers(self, gunicorn_conf):
+        """メモリ保持モードで複数ワーカーなら起動を拒否するテスト"""
+        with pytest.raises(RuntimeError, match='single worker'):
+            gunicorn_conf.check_worker_settings(3, {'MIDI_STORAGE': 'memory'})
+        gunicorn_conf.check_worker_settings(1, {'MIDI_STORAGE': 'memory'})
+
+    def test_disk_storage_allows_multiple_workers(self, gunicorn_conf):
+        """ディスク保存（既定）なら複数ワーカーでも起動できるテスト"""
+        gunicorn_conf.check_worker_settings(3, {'MIDI_STORAGE': 'disk'})
+        gunicorn_conf.check_worker_settings(3, {})
+
+    def test_memory_session_backend_rejected_with_multiple_workers(self, gunicorn_conf):
+        """プロセス内のセッションストアで複数ワーカーなら起動を拒否するテスト"""
+        with pytest.raises(RuntimeError, match="SESSION_BACKEND='memory'"):
+            gunicorn_conf.check_worker_settings(3, {'SESSION_BACKEND': 'memory'})
+        gunicorn_conf.check_worker_settings(1, {'SESSION_BACKEND': 'memory'})
+        gunicorn_conf.check_worker_settings(3, {'SESSION_BACKEND': 'cookie'})
+        gunicorn_conf.check_worker_settings(3, {'SESSION_BACKEND': 'filesystem'})
+
+    def test_on_starting_reads_configured_workers(self, gunicorn_conf, monkeypatch):
+        """on_starting が gunicorn の設定のワーカー数で起動を止めるテスト"""
+        monkeypatch.setenv('MIDI_STORAGE', 'memory')
+        with pytest.raises(SystemExit):
+            gunicorn_conf.on_starting(make_server(3))
+        gunicorn_conf.on_starting(make_server(1))
+
+    def test_on_starting_reads_raw_env(self, gunicorn_conf, monkeypatch):
+        """--env で渡した設定も確認するテスト"""
+        monkeypatch.delenv('MIDI_STORAGE', raising=False)
+        with pytest.raises(SystemExit):
+            gunicorn_conf.on_starting(make_server(2, ['MIDI_STORAGE=memory']))
+        gunicorn_conf.on_starting(make_server(2))
@@ -0,0 +1,55 @@
+"""
+/metrics エンドポイントの統合テスト
+"""
+import pytest
+import app as app_module
+
+
+@pytest.fixture
+def fresh_timings():
+    app_module.stage_timings.clear()
+    app_module.request_timings.clear()
+    yield
+    app_module.stage_timings.clear()
+    app_module.request_timings.clear()
+
+
+def count_of(text, metric, label):
+    for line in text.splitlines():
+        if line.startswith(f'{metric}_count{{{label}}}'):
+            return int(line.rsplit(' ', 1)[1])
+    return 0
+
+
+@pytest.mark.integration
+class TestMetricsEndpoint:
+    """/metrics エンドポイント統合テストクラス"""
+
+    def test_prometheus_content_type(self, client, fresh_timings):
+        """Prometheus テキスト形式で返すテスト"""
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        assert '# TYPE melody_stage_duration_seconds histogram' in response.get_data(as_text=True)
+
+    def test_generate_music_stages_recorded(self, client, fresh_timings):
+        """生成リクエストの各段階が記録されるテスト"""
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60', 'events': '1'})
+        text = client.get('/metrics').get_data(as_text=True)
+        for stage in ('generation', 'file_save', 'render', 'session_write'):
+            assert count_of(text, 'melody_stage_duration_seconds', f'stage="{stage}"') == 1, stage
+        # 再生用のイベント列は生成時のタイムラインから作るため、SMFを解析し直さない
+        assert count_of(text, 'melody_stage_duration_seconds', 'stage="parse"') == 0
+        assert count_of(text, 'melody_request_duration_seconds', 'endpoint="generate_music"') == 1
+
+    def test_parse_midi_recorded(self, test_app, temp_midi_file, fresh_timings):
+        """parse_midi の時間が記録されるテスト"""
+        app_module.parse_midi(temp_midi_file)
+        assert app_module.stage_timings.snapshot('parse')[2] == 1
+
+    def test_janitor_stats_exported(self, client, fresh_timings):
+        """クリーンアップ統計をゲージとして出力するテスト"""
+        text = client.get('/metrics').get_data(as_text=True)
+        assert 'melody_janitor_removed_files ' in text
+        assert 'melody_janitor_tracked_bytes ' in text
+        assert 'melody_midi_buffers ' in text
@@ -0,0 +1,197 @@
+"""
+バックグラウンドレンダリングの統合テスト
+"""
+import pytest
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import app as app_module
+from app import ArtifactReadiness
+from render_queue import RenderQueue, RenderJobStore
+
+
+def fake_render(midi_path, output_path, **kwargs):
+    with open(output_path, 'wb') as f:
+        f.write(b'RIFF-test-audio')
+    return output_path
+
+
+@pytest.fixture
+def render_client(client, test_app, mocker):
+    """テスト用レンダラーを有効にしたテストクライアント"""
+    queue = RenderQueue(executor=ThreadPoolExecutor(max_workers=1), readiness=app_module.artifact_readiness)
+    mocker.patch.object(app_module, 'render_queue', queue)
+    mocker.patch.dict(app_module.AUDIO_RENDERERS, {'fake': fake_render})
+    mocker.patch.dict(test_app.config, {'AUDIO_RENDERER': 'fake'})
+    yield client
+    queue.shutdown()
+
+
+@pytest.mark.integration
+class TestRenderJobs:
+    """レンダリングジョブ統合テストクラス"""
+
+    def test_generate_music_returns_render_job(self, render_client):
+        """生成レスポンスにジョブ情報が含まれるテスト"""
+        response = render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        data = response.get_json()
+        assert response.status_code == 200
+        assert 'render_job' in data
+        assert data['render_status'] == f"/render_status/{data['render_job']}"
+
+    def test_render_status_endpoint(self, render_client):
+        """ジョブ状態エンドポイントのテスト"""
+        data = render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        app_module.render_queue.get(data['render_job']).future.result(timeout=5)
+        status = render_client.get(data['render_status']).get_json()
+        assert status['status'] == 'done'
+        assert status['audio_url'] == '/random.mp3'
+
+    def test_render_status_unknown_job(self, client):
+        """存在しないジョブで404のテスト"""
+        assert client.get('/render_status/unknown').status_code == 404
+
+    def test_random_mp3_serves_rendered_audio(self, render_client):
+        """/random.mp3 がレンダリング結果を返すテスト"""
+        render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        response = render_client.get('/random.mp3')
+        assert response.status_code == 200
+        assert response.mimetype == 'audio/wav'
+        assert response.data == b'RIFF-test-audio'
+
+    def test_random_mp3_falls_back_to_midi_on_failure(self, render_client, mocker):
+        """レンダリング失敗時はMIDIを返すテスト"""
+        def broken(midi_path, output_path, **kwargs):
+            raise RuntimeError("boom")
+        mocker.patch.dict(app_module.AUDIO_RENDERERS, {'fake': broken})
+        render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        response = render_client.get('/random.mp3')
+        assert response.status_code == 200
+        assert response.data.startswith(b'MThd')
+
+    def test_clear_session_removes_rendered_audio(self, render_client, test_app, mocker):
+        """キャッシュ無効時はセッションクリアでレンダリング結果が削除されるテスト"""
+        mocker.patch.dict(test_app.config, {'RENDER_CACHE_MAX_BYTES': 0})
+        render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        with render_client.session_transaction() as session:
+            audio_file = session['audio_file']
+        render_client.get('/random.mp3')
+        render_client.post('/clear_session')
+        assert not os.path.exists(audio_file)
+
+
+@pytest.fixture
+def other_worker(mocker):
+    """別のgunicornワーカーを模して、プロセス内のジョブ情報と生成中の記録を空にする"""
+    def switch():
+        mocker.patch.object(app_module, 'render_queue', RenderQueue(executor=ThreadPoolExecutor(max_workers=1)))
+        mocker.patch.object(app_module, 'artifact_readiness', ArtifactReadiness())
+    return switch
+
+
+@pytest.mark.integration
+class TestRenderJobsAcrossWorkers:
+    """別のワーカーに届いたリクエストでのレンダリングジョブの統合テストクラス"""
+
+    def test_render_status_from_other_worker(self, render_client, other_worker):
+        """別のワーカーでもジョブ状態を返すテスト"""
+        data = render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        app_module.render_queue.get(data['render_job']).future.result(timeout=5)
+        other_worker()
+        status = render_client.get(data['render_status']).get_json()
+        assert status['status'] == 'done'
+        assert status['audio_url'] == '/random.mp3'
+
+    def test_failed_status_from_other_worker(self, render_client, other_worker, mocker):
+        """別のワーカーでも失敗したジョブのエラーを返すテスト"""
+        def broken(midi_path, output_path, **kwargs):
+            raise RuntimeError("boom")
+        mocker.patch.dict(app_module.AUDIO_RENDERERS, {'fake': broken})
+        data = render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        app_module.render_queue.get(data['render_job']).future.exception(timeout=5)
+        other_worker()
+        status = render_client.get(data['render_status']).get_json()
+        assert status['status'] == 'failed'
+        assert 'boom' in status['error']
+
+    def test_random_mp3_waits_for_render_on_other_worker(self, render_client, other_worker, mocker):
+        """別のワーカーのレンダリング完了を待ってから音声を返すテスト"""
+        release = threading.Event()
+
+        def blocking_render(midi_path, output_path, **kwargs):
+            release.wait(5)
+            return fake_render(midi_path, output_path)
+        mocker.patch.dict(app_module.AUDIO_RENDERERS, {'fake': blocking_render})
+        render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        other_worker()
+        threading.Timer(0.2, release.set).start()
+        response = render_client.get('/random.mp3')
+        assert response.status_code == 200
+        assert response.mimetype == 'audio/wav'
+        assert response.data == b'RIFF-test-audio'
+
+    def test_random_mp3_times_out_on_other_worker(self, render_client, other_worker, test_app, mocker):
+        """別のワーカーのレンダリングが終わらなければ503を返すテスト"""
+        release = threading.Event()
+
+        def blocking_render(midi_path, output_path, **kwargs):
+            release.wait(5)
+            return fake_render(midi_path, output_path)
+        mocker.patch.dict(app_module.AUDIO_RENDERERS, {'fake': blocking_render})
+        render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        other_worker()
+        mocker.patch.dict(test_app.config, {'ARTIFACT_READY_TIMEOUT': 0.1})
+        try:
+            assert render_client.get('/random.mp3').status_code == 503
+        finally:
+            release.set()
+
+
+@pytest.mark.unit
+class TestRenderJobStore:
+    """RenderJobStore テストクラス"""
+
+    def test_round_trip(self, temp_dir):
+        """書き込んだ状態を読み出せるテスト"""
+        store = RenderJobStore(temp_dir)
+        store.write('a' * 32, 'queued', '/tmp/out.wav')
+        assert store.read('a' * 32) == {'job_id': 'a' * 32, 'status': 'queued',
+                                        'output_path': '/tmp/out.wav', 'error': None}
+
+    @pytest.mark.parametrize("job_id", ['unknown', '../' + 'a' * 32, 'b' * 32])
+    def test_unknown_or_invalid_job(self, temp_dir, job_id):
+        """存在しない・不正なジョブIDはNoneのテスト"""
+        assert RenderJobStore(temp_dir).read(job_id) is None
+
+
+@pytest.mark.integration
+class TestRenderCacheIntegration:
+    """レンダリングキャッシュ統合テストクラス"""
+
+    def test_identical_midi_skips_render(self, render_client):
+        """同じMIDIは再レンダリングされないテスト"""
+        render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        render_client.get('/random.mp3')
+        with render_client.session_transaction() as session:
+            midi_file = session['midi_file']
+            audio_file = session['audio_file']
+
+        with open(midi_file, 'rb') as f:
+            midi_bytes = f.read()
+        job_id, cached_path = app_module._submit_render(fake_render, midi_file, midi_bytes)
+        assert job_id is None
+        assert cached_path == audio_file
+
+    def test_cache_hit_response(self, render_client, mocker):
+        """キャッシュヒット時はジョブを作らずに配信されるテスト"""
+        fixed = app_module.generate_random_midi_timeline('major', 60)
+        mocker.patch.object(app_module, 'generate_random_midi_timeline', return_value=fixed)
+        first = render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        assert 'render_job' in first
+        render_client.get('/random.mp3')
+        second = render_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        assert 'render_job' not in second
+        assert second['render_cached'] is True
+        response = render_client.get('/random.mp3')
+        assert response.status_code == 200
+        assert response.data == b'RIFF-test-audio'
@@ -0,0 +1,110 @@
+"""
+セッションバックエンド切り替えの統合テスト
+"""
+import pytest
+import os
+from flask import Flask, session
+from session_backend import configure_session
+
+
+@pytest.mark.integration
+class TestSessionBackends:
+    """各セッションバックエンドでの生成フローテストクラス"""
+
+    @pytest.mark.parametrize("session_backend_client", ['filesystem', 'memory', 'cookie'], indirect=True)
+    def test_generate_download_and_play(self, session_backend_client):
+        """生成・ダウンロード・再生が各バックエンドで動作するテスト"""
+        client = session_backend_client
+        response = client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        assert response.status_code == 200
+        assert client.get('/download/midi').data.startswith(b'MThd')
+        assert client.get('/random.mp3').status_code == 200
+
+    @pytest.mark.parametrize("session_backend_client", ['filesystem', 'memory', 'cookie'], indirect=True)
+    def test_clear_session(self, session_backend_client):
+        """セッションクリア後は404になるテスト"""
+        client = session_backend_client
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        client.post('/clear_session')
+        assert client.get('/download/midi').status_code == 404
+
+    @pytest.mark.parametrize("session_backend_client", ['cookie'], indirect=True)
+    def test_cookie_session_carries_only_artifact_id(self, session_backend_client, test_app):
+        """Cookieモードではセッションに成果物IDのみが入るテスト"""
+        client = session_backend_client
+        data = client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        with client.session_transaction() as session:
+            assert dict(session) == {'artifact_id': data['artifact_id']}
+        # セッション用のMIDIファイルは書き出されない
+        assert [f for f in os.listdir(test_app.config['UPLOAD_FOLDER']) if f.endswith('.mid')] == []
+
+    @pytest.mark.parametrize("session_backend_client", ['cookie'], indirect=True)
+    def test_cookie_session_works_across_clients(self, session_backend_client, test_app):
+        """Cookieだけで別のクライアント（別ワーカー相当）から取得できるテスト"""
+        client = session_backend_client
+        client.post('/generate_music', data={'scale': 'minor', 'base_note': '48', 'seed': '5'})
+        cookie = client.get_cookie(test_app.config['SESSION_COOKIE_NAME'])
+        with test_app.test_client() as other:
+            other.set_cookie(cookie.key, cookie.value)
+            assert other.get('/download/midi').data.startswith(b'MThd')
+
+    @pytest.mark.parametrize("session_backend_client", ['memory'], indirect=True)
+    def test_memory_session_does_not_write_session_files(self, session_backend_client, tmp_path, monkeypatch):
+        """メモリモードではセッションファイルを書き出さないテスト"""
+        monkeypatch.chdir(tmp_path)
+        session_backend_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        assert not os.path.exists(tmp_path / 'flask_session')
+
+
+@pytest.mark.unit
+class TestLRUSessionInterface:
+    """LRUSessionInterface テストクラス"""
+
+    def make_app(self, maxsize):
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        app.config['SESSION_BACKEND'] = 'memory'
+        app.config['SESSION_LRU_SIZE'] = maxsize
+
+        @app.route('/set/<value>')
+        def set_value(value):
+            session['value'] = value
+            return ''
+
+        @app.route('/get')
+        def get_value():
+            return session.get('value', '')
+
+        configure_session(app)
+        return app
+
+    def test_session_round_trip(self):
+        """保存した値を次のリクエストで読めるテスト"""
+        app = self.make_app(10)
+        with app.test_client() as client:
+            client.get('/set/abc')
+            assert client.get('/get').data == b'abc'
+
+    def test_least_recently_used_session_evicted(self):
+        """上限を超えると最も古いセッションが破棄されるテスト"""
+        app = self.make_app(2)
+        clients = [app.test_client() for _ in range(3)]
+        for i, client in enumerate(clients):
+            client.get(f'/set/{i}')
+        assert len(app.session_interface) == 2
+        assert clients[0].get('/get').data == b''
+        assert clients[2].get('/get').data == b'2'
+
+    def test_unmodified_session_not_saved(self):
+        """変更のないリクエストではストアに書き込まないテスト"""
+        app = self.make_app(10)
+        with app.test_client() as client:
+            client.get('/get')
+        assert len(app.session_interface) == 0
+
+    def test_unknown_backend_rejected(self):
+        """未知のバックエンド名でエラーになるテスト"""
+        app = Flask(__name__)
+        app.config['SESSION_BACKEND'] = 'redis'
+        with pytest.raises(ValueError):
+            configure_session(app)
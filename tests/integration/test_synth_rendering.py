@@ -0,0 +1,188 @@
+"""
+内蔵シンセサイザーによる音声配信の統合テスト
+"""
+import pytest
+import io
+import os
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import app as app_module
+
+
+@pytest.fixture
+def synth_config(test_app, mocker):
+    mocker.patch.dict(test_app.config, {'AUDIO_RENDERER': 'synth', 'AUDIO_SAMPLE_RATE': 8000})
+    yield test_app
+
+
+def assert_wav(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'audio/wav'
+    with wave.open(io.BytesIO(response.data)) as reader:
+        assert reader.getframerate() == 8000
+        assert reader.getnframes() > 0
+
+
+@pytest.mark.integration
+class TestSynthRendering:
+    """内蔵シンセサイザー統合テストクラス"""
+
+    def test_generate_mp3_sync_renders_wav(self, synth_config, temp_midi_file):
+        """_generate_mp3_sync がWAVを書き出すテスト"""
+        with synth_config.app_context():
+            result = app_module._generate_mp3_sync(temp_midi_file, 'test')
+        assert result == os.path.splitext(temp_midi_file)[0] + '.wav'
+        assert os.path.isfile(result)
+
+    def test_disk_storage_serves_wav(self, synth_config, client):
+        """ディスク保存でWAVを返し、ジョブを作らないテスト"""
+        data = client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        assert 'render_job' not in data
+        with client.session_transaction() as session:
+            assert session['mp3_file'].endswith('.wav')
+        assert_wav(client.get('/random.mp3'))
+
+    def test_previous_audio_removed(self, synth_config, client):
+        """再生成時に以前の音声を削除するテスト"""
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        with client.session_transaction() as session:
+            first = session['mp3_file']
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        assert not os.path.exists(first)
+
+    def test_memory_storage_serves_wav(self, synth_config, memory_client):
+        """メモリ保持ではメモリ上で合成したWAVを返すテスト"""
+        memory_client.post('/generate_music', data={'scale': 'minor', 'base_note': '48'})
+        assert_wav(memory_client.get('/random.mp3'))
+
+    @pytest.mark.parametrize("session_backend_client", ["cookie"], indirect=True)
+    def test_stateless_serves_cached_wav(self, synth_config, session_backend_client):
+        """Cookieセッションではレンダリングキャッシュに書き出したWAVを返すテスト"""
+        data = session_backend_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        assert data['render_cached'] is True
+        assert_wav(session_backend_client.get('/random.mp3'))
+
+    @pytest.mark.parametrize("session_backend_client", ["cookie"], indirect=True)
+    def test_stateless_rerenders_evicted_audio(self, synth_config, session_backend_client):
+        """キャッシュから消えた音声をその場で作り直すテスト"""
+        data = session_backend_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()
+        with synth_config.test_request_context():
+            audio_path = app_module._artifact_audio_path(data['artifact_id'])
+        os.remove(audio_path)
+        assert_wav(session_backend_client.get('/random.mp3'))
+        assert os.path.isfile(audio_path)
+
+
+@pytest.mark.integration
+class TestAudioStreaming:
+    """/random.mp3 のストリーミング統合テストクラス"""
+
+    def test_stream_matches_full_render(self, synth_config, client):
+        """ストリーミングしたWAVが一括レンダリングと一致するテスト"""
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        streamed = client.get('/random.mp3?stream=1')
+        assert streamed.is_streamed
+        assert 'Content-Length' not in streamed.headers
+        full = client.get('/random.mp3?stream=0')
+        assert streamed.data == full.data
+        assert_wav(streamed)
+
+    def test_stream_from_memory_buffer(self, synth_config, memory_client):
+        """メモリ保持のMIDIもストリーミングできるテスト"""
+        memory_client.post('/generate_music', data={'scale': 'minor', 'base_note': '48'})
+        assert_wav(memory_client.get('/random.mp3?stream=1'))
+
+    @pytest.mark.parametrize("session_backend_client", ["cookie"], indirect=True)
+    def test_stream_from_artifact(self, synth_config, session_backend_client):
+        """成果物IDのセッションでもストリーミングできるテスト"""
+        session_backend_client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        response = session_backend_client.get('/random.mp3?stream=1')
+        assert response.is_streamed
+        assert_wav(response)
+
+    def test_streaming_enabled_by_config(self, synth_config, client, mocker):
+        """AUDIO_STREAMING で既定でストリーミングするテスト"""
+        mocker.patch.dict(synth_config.config, {'AUDIO_STREAMING': True})
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        assert client.get('/random.mp3').is_streamed
+
+    def test_stream_without_generation(self, synth_config, client):
+        """生成前は404を返すテスト"""
+        assert client.get('/random.mp3?stream=1').status_code == 404
+
+    def test_stream_ignored_without_inline_renderer(self, client):
+        """インラインレンダラーでなければ従来どおりMIDIを返すテスト"""
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        response = client.get('/random.mp3?stream=1')
+        assert response.data.startswith(b'MThd')
+
+
+@pytest.mark.integration
+class TestRendererPoolIntegration:
+    """常駐レンダリングワーカーを使ったレンダリングの統合テストクラス"""
+
+    @pytest.fixture
+    def pool_config(self, synth_config, mocker):
+        mocker.patch.dict(synth_config.config, {'RENDER_POOL_SIZE': 1})
+        yield synth_config
+        app_module.shutdown_renderer_pool()
+
+    def test_generate_renders_in_pool(self, pool_config, client):
+        """常駐ワーカーでレンダリングしたWAVを配信するテスト"""
+        response = client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        assert response.status_code == 200
+        assert_wav(client.get('/random.mp3'))
+        assert app_module.get_renderer_pool().stats()['jobs_completed'] >= 1
+
+    def test_pool_stats_in_metrics(self, pool_config, client):
+        """常駐ワーカーの統計が /metrics に出力されるテスト"""
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        body = client.get('/metrics').get_data(as_text=True)
+        assert 'melody_renderer_pool_workers 1.0' in body
+        assert 'melody_renderer_pool_jobs_completed' in body
+
+    def test_pool_disabled_by_default(self, synth_config):
+        """RENDER_POOL_SIZE が0ならプールを作らないテスト"""
+        assert app_module.get_renderer_pool() is None
+
+    def test_long_melody_rendered_in_segments(self, pool_config, client, mocker):
+        """長いメロディを区間に分けて常駐ワーカーで合成するテスト"""
+        mocker.patch.dict(pool_config.config, {'RENDER_SEGMENT_SECONDS': 0.5})
+        response = client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        assert response.status_code == 200
+        audio = client.get('/random.mp3')
+        assert_wav(audio)
+        midi_bytes = client.get('/download/midi').data
+        assert audio.data == app_module.get_synthesizer(8000).render_midi(midi_bytes)
+        assert app_module.get_renderer_pool().stats()['jobs_completed'] > 1
+
+
+@pytest.mark.integration
+class TestRenderCoalescing:
+    """同じ内容の同時レンダリングをまとめる統合テストクラス"""
+
+    def test_concurrent_artifact_requests_render_once(self, synth_config, mocker):
+        """同じ成果物の音声を同時に要求してもレンダリングは1回になるテスト"""
+        midi_bytes, _ = app_module.generate_seeded_midi('major', 60, 7)
+        with synth_config.test_request_context():
+            artifact_id = app_module.publish_artifact(midi_bytes)
+        original = app_module._run_renderer
+
+        def slow_render(midi_file, audio_file):
+            time.sleep(0.2)
+            return original(midi_file, audio_file)
+        run_renderer = mocker.patch.object(app_module, '_run_renderer', side_effect=slow_render)
+
+        def fetch(_):
+            with synth_config.test_client() as client:
+                with client.session_transaction() as sess:
+                    sess['artifact_id'] = artifact_id
+                return client.get('/random.mp3')
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            responses = list(executor.map(fetch, range(4)))
+        assert run_renderer.call_count == 1
+        for response in responses:
+            assert_wav(response)
+        assert len({response.data for response in responses}) == 1
@@ -0,0 +1,111 @@
+"""
+ZIPエクスポートエンドポイントの統合テスト
+"""
+import pytest
+import io
+import zipfile
+from app import iter_zip_stream, scan_midi_notes
+
+
+def open_zip(response):
+    return zipfile.ZipFile(io.BytesIO(response.data))
+
+
+@pytest.mark.integration
+class TestExportZip:
+    """/export_zip エンドポイント統合テストクラス"""
+
+    def test_generated_melodies_archive(self, client):
+        """生成したメロディをZIPで返すテスト"""
+        response = client.post('/export_zip', json={'count': 3, 'scales': ['major', 'minor'], 'base_notes': [60]})
+        assert response.status_code == 200
+        assert response.mimetype == 'application/zip'
+        assert 'melodies.zip' in response.headers['Content-Disposition']
+        archive = open_zip(response)
+        assert archive.testzip() is None
+        names = archive.namelist()
+        assert len(names) == 6
+        assert names[0] == '00000_major_60.mid'
+        for name in names:
+            assert scan_midi_notes(archive.read(name))
+            assert archive.getinfo(name).compress_type == zipfile.ZIP_DEFLATED
+
+    def test_seeded_archive_is_deterministic(self, client):
+        """シード指定で同じ内容のアーカイブになるテスト"""
+        params = {'count': 4, 'seed': 5}
+        first = open_zip(client.post('/export_zip', json=params))
+        second = open_zip(client.post('/export_zip', json=params))
+        assert [first.read(n) for n in first.namelist()] == [second.read(n) for n in second.namelist()]
+
+    def test_collects_existing_artifacts(self, client):
+        """既存の成果物をまとめるテスト"""
+        ids = []
+        for _ in range(2):
+            ids.append(client.post('/generate_music', data={'scale': 'major', 'base_note': '60'}).get_json()['artifact_id'])
+        response = client.post('/export_zip', json={'artifact_ids': ids})
+        assert response.status_code == 200
+        archive = open_zip(response)
+        assert archive.namelist() == [f'{artifact_id}.mid' for artifact_id in dict.fromkeys(ids)]
+        assert archive.read(f'{ids[0]}.mid') == client.get(f'/artifacts/{ids[0]}.mid').data
+
+    def test_collects_in_memory_artifacts(self, memory_client):
+        """メモリ保持の成果物もまとめられるテスト"""
+        artifact_id = memory_client.post('/generate_music', data={'scale': 'minor', 'base_note': '48'}).get_json()['artifact_id']
+        response = memory_client.post('/export_zip', data={'artifact_ids': artifact_id})
+        assert open_zip(response).namelist() == [f'{artifact_id}.mid']
+
+    def test_missing_artifact_returns_404(self, client):
+        """存在しない成果物で404を返すテスト"""
+        response = client.post('/export_zip', json={'artifact_ids': ['0' * 32]})
+        assert response.status_code == 404
+        assert response.get_json()['missing'] == ['0' * 32]
+
+    @pytest.mark.parametrize("params", [
+        {'artifact_ids': ['../etc/passwd']},
+        {'count': 0},
+        {'count': 1, 'scales': ['dorian']},
+    ])
+    def test_invalid_parameters(self, client, params):
+        """不正なパラメータで400を返すテスト"""
+        assert client.post('/export_zip', json=params).status_code == 400
+
+
+@pytest.mark.unit
+class TestIterZipStream:
+    """iter_zip_stream テストクラス"""
+
+    def test_yields_chunk_per_entry(self):
+        """エントリごとにチャンクを返すテスト"""
+        entries = [(f'{i}.mid', bytes([i]) * 100) for i in range(5)]
+        chunks = list(iter_zip_stream(iter(entries)))
+        assert len(chunks) == 6  # エントリ5件 + セントラルディレクトリ
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        assert [(n, archive.read(n)) for n in archive.namelist()] == entries
+
+    def test_consumes_entries_lazily(self):
+        """エントリを1件ずつ読み進めるテスト"""
+        consumed = []
+
+        def entries():
+            for i in range(3):
+                consumed.append(i)
+                yield f'{i}.mid', b'data'
+
+        stream = iter_zip_stream(entries())
+        next(stream)
+        assert consumed == [0]
+
+    def test_compression_option(self):
+        """compression で指定した圧縮方式で格納するテスト"""
+        entries = [('a.mid', b'\x00' * 1000)]
+        deflated = zipfile.ZipFile(io.BytesIO(b''.join(iter_zip_stream(iter(entries)))))
+        info = deflated.getinfo('a.mid')
+        assert info.compress_type == zipfile.ZIP_DEFLATED
+        assert info.compress_size < info.file_size
+        stored = zipfile.ZipFile(io.BytesIO(b''.join(iter_zip_stream(iter(entries), zipfile.ZIP_STORED))))
+        assert stored.getinfo('a.mid').compress_type == zipfile.ZIP_STORED
+
+    def test_empty_archive(self):
+        """エントリなしでも有効なZIPになるテスト"""
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(iter_zip_stream(iter([])))))
+        assert archive.namelist() == []
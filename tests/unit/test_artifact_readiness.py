@@ -0,0 +1,71 @@
+"""
+成果物の準備完了通知（ArtifactReadiness）のユニットテスト
+"""
+import pytest
+import threading
+import time
+from app import ArtifactReadiness
+
+
+@pytest.mark.unit
+class TestArtifactReadiness:
+    """ArtifactReadiness テストクラス"""
+
+    def test_wait_returns_immediately_when_not_pending(self):
+        """生成中でなければ即座に返るテスト"""
+        readiness = ArtifactReadiness()
+        start = time.monotonic()
+        assert readiness.wait('a.mid', timeout=5) is True
+        assert time.monotonic() - start < 0.1
+
+    def test_wait_times_out_while_pending(self):
+        """生成中のままならタイムアウトでFalseを返すテスト"""
+        readiness = ArtifactReadiness()
+        readiness.begin('a.mid')
+        assert readiness.wait('a.mid', timeout=0.05) is False
+
+    def test_wait_wakes_on_finish(self):
+        """完了通知で待機が解除されるテスト"""
+        readiness = ArtifactReadiness()
+        readiness.begin('a.mid')
+        timer = threading.Timer(0.05, readiness.finish, args=('a.mid',))
+        timer.start()
+        assert readiness.wait('a.mid', timeout=5) is True
+        timer.join()
+
+    def test_nested_begin_requires_matching_finish(self):
+        """begin の回数だけ finish されるまで生成中とみなすテスト"""
+        readiness = ArtifactReadiness()
+        readiness.begin('a.mid')
+        readiness.begin('a.mid')
+        readiness.finish('a.mid')
+        assert readiness.is_pending('a.mid')
+        readiness.finish('a.mid')
+        assert not readiness.is_pending('a.mid')
+
+
+@pytest.mark.integration
+class TestGetMp3Readiness:
+    """/random.mp3 の待機動作テストクラス"""
+
+    def test_get_mp3_does_not_sleep(self, client):
+        """生成済みファイルは待たずに返るテスト"""
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        start = time.monotonic()
+        response = client.get('/random.mp3')
+        assert response.status_code == 200
+        assert time.monotonic() - start < 0.5
+
+    def test_get_mp3_returns_503_when_generation_stalls(self, client, test_app, mocker):
+        """生成中のまま完了しない場合に503を返すテスト"""
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        with client.session_transaction() as session:
+            mp3_file = session['mp3_file']
+        mocker.patch.dict(test_app.config, {'ARTIFACT_READY_TIMEOUT': 0.05})
+        from app import artifact_readiness
+        artifact_readiness.begin(mp3_file)
+        try:
+            response = client.get('/random.mp3')
+            assert response.status_code == 503
+        finally:
+            artifact_readiness.finish(mp3_file)
@@ -0,0 +1,98 @@
+"""
+成果物ストアのユニットテスト
+"""
+import pytest
+import os
+from artifact_store import ArtifactStore
+
+
+@pytest.mark.unit
+class TestArtifactStore:
+    """ArtifactStore テストクラス"""
+
+    def test_path_is_sharded(self, temp_dir):
+        """パスがハッシュのサブディレクトリに分散されるテスト"""
+        store = ArtifactStore(temp_dir)
+        path = store.path_for('random_midi_1')
+        relative = os.path.relpath(path, temp_dir).split(os.sep)
+        assert len(relative) == 3
+        assert all(len(part) == 2 for part in relative[:2])
+        assert relative[2] == 'random_midi_1.mid'
+
+    def test_path_is_deterministic(self, temp_dir):
+        """同じIDは常に同じパスになるテスト"""
+        assert ArtifactStore(temp_dir).path_for('abc') == ArtifactStore(temp_dir).path_for('abc')
+
+    def test_ids_spread_across_shards(self, temp_dir):
+        """IDが複数のサブディレクトリに分散するテスト"""
+        store = ArtifactStore(temp_dir, depth=1)
+        shards = {os.path.dirname(store.path_for(f'id{i}')) for i in range(100)}
+        assert len(shards) > 50
+
+    def test_write_and_lookup(self, temp_dir):
+        """書き込んだ成果物を参照できるテスト"""
+        store = ArtifactStore(temp_dir)
+        assert store.lookup('a') is None
+        path = store.write('a', b'data')
+        assert store.lookup('a') == path
+        with open(path, 'rb') as f:
+            assert f.read() == b'data'
+
+    def test_write_leaves_no_temp_files(self, temp_dir):
+        """一時ファイルが残らないテスト"""
+        store = ArtifactStore(temp_dir)
+        path = store.write('a', b'data')
+        assert os.listdir(os.path.dirname(path)) == ['a.mid']
+
+    def test_write_with_hard_link(self, temp_dir):
+        """link_from 指定時にハードリンクになるテスト"""
+        source = os.path.join(temp_dir, 'source.mid')
+        with open(source, 'wb') as f:
+            f.write(b'data')
+        store = ArtifactStore(os.path.join(temp_dir, 'store'))
+        path = store.write('a', b'data', link_from=source)
+        assert os.path.samefile(source, path)
+
+    def test_remove(self, temp_dir):
+        """削除後は参照できないテスト"""
+        store = ArtifactStore(temp_dir)
+        path = store.write('a', b'data')
+        store.remove(path)
+        assert store.lookup('a') is None
+
+    def test_remove_outside_store_rejected(self, temp_dir):
+        """ストア外のパスの削除を拒否するテスト"""
+        store = ArtifactStore(os.path.join(temp_dir, 'store'))
+        outside = os.path.join(temp_dir, 'outside.mid')
+        with open(outside, 'wb') as f:
+            f.write(b'data')
+        with pytest.raises(ValueError):
+            store.remove(outside)
+        assert os.path.exists(outside)
+
+    def test_index_is_bounded(self, temp_dir):
+        """索引が上限を超えないテスト"""
+        store = ArtifactStore(temp_dir, index_size=10)
+        for i in range(50):
+            store.path_for(f'id{i}')
+        assert len(store._index) == 10
+
+
+@pytest.mark.integration
+class TestArtifactStoreIntegration:
+    """生成・ダウンロード・削除がストアを使うことのテストクラス"""
+
+    def test_generated_midi_is_sharded(self, test_app):
+        """生成されたMIDIがシャードディレクトリに置かれるテスト"""
+        from app import generate_random_midi
+        with test_app.app_context():
+            path = generate_random_midi('major', 60, 'test')
+            relative = os.path.relpath(path, test_app.config['UPLOAD_FOLDER'])
+            assert len(relative.split(os.sep)) == 3
+
+    def test_download_sharded_midi(self, client):
+        """シャードされたMIDIをダウンロードできるテスト"""
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        response = client.get('/download/midi')
+        assert response.status_code == 200
+        assert response.data.startswith(b'MThd')
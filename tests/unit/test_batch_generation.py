@@ -0,0 +1,52 @@
+"""
+バッチメロディ生成関数のユニットテスト
+"""
+import pytest
+import numpy as np
+from app import generate_batch
+
+
+@pytest.mark.unit
+class TestGenerateBatch:
+    """バッチ生成関数テストクラス"""
+
+    def test_returns_requested_count(self):
+        """指定数のメロディを返すテスト"""
+        melodies = generate_batch("major", 60, 50, seed=1)
+        assert len(melodies) == 50
+
+    def test_zero_count_returns_empty(self):
+        """count=0 で空リストを返すテスト"""
+        assert generate_batch("major", 60, 0) == []
+
+    def test_melody_lengths_in_range(self):
+        """各メロディのノート数が10〜30のテスト"""
+        for melody in generate_batch("minor", 48, 200, seed=2):
+            assert 10 <= len(melody['pitches']) <= 30
+            assert len(melody['pitches']) == len(melody['velocities']) == len(melody['durations'])
+
+    def test_velocities_and_durations_in_range(self):
+        """ベロシティと音長が既存の生成と同じ範囲のテスト"""
+        for melody in generate_batch("major", 60, 100, seed=3):
+            assert np.all((melody['velocities'] >= 40) & (melody['velocities'] <= 100))
+            assert set(melody['durations'].tolist()) <= {120, 240, 480}
+
+    def test_pitches_follow_scale_weighting(self):
+        """スケール内の音程が大半を占めるテスト"""
+        melodies = generate_batch("major", 60, 500, seed=4)
+        offsets = np.concatenate([m['pitches'] for m in melodies]) - 60
+        in_scale = np.isin(offsets, [0, 2, 4, 5, 7, 9, 11])
+        assert in_scale.mean() > 0.9
+
+    def test_seed_is_reproducible(self):
+        """同じシードで同じ結果になるテスト"""
+        a = generate_batch("minor", 60, 10, seed=42)
+        b = generate_batch("minor", 60, 10, seed=42)
+        for x, y in zip(a, b):
+            assert np.array_equal(x['pitches'], y['pitches'])
+            assert np.array_equal(x['durations'], y['durations'])
+
+    def test_pitches_clamped_after_first_note(self):
+        """2音目以降が24〜108にクランプされるテスト"""
+        for melody in generate_batch("major", 105, 50, seed=5):
+            assert np.all(melody['pitches'][1:] <= 108)
@@ -0,0 +1,91 @@
+"""
+コーパス生成CLIのユニットテスト
+"""
+import pytest
+import os
+import sys
+import json
+import subprocess
+from generate_corpus import main, parse_distribution, MANIFEST_NAME
+from app import scan_midi_notes, artifact_id_for
+
+
+def read_manifest(output):
+    with open(os.path.join(output, MANIFEST_NAME)) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.unit
+class TestParseDistribution:
+    """parse_distribution テストクラス"""
+
+    def test_weights_are_normalized(self):
+        """重みが確率に正規化されるテスト"""
+        assert parse_distribution('major:3,minor:1') == (('major', 'minor'), (0.75, 0.25))
+
+    def test_default_weight(self):
+        """重み省略時は均等になるテスト"""
+        assert parse_distribution('major,minor') == (('major', 'minor'), (0.5, 0.5))
+
+    def test_integer_range(self):
+        """範囲指定が均等に展開されるテスト"""
+        values, probabilities = parse_distribution('48-51,60:1', int)
+        assert values == (48, 49, 50, 51, 60)
+        assert probabilities == pytest.approx((0.125, 0.125, 0.125, 0.125, 0.5))
+
+    @pytest.mark.parametrize("spec", ['', 'major:0', 'major:-1', '60-50'])
+    def test_invalid_distribution(self, spec):
+        """不正な分布指定で例外が発生するテスト"""
+        with pytest.raises(ValueError):
+            parse_distribution(spec, int if '-' in spec[1:] else str)
+
+
+@pytest.mark.unit
+class TestGenerateCorpus:
+    """main テストクラス"""
+
+    def test_writes_sharded_files_and_manifest(self, temp_dir, capsys):
+        """シャーディングしたファイルとマニフェストを書き出すテスト"""
+        output = os.path.join(temp_dir, 'corpus')
+        assert main(['--count', '25', '--output', output, '--shard-size', '10', '--workers', '1',
+                     '--scales', 'major:1,minor:1', '--base-notes', '48-60']) == 0
+        rows = read_manifest(output)
+        assert len(rows) == 25
+        assert sorted(d for d in os.listdir(output) if d != MANIFEST_NAME) == ['00000', '00001', '00002']
+        assert rows[0]['path'] == '00000/00000000.mid'
+        assert rows[-1]['path'] == '00002/00000024.mid'
+        for row in rows:
+            with open(os.path.join(output, row['path']), 'rb') as f:
+                midi_bytes = f.read()
+            assert artifact_id_for(midi_bytes) == row['artifact_id']
+            assert len(scan_midi_notes(midi_bytes)) == row['notes']
+            assert row['scale'] in ('major', 'minor')
+            assert 48 <= row['base_note'] <= 60
+        assert 'melodies/s' in capsys.readouterr().out
+
+    def test_cli_does_not_load_flask_app(self, temp_dir):
+        """CLIの実行でFlaskアプリを読み込まず、作業ディレクトリに static/ や flask_session/ を作らないテスト"""
+        script = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'generate_corpus.py')
+        result = subprocess.run([sys.executable, script, '--count', '3', '--output', 'corpus', '--workers', '1'],
+                                cwd=temp_dir, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert sorted(os.listdir(temp_dir)) == ['corpus']
+
+    def test_seed_is_deterministic_across_workers(self, temp_dir):
+        """シード指定ではワーカー数によらず同じ結果になるテスト"""
+        first = os.path.join(temp_dir, 'first')
+        second = os.path.join(temp_dir, 'second')
+        main(['--count', '30', '--output', first, '--shard-size', '8', '--workers', '1', '--seed', '7'])
+        main(['--count', '30', '--output', second, '--shard-size', '8', '--workers', '2', '--seed', '7'])
+        assert read_manifest(first) == read_manifest(second)
+
+    @pytest.mark.parametrize("args", [
+        ['--count', '0'],
+        ['--count', '1', '--scales', 'dorian'],
+        ['--count', '1', '--base-notes', '200'],
+        ['--count', '1', '--workers', '0'],
+    ])
+    def test_invalid_arguments(self, temp_dir, args):
+        """不正な引数でエラー終了するテスト"""
+        with pytest.raises(SystemExit):
+            main(args + ['--output', os.path.join(temp_dir, 'corpus')])
@@ -0,0 +1,119 @@
+"""
+生成ファイルのクリーンアップ（Janitor）のユニットテスト
+"""
+import pytest
+import os
+import time
+from janitor import ArtifactIndex, Janitor
+
+
+def make_file(directory, name, size, mtime):
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.mark.unit
+class TestArtifactIndex:
+    """ArtifactIndex テストクラス"""
+
+    def test_record_and_discard(self, temp_dir):
+        """登録と削除のテスト"""
+        index = ArtifactIndex()
+        path = make_file(temp_dir, 'a.mid', 10, 1000)
+        index.record(path)
+        assert len(index) == 1
+        assert index.total_bytes() == 10
+        index.discard(path)
+        assert len(index) == 0
+
+    def test_rescan_picks_up_untracked_files(self, temp_dir):
+        """走査で未登録のファイルを取り込むテスト"""
+        index = ArtifactIndex()
+        make_file(temp_dir, 'a.mid', 10, 1000)
+        make_file(temp_dir, 'artifacts/b.mid', 20, 2000)
+        make_file(temp_dir, 'render_cache/c.wav', 30, 3000)
+        index.rescan(temp_dir, exclude=('render_cache',))
+        assert len(index) == 2
+        assert index.total_bytes() == 30
+
+    def test_rescan_drops_missing_files(self, temp_dir):
+        """走査で存在しないファイルを索引から外すテスト"""
+        index = ArtifactIndex()
+        index.record(os.path.join(temp_dir, 'gone.mid'), size=5, created=1000)
+        index.rescan(temp_dir)
+        assert len(index) == 0
+
+
+@pytest.mark.unit
+class TestJanitor:
+    """Janitor テストクラス"""
+
+    def test_removes_expired_files(self, temp_dir):
+        """期限切れのファイルを削除するテスト"""
+        now = time.time()
+        old = make_file(temp_dir, 'old.mid', 100, now - 7200)
+        new = make_file(temp_dir, 'new.mid', 100, now - 60)
+        janitor = Janitor(temp_dir, ArtifactIndex(), max_age=3600)
+        result = janitor.run_once(now)
+        assert result == {'removed_files': 1, 'reclaimed_bytes': 100}
+        assert not os.path.exists(old)
+        assert os.path.exists(new)
+
+    def test_enforces_quota_oldest_first(self, temp_dir):
+        """容量上限を超えた分を古い順に削除するテスト"""
+        now = time.time()
+        a = make_file(temp_dir, 'a.mid', 100, now - 30)
+        b = make_file(temp_dir, 'b.mid', 100, now - 20)
+        c = make_file(temp_dir, 'c.mid', 100, now - 10)
+        janitor = Janitor(temp_dir, ArtifactIndex(), max_age=3600, max_bytes=150)
+        janitor.run_once(now)
+        assert not os.path.exists(a) and not os.path.exists(b)
+        assert os.path.exists(c)
+
+    def test_uses_index_creation_time(self, temp_dir):
+        """索引に登録した作成時刻を優先するテスト"""
+        now = time.time()
+        path = make_file(temp_dir, 'a.mid', 10, now)
+        index = ArtifactIndex()
+        index.record(path, created=now - 7200)
+        janitor = Janitor(temp_dir, index, max_age=3600)
+        janitor.run_once(now)
+        assert not os.path.exists(path)
+
+    def test_stats_accumulate(self, temp_dir):
+        """累計統計が更新されるテスト"""
+        now = time.time()
+        make_file(temp_dir, 'a.mid', 40, now - 7200)
+        janitor = Janitor(temp_dir, ArtifactIndex(), max_age=3600)
+        janitor.run_once(now)
+        make_file(temp_dir, 'b.mid', 60, now - 7200)
+        janitor.index.record(os.path.join(temp_dir, 'b.mid'))
+        janitor.run_once(now)
+        stats = janitor.stats()
+        assert stats['runs'] == 2
+        assert stats['removed_files'] == 2
+        assert stats['reclaimed_bytes'] == 100
+
+    def test_background_thread(self, temp_dir):
+        """バックグラウンドスレッドで定期実行されるテスト"""
+        path = make_file(temp_dir, 'a.mid', 10, time.time() - 7200)
+        janitor = Janitor(temp_dir, ArtifactIndex(), max_age=3600, interval=0.01).start()
+        try:
+            deadline = time.time() + 5
+            while os.path.exists(path) and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            janitor.stop()
+        assert not os.path.exists(path)
+
+    def test_generated_files_are_indexed(self, client, test_app):
+        """生成したファイルが索引に登録されるテスト"""
+        from app import artifact_index
+        client.post('/generate_music', data={'scale': 'major', 'base_note': '60'})
+        with client.session_transaction() as session:
+            midi_file = os.path.abspath(session['midi_file'])
+        assert midi_file in [path for _, _, path in artifact_index.snapshot()]
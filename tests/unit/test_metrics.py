@@ -0,0 +1,86 @@
+"""
+所要時間計測のユニットテスト
+"""
+import pytest
+from metrics import Histogram, LabeledHistogram, TimedSessionInterface, render_gauges
+
+
+@pytest.mark.unit
+class TestHistogram:
+    """Histogram テストクラス"""
+
+    def test_cumulative_counts(self):
+        """累積カウント・合計・件数のテスト"""
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        cumulative, total, count = histogram.snapshot()
+        assert cumulative == [2, 3, 4]  # le=0.1, le=1.0, +Inf
+        assert total == pytest.approx(2.65)
+        assert count == 4
+
+
+@pytest.mark.unit
+class TestLabeledHistogram:
+    """LabeledHistogram テストクラス"""
+
+    def test_prometheus_format(self):
+        """Prometheus テキスト形式のテスト"""
+        histogram = LabeledHistogram('test_seconds', 'Test.', 'stage', buckets=(0.5,))
+        histogram.observe('parse', 0.25)
+        histogram.observe('generation', 1.0)
+        assert histogram.render() == [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{stage="generation",le="0.5"} 0',
+            'test_seconds_bucket{stage="generation",le="+Inf"} 1',
+            'test_seconds_sum{stage="generation"} 1.0',
+            'test_seconds_count{stage="generation"} 1',
+            'test_seconds_bucket{stage="parse",le="0.5"} 1',
+            'test_seconds_bucket{stage="parse",le="+Inf"} 1',
+            'test_seconds_sum{stage="parse"} 0.25',
+            'test_seconds_count{stage="parse"} 1',
+        ]
+
+    def test_label_escaping(self):
+        """ラベル値のエスケープのテスト"""
+        histogram = LabeledHistogram('test_seconds', 'Test.', 'endpoint', buckets=(1.0,))
+        histogram.observe('a"b', 0.1)
+        assert 'test_seconds_count{endpoint="a\\"b"} 1' in histogram.render()
+
+    def test_time_records_on_exception(self):
+        """例外が発生しても時間を記録するテスト"""
+        histogram = LabeledHistogram('test_seconds', 'Test.', 'stage')
+        with pytest.raises(RuntimeError):
+            with histogram.time('render'):
+                raise RuntimeError
+        assert histogram.snapshot('render')[2] == 1
+        assert histogram.snapshot('parse') is None
+
+
+@pytest.mark.unit
+class TestRenderGauges:
+    """render_gauges テストクラス"""
+
+    def test_skips_none(self):
+        """None の値を出力しないテスト"""
+        lines = render_gauges('janitor', {'runs': 3, 'last_run': None})
+        assert lines == ['# TYPE janitor_runs gauge', 'janitor_runs 3.0']
+
+
+@pytest.mark.unit
+class TestTimedSessionInterface:
+    """TimedSessionInterface テストクラス"""
+
+    def test_times_open_and_save(self, mocker):
+        """読み込み・書き込みの時間を記録し、それ以外は委譲するテスト"""
+        inner = mocker.Mock()
+        histogram = LabeledHistogram('test_seconds', 'Test.', 'stage')
+        interface = TimedSessionInterface(inner, histogram)
+        interface.open_session('app', 'request')
+        interface.save_session('app', 'session', 'response')
+        interface.is_null_session('session')
+        inner.save_session.assert_called_once_with('app', 'session', 'response')
+        inner.is_null_session.assert_called_once_with('session')
+        assert histogram.snapshot('session_open')[2] == 1
+        assert histogram.snapshot('session_write')[2] == 1
@@ -4,7 +4,7 @@ MIDI生成関数のユニットテスト
 import pytest
 import os
 from mido import MidiFile
-from app import generate_random_midi, app
+from app import generate_random_midi, generate_random_midi_bytes, parse_midi, app
 
 
 @pytest.mark.unit
@@ -135,3 +135,33 @@ class TestGenerateRandomMidi:
             
             os.remove(midi_file1)
             os.remove(midi_file2)
+
+
+@pytest.mark.unit
+class TestGenerateRandomMidiBytes:
+    """メモリ上のMIDI生成関数テストクラス"""
+
+    def test_returns_smf_bytes_and_notes(self, test_app):
+        """SMFバイト列とノート一覧を返すテスト"""
+        with test_app.app_context():
+            midi_bytes, notes = generate_random_midi_bytes("major", 60)
+            assert isinstance(midi_bytes, bytes)
+            assert midi_bytes.startswith(b'MThd')
+            assert 10 <= len(notes) <= 30
+
+    def test_does_not_write_files(self, test_app):
+        """UPLOAD_FOLDERにファイルを作成しないテスト"""
+        with test_app.app_context():
+            before = set(os.listdir(test_app.config['UPLOAD_FOLDER']))
+            generate_random_midi_bytes("minor", 48)
+            after = set(os.listdir(test_app.config['UPLOAD_FOLDER']))
+            assert before == after
+
+    def test_notes_match_parse_midi(self, test_app, temp_dir):
+        """イベントから導出したノートがparse_midiの結果と一致するテスト"""
+        with test_app.app_context():
+            midi_bytes, notes = generate_random_midi_bytes("major", 60)
+            path = os.path.join(temp_dir, "buffer.mid")
+            with open(path, 'wb') as f:
+                f.write(midi_bytes)
+            assert parse_midi(path) == notes
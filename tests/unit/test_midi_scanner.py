@@ -0,0 +1,168 @@
+"""
+SMFノートスキャナのユニットテスト
+"""
+import pytest
+import io
+import random
+import mido
+from app import (scan_midi_notes, build_note_timeline, sequence_timeline, timeline_notation,
+                 NoteEvent, playback_events, notetoname, noteduration, generate_random_midi_bytes)
+
+
+def timeline_with_mido(data):
+    """mido で絶対ティックを数えて note_on/note_off を対応付ける"""
+    mid = mido.MidiFile(file=io.BytesIO(data))
+    timeline = []
+    for track in mid.tracks:
+        tick = 0
+        open_notes = {}
+        for msg in track:
+            tick += msg.time
+            if msg.type == 'note_on' and msg.velocity:
+                open_notes.setdefault((msg.channel, msg.note), []).append((tick, msg.velocity))
+            elif msg.type in ('note_on', 'note_off') and open_notes.get((msg.channel, msg.note)):
+                start, velocity = open_notes[(msg.channel, msg.note)].pop(0)
+                timeline.append(NoteEvent(msg.note, msg.note // 12 - 1, start, tick - start, velocity))
+    return sorted(timeline, key=lambda event: event.start)
+
+
+def parse_with_mido(data):
+    return [f'{notetoname(e.pitch)}/{e.octave},{noteduration(e.duration)}' for e in timeline_with_mido(data)]
+
+
+def build_file(*tracks):
+    """トラックのバイト列からSMFを組み立てる"""
+    data = b'MThd' + (6).to_bytes(4, 'big') + bytes([0, 1, 0, len(tracks), 1, 0xE0])
+    for track in tracks:
+        data += b'MTrk' + len(track).to_bytes(4, 'big') + track
+    return data
+
+
+def build_midi(rng, num_tracks=2):
+    """メタ・SysEx・各種チャンネルメッセージを含むMIDIを作る"""
+    mid = mido.MidiFile()
+    for _ in range(num_tracks):
+        track = mido.MidiTrack()
+        mid.tracks.append(track)
+        track.append(mido.MetaMessage('track_name', name='melody', time=0))
+        track.append(mido.MetaMessage('set_tempo', tempo=500000, time=0))
+        track.append(mido.Message('sysex', data=[1, 2, 3], time=0))
+        for _ in range(rng.randint(5, 20)):
+            note = rng.randint(0, 127)
+            track.append(mido.Message('control_change', control=7, value=100, time=rng.choice([0, 200])))
+            track.append(mido.Message('note_on', note=note, velocity=64, time=0))
+            track.append(mido.Message('pitchwheel', pitch=rng.randint(-8192, 8191), time=0))
+            track.append(mido.Message('aftertouch', value=10, time=0))
+            track.append(mido.Message('note_off', note=note, velocity=0,
+                                      time=rng.choice([120, 240, 480, 1000, 20000])))
+    buffer = io.BytesIO()
+    mid.save(file=buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+class TestScanMidiNotes:
+    """scan_midi_notes テストクラス"""
+
+    def test_matches_mido_for_generated_midi(self):
+        """生成したMIDIで mido と同じ結果になるテスト"""
+        for _ in range(20):
+            midi_bytes, notes = generate_random_midi_bytes('major', 60)
+            assert scan_midi_notes(midi_bytes) == parse_with_mido(midi_bytes) == notes
+
+    def test_matches_mido_with_meta_and_sysex(self):
+        """メタイベント・SysEx・複数トラックを含むMIDIのテスト"""
+        rng = random.Random(0)
+        for _ in range(20):
+            data = build_midi(rng, num_tracks=rng.randint(1, 3))
+            assert build_note_timeline(data) == timeline_with_mido(data)
+            assert scan_midi_notes(data) == parse_with_mido(data)
+
+    def test_running_status(self):
+        """ランニングステータスのテスト"""
+        track = bytes([
+            0x00, 0x90, 60, 64,   # note_on
+            0x00, 62, 64,         # note_on（ランニングステータス）
+            0x83, 0x60, 0x80, 60, 0,  # note_off delta=480
+            0x81, 0x70, 62, 0,    # note_off delta=240（ランニングステータス）
+            0x00, 0xFF, 0x2F, 0x00,
+        ])
+        data = build_file(track)
+        assert build_note_timeline(data) == [NoteEvent(60, 4, 0, 480, 64), NoteEvent(62, 4, 0, 720, 64)]
+        assert scan_midi_notes(data) == ['C/4,w', 'D/4,q'] == parse_with_mido(data)
+
+    def test_skips_unknown_chunks(self):
+        """MTrk 以外のチャンクを読み飛ばすテスト"""
+        midi_bytes, notes = generate_random_midi_bytes('minor', 57)
+        header, tracks = midi_bytes[:14], midi_bytes[14:]
+        data = header + b'XFIH' + (3).to_bytes(4, 'big') + b'abc' + tracks
+        assert scan_midi_notes(data) == notes
+
+    @pytest.mark.parametrize("data", [
+        b'',
+        b'not a midi file',
+        b'MThd' + (6).to_bytes(4, 'big') + bytes([0, 1, 0, 1, 1, 0xE0]),
+    ])
+    def test_invalid_data_raises(self, data):
+        """不正なデータで例外が発生するテスト"""
+        with pytest.raises(ValueError):
+            scan_midi_notes(data)
+
+    def test_truncated_track_raises(self):
+        """途中で切れたトラックで例外が発生するテスト"""
+        midi_bytes, _ = generate_random_midi_bytes('major', 60)
+        with pytest.raises((ValueError, IndexError)):
+            scan_midi_notes(midi_bytes[:-10])
+
+
+@pytest.mark.unit
+class TestNoteTimeline:
+    """build_note_timeline / sequence_timeline テストクラス"""
+
+    def test_octave_from_pitch(self):
+        """音域に応じたオクターブのテスト"""
+        timeline = sequence_timeline([24, 59, 60, 72, 108], [64] * 5, [120] * 5)
+        assert [e.octave for e in timeline] == [1, 3, 4, 5, 8]
+        assert timeline_notation(timeline) == ['C/1,q', 'B/3,q', 'C/4,q', 'C/5,q', 'C/8,q']
+
+    def test_sequence_start_ticks(self):
+        """生成したノート列の開始ティックが累積されるテスト"""
+        timeline = sequence_timeline([60, 62, 64], [50, 60, 70], [120, 240, 480])
+        assert [(e.start, e.duration, e.velocity) for e in timeline] == [(0, 120, 50), (120, 240, 60), (360, 480, 70)]
+
+    def test_generated_notes_match_parsed_timeline(self):
+        """生成時の notes と解析結果が一致するテスト"""
+        for base_note in (36, 60, 84):
+            midi_bytes, notes = generate_random_midi_bytes('major', base_note)
+            assert scan_midi_notes(midi_bytes) == notes
+
+    def test_overlapping_notes(self):
+        """重なった音の長さを絶対ティックで求めるテスト"""
+        track = bytes([
+            0x00, 0x90, 60, 80,      # C4 on @0
+            0x78, 0x90, 64, 70,      # E4 on @120
+            0x78, 0x80, 60, 0,       # C4 off @240
+            0x83, 0x60, 0x90, 64, 0, # E4 off @720（ベロシティ0の note_on）
+            0x00, 0xFF, 0x2F, 0x00,
+        ])
+        data = build_file(track)
+        assert build_note_timeline(data) == [NoteEvent(60, 4, 0, 240, 80), NoteEvent(64, 4, 120, 600, 70)]
+        assert scan_midi_notes(data) == ['C/4,h', 'E/4,q']
+
+    def test_tracks_merged_by_start(self):
+        """複数トラックのノートが開始ティック順に並ぶテスト"""
+        track1 = bytes([0x83, 0x60, 0x90, 72, 90, 0x78, 0x80, 72, 0, 0x00, 0xFF, 0x2F, 0x00])
+        track2 = bytes([0x00, 0x90, 48, 60, 0x81, 0x70, 0x80, 48, 0, 0x00, 0xFF, 0x2F, 0x00])
+        data = build_file(track1, track2)
+        assert build_note_timeline(data) == [NoteEvent(48, 3, 0, 240, 60), NoteEvent(72, 5, 480, 120, 90)]
+
+    def test_unterminated_note_closed_at_track_end(self):
+        """note_off のない音はトラック末尾で閉じるテスト"""
+        track = bytes([0x00, 0x90, 60, 64, 0x83, 0x60, 0xFF, 0x2F, 0x00])
+        assert build_note_timeline(build_file(track)) == [NoteEvent(60, 4, 0, 480, 64)]
+
+    def test_playback_events_in_seconds(self):
+        """ティックを秒に変換した再生イベントのテスト（既定テンポ120BPM）"""
+        timeline = sequence_timeline([60, 64], [50, 90], [480, 240])
+        assert playback_events(timeline) == [[60, 0.0, 0.5, 50], [64, 0.5, 0.25, 90]]
+        assert playback_events(timeline, tempo=1_000_000) == [[60, 0.0, 1.0, 50], [64, 1.0, 0.5, 90]]
@@ -0,0 +1,71 @@
+"""
+レンダリング結果キャッシュのユニットテスト
+"""
+import pytest
+import os
+import time
+from render_cache import RenderCache
+
+
+def write_entry(cache, key, size, mtime):
+    cache.ensure_directory()
+    path = cache.path_for(key)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.mark.unit
+class TestRenderCache:
+    """RenderCache テストクラス"""
+
+    def test_key_depends_on_bytes_and_settings(self):
+        """キーがMIDIバイト列と設定に依存するテスト"""
+        key = RenderCache.make_key(b'abc', sample_rate=44100)
+        assert key == RenderCache.make_key(b'abc', sample_rate=44100)
+        assert key != RenderCache.make_key(b'abd', sample_rate=44100)
+        assert key != RenderCache.make_key(b'abc', sample_rate=22050)
+
+    def test_lookup_miss_and_hit(self, temp_dir):
+        """未登録でNone、登録済みでパスを返すテスト"""
+        cache = RenderCache(os.path.join(temp_dir, 'cache'), 1024)
+        assert cache.lookup('k') is None
+        path = write_entry(cache, 'k', 10, time.time())
+        assert cache.lookup('k') == path
+
+    def test_lookup_refreshes_mtime(self, temp_dir):
+        """ヒット時に最終利用時刻が更新されるテスト"""
+        cache = RenderCache(temp_dir, 1024)
+        path = write_entry(cache, 'k', 10, 1000)
+        cache.lookup('k')
+        assert os.path.getmtime(path) > 1000
+
+    def test_evict_removes_least_recently_used(self, temp_dir):
+        """容量超過時に古いものから削除されるテスト"""
+        cache = RenderCache(temp_dir, 250)
+        old = write_entry(cache, 'old', 100, 1000)
+        mid = write_entry(cache, 'mid', 100, 2000)
+        new = write_entry(cache, 'new', 100, 3000)
+        assert cache.evict() == 100
+        assert not os.path.exists(old)
+        assert os.path.exists(mid) and os.path.exists(new)
+        assert cache.size() == 200
+
+    def test_evict_under_limit_is_noop(self, temp_dir):
+        """容量内であれば削除しないテスト"""
+        cache = RenderCache(temp_dir, 1024)
+        write_entry(cache, 'a', 100, 1000)
+        assert cache.evict() == 0
+
+    def test_missing_directory(self, temp_dir):
+        """ディレクトリが無くてもエラーにならないテスト"""
+        cache = RenderCache(os.path.join(temp_dir, 'missing'), 1024)
+        assert cache.size() == 0
+        assert cache.evict() == 0
+
+    def test_contains(self, temp_dir):
+        """キャッシュ内のパス判定テスト"""
+        cache = RenderCache(os.path.join(temp_dir, 'cache'), 1024)
+        assert cache.contains(cache.path_for('k'))
+        assert not cache.contains(os.path.join(temp_dir, 'other.wav'))
@@ -0,0 +1,186 @@
+"""
+レンダリングキューのユニットテスト
+"""
+import pytest
+import os
+import subprocess
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from render_queue import (
+    RenderQueue, render_with_timidity, render_coalesced,
+    STATUS_DONE, STATUS_FAILED, STATUS_QUEUED,
+)
+from app import ArtifactReadiness
+
+
+def fake_render(midi_path, output_path):
+    """MIDIの内容をそのまま出力するテスト用レンダラー"""
+    with open(midi_path, 'rb') as src, open(output_path, 'wb') as dst:
+        dst.write(src.read())
+    return output_path
+
+
+def failing_render(midi_path, output_path):
+    raise RuntimeError("render failed")
+
+
+@pytest.fixture
+def queue():
+    render_queue = RenderQueue(executor=ThreadPoolExecutor(max_workers=1), readiness=ArtifactReadiness())
+    yield render_queue
+    render_queue.shutdown()
+
+
+@pytest.mark.unit
+class TestRenderQueue:
+    """RenderQueue テストクラス"""
+
+    def test_submit_returns_job_id(self, queue, temp_midi_file, temp_dir):
+        """job_id を返すテスト"""
+        job_id = queue.submit(fake_render, temp_midi_file, os.path.join(temp_dir, 'out.wav'))
+        assert isinstance(job_id, str)
+        assert queue.status(job_id) is not None
+
+    def test_job_completes(self, queue, temp_midi_file, temp_dir):
+        """ジョブが完了し出力ファイルが作られるテスト"""
+        output = os.path.join(temp_dir, 'out.wav')
+        job_id = queue.submit(fake_render, temp_midi_file, output)
+        queue.get(job_id).future.result(timeout=5)
+        assert queue.status(job_id)['status'] == STATUS_DONE
+        assert os.path.exists(output)
+
+    def test_failed_job_reports_error(self, queue, temp_midi_file, temp_dir):
+        """失敗したジョブがエラーを報告するテスト"""
+        job_id = queue.submit(failing_render, temp_midi_file, os.path.join(temp_dir, 'out.wav'))
+        queue.get(job_id).future.exception(timeout=5)
+        status = queue.status(job_id)
+        assert status['status'] == STATUS_FAILED
+        assert 'render failed' in status['error']
+
+    def test_unknown_job_returns_none(self, queue):
+        """存在しない job_id で None を返すテスト"""
+        assert queue.status('missing') is None
+
+    def test_readiness_signalled_on_completion(self, temp_midi_file, temp_dir):
+        """完了時に成果物の準備完了が通知されるテスト"""
+        readiness = ArtifactReadiness()
+        gate = threading.Event()
+
+        def gated_render(midi_path, output_path):
+            gate.wait(5)
+            return fake_render(midi_path, output_path)
+
+        render_queue = RenderQueue(executor=ThreadPoolExecutor(max_workers=1), readiness=readiness)
+        output = os.path.join(temp_dir, 'out.wav')
+        render_queue.submit(gated_render, temp_midi_file, output)
+        assert readiness.is_pending(output)
+        gate.set()
+        assert readiness.wait(output, timeout=5)
+        assert os.path.exists(output)
+        render_queue.shutdown()
+
+    def test_cancel_queued_job(self, temp_midi_file, temp_dir):
+        """未実行のジョブを取り消せるテスト"""
+        gate = threading.Event()
+        render_queue = RenderQueue(executor=ThreadPoolExecutor(max_workers=1), readiness=ArtifactReadiness())
+        render_queue.submit(lambda m, o: gate.wait(5), temp_midi_file, os.path.join(temp_dir, 'a.wav'))
+        job_id = render_queue.submit(fake_render, temp_midi_file, os.path.join(temp_dir, 'b.wav'))
+        assert render_queue.status(job_id)['status'] == STATUS_QUEUED
+        assert render_queue.cancel(job_id)
+        assert render_queue.status(job_id)['status'] == STATUS_FAILED
+        gate.set()
+        render_queue.shutdown()
+
+    def test_process_pool_executor(self, temp_midi_file, temp_dir):
+        """デフォルトのプロセスプールで実行できるテスト"""
+        render_queue = RenderQueue(max_workers=1)
+        output = os.path.join(temp_dir, 'out.wav')
+        job_id = render_queue.submit(fake_render, temp_midi_file, output)
+        render_queue.get(job_id).future.result(timeout=30)
+        assert os.path.exists(output)
+        render_queue.shutdown()
+
+
+@pytest.mark.unit
+class TestRenderWithTimidity:
+    """Timidity レンダラーテストクラス"""
+
+    def test_invokes_timidity(self, mocker, temp_dir):
+        """timidity を呼び出し、出力をリネームするテスト"""
+        output = os.path.join(temp_dir, 'out.wav')
+
+        def fake_run(cmd, **kwargs):
+            with open(cmd[-1], 'wb') as f:
+                f.write(b'RIFF')
+            return subprocess.CompletedProcess(cmd, 0, b'', b'')
+
+        run = mocker.patch('render_queue.subprocess.run', side_effect=fake_run)
+        assert render_with_timidity('in.mid', output) == output
+        assert run.call_args[0][0][:4] == ['timidity', 'in.mid', '-Ow', '-s']
+        assert os.path.exists(output)
+        assert os.listdir(temp_dir) == ['out.wav']
+
+    def test_temp_file_is_unique_per_job(self, mocker, temp_dir):
+        """同じ出力先でもジョブごとに別の一時ファイルに書くテスト"""
+        output = os.path.join(temp_dir, 'out.wav')
+        temp_paths = []
+
+        def fake_run(cmd, **kwargs):
+            temp_paths.append(cmd[-1])
+            with open(cmd[-1], 'wb') as f:
+                f.write(b'RIFF')
+            return subprocess.CompletedProcess(cmd, 0, b'', b'')
+
+        mocker.patch('render_queue.subprocess.run', side_effect=fake_run)
+        render_with_timidity('in.mid', output)
+        render_with_timidity('in.mid', output)
+        assert len(set(temp_paths)) == 2
+        assert all(path.startswith(output + '.') and path.endswith('.part') for path in temp_paths)
+
+    def test_raises_on_error(self, mocker, temp_dir):
+        """timidity が失敗した場合に例外を送出するテスト"""
+        mocker.patch('render_queue.subprocess.run',
+                     return_value=subprocess.CompletedProcess([], 1, b'', b'bad midi'))
+        with pytest.raises(RuntimeError, match='bad midi'):
+            render_with_timidity('in.mid', os.path.join(temp_dir, 'out.wav'))
+
+
+def slow_counting_render(midi_path, output_path, counter):
+    """呼び出し回数を counter に追記してから出力するテスト用レンダラー"""
+    with open(counter, 'a') as f:
+        f.write('x')
+    time.sleep(0.2)
+    return fake_render(midi_path, output_path)
+
+
+@pytest.mark.unit
+class TestRenderCoalesced:
+    """render_coalesced テストクラス"""
+
+    def test_concurrent_jobs_render_once(self, temp_midi_file, temp_dir):
+        """同じ出力先への同時ジョブが1回のレンダリングにまとまるテスト"""
+        output = os.path.join(temp_dir, 'out.wav')
+        counter = os.path.join(temp_dir, 'counter')
+        lock_dir = os.path.join(temp_dir, 'locks')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(render_coalesced, temp_midi_file, output, renderer=slow_counting_render,
+                                       lock_dir=lock_dir, counter=counter) for _ in range(4)]
+            assert all(future.result(timeout=10) == output for future in futures)
+        with open(counter) as f:
+            assert f.read() == 'x'
+
+    def test_concurrent_processes_render_once(self, temp_midi_file, temp_dir):
+        """別プロセスのジョブも1回のレンダリングにまとまるテスト"""
+        output = os.path.join(temp_dir, 'out.wav')
+        counter = os.path.join(temp_dir, 'counter')
+        lock_dir = os.path.join(temp_dir, 'locks')
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=3, mp_context=context) as executor:
+            futures = [executor.submit(render_coalesced, temp_midi_file, output, renderer=slow_counting_render,
+                                       lock_dir=lock_dir, counter=counter) for _ in range(3)]
+            assert all(future.result(timeout=10) == output for future in futures)
+        with open(counter) as f:
+            assert f.read() == 'x'
+        assert not [name for name in os.listdir(temp_dir) if name.endswith('.part')]
@@ -0,0 +1,134 @@
+"""
+常駐レンダリングワーカーのユニットテスト
+"""
+import pytest
+import os
+import multiprocessing
+from concurrent.futures import CancelledError
+from renderer_pool import RendererPool
+from synth import render_with_synth, warm_synthesizer
+
+_initialized = []
+_retained = []
+
+
+def initialize(value):
+    _initialized.append(value)
+
+
+def initialized():
+    return list(_initialized)
+
+
+def worker_pid():
+    return os.getpid()
+
+
+def fail():
+    raise ValueError("render failed")
+
+
+def crash():
+    os._exit(3)
+
+
+def grow(size):
+    _retained.append(b'\x01' * size)
+    return os.getpid()
+
+
+def make_pool(**kwargs):
+    return RendererPool(mp_context=multiprocessing.get_context('fork'), **kwargs)
+
+
+@pytest.fixture
+def pool():
+    renderer_pool = make_pool(size=1, initializer=initialize, initargs=('warm',), max_jobs=3)
+    yield renderer_pool
+    renderer_pool.shutdown()
+
+
+@pytest.mark.unit
+class TestRendererPool:
+    """RendererPool テストクラス"""
+
+    def test_runs_in_worker_process(self, pool):
+        """ジョブが別プロセスで実行されるテスト"""
+        assert pool.submit(worker_pid).result(timeout=10) != os.getpid()
+
+    def test_initializer_runs_once_per_worker(self, pool):
+        """初期化がワーカー起動時に1回だけ実行されるテスト"""
+        assert pool.submit(initialized).result(timeout=10) == ['warm']
+        assert pool.submit(initialized).result(timeout=10) == ['warm']
+
+    def test_worker_is_reused(self, pool):
+        """同じワーカーが続けてジョブを処理するテスト"""
+        pids = {pool.submit(worker_pid).result(timeout=10) for _ in range(3)}
+        assert len(pids) == 1
+
+    def test_recycled_after_max_jobs(self, pool):
+        """max_jobs 件処理したワーカーが作り直されるテスト"""
+        pids = [pool.submit(worker_pid).result(timeout=10) for _ in range(4)]
+        assert len(set(pids[:3])) == 1
+        assert pids[3] != pids[0]
+        assert pool.stats()['workers_recycled'] == 1
+
+    def test_recycled_after_memory_growth(self):
+        """メモリ増加が上限を超えたワーカーが作り直されるテスト"""
+        renderer_pool = make_pool(size=1, max_memory_growth=16 * 1024 * 1024)
+        try:
+            first = renderer_pool.submit(grow, 32 * 1024 * 1024).result(timeout=10)
+            assert renderer_pool.submit(worker_pid).result(timeout=10) != first
+            assert renderer_pool.stats()['workers_recycled'] == 1
+        finally:
+            renderer_pool.shutdown()
+
+    def test_exception_propagates(self, pool):
+        """ジョブの例外が呼び出し元に伝わるテスト"""
+        with pytest.raises(ValueError, match="render failed"):
+            pool.submit(fail).result(timeout=10)
+        assert pool.submit(worker_pid).result(timeout=10)
+
+    def test_crashed_worker_is_replaced(self, pool):
+        """異常終了したワーカーが作り直されるテスト"""
+        with pytest.raises(RuntimeError, match="exited unexpectedly"):
+            pool.submit(crash).result(timeout=10)
+        assert pool.submit(worker_pid).result(timeout=10)
+        stats = pool.stats()
+        assert stats['workers_crashed'] == 1
+        assert stats['workers'] == 1
+
+    def test_submit_after_shutdown(self, pool):
+        """停止後の投入が拒否されるテスト"""
+        pool.shutdown()
+        with pytest.raises(RuntimeError):
+            pool.submit(worker_pid)
+
+    def test_cancel_pending_on_shutdown(self):
+        """停止時に未実行のジョブを取り消せるテスト"""
+        renderer_pool = make_pool(size=1)
+        futures = [renderer_pool.submit(worker_pid) for _ in range(20)]
+        renderer_pool.shutdown(cancel_futures=True)
+        assert all(future.done() for future in futures)
+        for future in futures:
+            if future.cancelled():
+                with pytest.raises(CancelledError):
+                    future.result()
+            else:
+                assert future.result() != os.getpid()
+
+    def test_invalid_size(self):
+        """ワーカー数が0以下ならエラーになるテスト"""
+        with pytest.raises(ValueError):
+            RendererPool(size=0)
+
+    def test_renders_with_warm_synth(self, temp_midi_file, temp_dir):
+        """内蔵シンセサイザーのレンダリングを常駐ワーカーで実行するテスト"""
+        renderer_pool = make_pool(size=1, initializer=warm_synthesizer, initargs=(8000,))
+        try:
+            output = os.path.join(temp_dir, 'out.wav')
+            assert renderer_pool.submit(render_with_synth, temp_midi_file, output, sample_rate=8000).result(timeout=30) == output
+            with open(output, 'rb') as f:
+                assert f.read(4) == b'RIFF'
+        finally:
+            renderer_pool.shutdown()
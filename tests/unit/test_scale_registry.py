@@ -0,0 +1,65 @@
+"""
+スケールレジストリのユニットテスト
+"""
+import pytest
+from app import get_scale_table, register_scale, SCALES, VALID_SCALES
+
+
+@pytest.fixture
+def pentatonic():
+    """テスト用スケールを登録し、終了後に取り除く"""
+    register_scale('pentatonic', [0, 2, 4, 7, 9])
+    yield 'pentatonic'
+    SCALES.pop('pentatonic', None)
+    VALID_SCALES.discard('pentatonic')
+    get_scale_table.cache_clear()
+
+
+@pytest.mark.unit
+class TestScaleRegistry:
+    """スケールレジストリテストクラス"""
+
+    def test_table_is_cached(self):
+        """同じ引数で同じテーブルオブジェクトが返るテスト"""
+        assert get_scale_table('major') is get_scale_table('major')
+
+    def test_weights_sum_to_one(self):
+        """重みの合計が1になるテスト"""
+        table = get_scale_table('minor')
+        assert sum(table.weights) == pytest.approx(1.0)
+        assert table.cumulative[-1] == pytest.approx(1.0)
+
+    def test_in_scale_weight(self):
+        """スケール内の音程に指定の重みが配分されるテスト"""
+        table = get_scale_table('major', 0.8)
+        in_scale = sum(table.weights[i] for i in SCALES['major'])
+        assert in_scale == pytest.approx(0.8)
+
+    def test_unknown_scale_falls_back_to_major(self):
+        """未登録スケールはメジャーとして扱われるテスト"""
+        assert get_scale_table('unknown').weights == get_scale_table('major').weights
+
+    def test_register_scale(self, pentatonic):
+        """登録したスケールのテーブルが使われるテスト"""
+        table = get_scale_table(pentatonic)
+        assert table.weights[0] == pytest.approx(0.95 / 5)
+        assert table.weights[1] == pytest.approx(0.05 / 7)
+
+    def test_registered_scale_accepted_by_endpoint(self, client, pentatonic):
+        """登録したスケールがエンドポイントで受け付けられるテスト"""
+        response = client.post('/generate_music', data={'scale': pentatonic, 'base_note': '60'})
+        assert response.status_code == 200
+
+    def test_register_scale_invalidates_cache(self, pentatonic):
+        """再登録でキャッシュが更新されるテスト"""
+        before = get_scale_table(pentatonic)
+        register_scale(pentatonic, [0, 7])
+        assert get_scale_table(pentatonic) is not before
+        assert get_scale_table(pentatonic).weights[0] == pytest.approx(0.95 / 2)
+
+    @pytest.mark.parametrize("intervals", [[], [12], [-1], ['a'], [0, 'a']])
+    def test_register_scale_rejects_invalid_intervals(self, intervals):
+        """不正な音程の登録を拒否するテスト"""
+        with pytest.raises(ValueError):
+            register_scale('broken', intervals)
+        assert 'broken' not in SCALES
@@ -0,0 +1,77 @@
+"""
+シード指定生成とメモ化のユニットテスト
+"""
+import pytest
+import random
+import app as app_module
+from app import generate_seeded_midi, generate_random_midi_bytes
+
+
+@pytest.mark.unit
+class TestGenerateSeededMidi:
+    """シード指定生成テストクラス"""
+
+    def test_same_seed_same_output(self):
+        """同じシードで同じMIDIとノートになるテスト"""
+        assert generate_seeded_midi('major', 60, 123) == generate_seeded_midi('major', 60, 123)
+
+    def test_different_seed_different_output(self):
+        """異なるシードで異なるMIDIになるテスト"""
+        assert generate_seeded_midi('major', 60, 1)[0] != generate_seeded_midi('major', 60, 2)[0]
+
+    def test_parameters_are_part_of_key(self):
+        """スケール・基準音がキーに含まれるテスト"""
+        assert generate_seeded_midi('major', 60, 7)[0] != generate_seeded_midi('minor', 60, 7)[0]
+        assert generate_seeded_midi('major', 60, 7)[0] != generate_seeded_midi('major', 48, 7)[0]
+
+    def test_does_not_consume_global_random(self):
+        """グローバルな乱数状態に影響しないテスト"""
+        random.seed(99)
+        expected = generate_random_midi_bytes('major', 60)
+        random.seed(99)
+        generate_seeded_midi('major', 60, 5555)
+        assert generate_random_midi_bytes('major', 60) == expected
+
+    def test_result_is_memoized(self, mocker):
+        """2回目以降は再生成されないテスト"""
+        app_module._generate_seeded_midi.cache_clear()
+        build = mocker.spy(app_module, '_build_random_midi')
+        generate_seeded_midi('minor', 48, 42)
+        generate_seeded_midi('minor', 48, 42)
+        assert build.call_count == 1
+
+    def test_returned_notes_are_independent(self):
+        """返されたノート一覧を変更してもメモに影響しないテスト"""
+        _, notes = generate_seeded_midi('major', 60, 77)
+        notes.clear()
+        assert len(generate_seeded_midi('major', 60, 77)[1]) > 0
+
+
+@pytest.mark.integration
+class TestSeedParameter:
+    """/generate_music の seed パラメータテストクラス"""
+
+    def test_seeded_requests_are_reproducible(self, client):
+        """同じシードで同じノートが返るテスト"""
+        data = {'scale': 'major', 'base_note': '60', 'seed': '2024'}
+        first = client.post('/generate_music', data=data).get_json()
+        second = client.post('/generate_music', data=data).get_json()
+        assert first['notes'] == second['notes']
+        assert first['seed'] == 2024
+
+    def test_seeded_download_matches_memo(self, client):
+        """ダウンロードされるMIDIがメモの内容と一致するテスト"""
+        client.post('/generate_music', data={'scale': 'minor', 'base_note': '48', 'seed': '9'})
+        response = client.get('/download/midi')
+        assert response.data == generate_seeded_midi('minor', 48, 9)[0]
+
+    def test_seeded_in_memory_mode(self, memory_client):
+        """メモリ保持モードでもシードが使われるテスト"""
+        response = memory_client.post('/generate_music', data={'scale': 'major', 'base_note': '60', 'seed': '3'})
+        assert response.get_json()['notes'] == generate_seeded_midi('major', 60, 3)[1]
+
+    @pytest.mark.parametrize("seed", ['abc', '-1', str(2 ** 32), '1.5'])
+    def test_invalid_seed(self, client, seed):
+        """不正なシードで400のテスト"""
+        response = client.post('/generate_music', data={'scale': 'major', 'base_note': '60', 'seed': seed})
+        assert response.status_code == 400
@@ -0,0 +1,118 @@
+"""
+single-flight のユニットテスト
+"""
+import pytest
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from singleflight import SingleFlight
+
+
+def slow_compute(calls, value='result', delay=0.2):
+    def compute():
+        calls.append(1)
+        time.sleep(delay)
+        return value
+    return compute
+
+
+def render_once(lock_dir, output, counter):
+    """出力が無ければ作る（別プロセスで実行）"""
+    def compute():
+        with open(counter, 'a') as f:
+            f.write('x')
+        time.sleep(0.3)
+        with open(output, 'w') as f:
+            f.write('audio')
+        return output
+    SingleFlight(lock_dir).do('key', compute, lookup=lambda: output if os.path.exists(output) else None)
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """SingleFlight テストクラス"""
+
+    def test_concurrent_calls_share_one_computation(self):
+        """同じキーの同時呼び出しが1回の実行を共有するテスト"""
+        flight = SingleFlight()
+        calls = []
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: flight.do('key', slow_compute(calls)), range(8)))
+        assert len(calls) == 1
+        assert all(value == 'result' for value, _ in results)
+        assert sum(shared for _, shared in results) == 7
+        assert flight.in_flight() == 0
+
+    def test_different_keys_run_separately(self):
+        """異なるキーはそれぞれ実行されるテスト"""
+        flight = SingleFlight()
+        calls = []
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda i: flight.do(i, slow_compute(calls, delay=0.05)), range(4)))
+        assert len(calls) == 4
+
+    def test_sequential_calls_recompute(self):
+        """完了後の呼び出しは結果をキャッシュせず再実行するテスト"""
+        flight = SingleFlight()
+        calls = []
+        flight.do('key', slow_compute(calls, delay=0))
+        flight.do('key', slow_compute(calls, delay=0))
+        assert len(calls) == 2
+
+    def test_error_is_shared(self):
+        """実行中の例外が待っていた呼び出しにも伝わるテスト"""
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def compute():
+            started.set()
+            time.sleep(0.2)
+            raise RuntimeError("render failed")
+
+        def follower():
+            started.wait()
+            try:
+                flight.do('key', lambda: 'unused')
+            except RuntimeError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=follower)
+        thread.start()
+        with pytest.raises(RuntimeError):
+            flight.do('key', compute)
+        thread.join()
+        assert len(errors) == 1
+        assert flight.in_flight() == 0
+
+    def test_lookup_skips_computation(self, temp_dir):
+        """lookup が結果を返せば実行しないテスト"""
+        flight = SingleFlight(os.path.join(temp_dir, 'locks'))
+        calls = []
+        assert flight.do('key', slow_compute(calls), lookup=lambda: 'cached') == ('cached', True)
+        assert calls == []
+
+    def test_lock_files_are_striped(self, temp_dir):
+        """ロックファイル数が lock_stripes を超えないテスト"""
+        lock_dir = os.path.join(temp_dir, 'locks')
+        flight = SingleFlight(lock_dir, lock_stripes=4)
+        for i in range(50):
+            flight.do(f'key-{i}', lambda: i)
+        assert 0 < len(os.listdir(lock_dir)) <= 4
+
+    def test_coalesces_across_processes(self, temp_dir):
+        """別プロセスの同時実行も1回にまとめるテスト"""
+        context = multiprocessing.get_context('fork')
+        lock_dir = os.path.join(temp_dir, 'locks')
+        output = os.path.join(temp_dir, 'out.wav')
+        counter = os.path.join(temp_dir, 'counter')
+        processes = [context.Process(target=render_once, args=(lock_dir, output, counter)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(10)
+            assert process.exitcode == 0
+        with open(counter) as f:
+            assert f.read() == 'x'
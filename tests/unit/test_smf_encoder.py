@@ -0,0 +1,73 @@
+"""
+SMFエンコーダのユニットテスト
+"""
+import pytest
+import io
+import random
+import mido
+from app import encode_smf, generate_batch
+
+
+def encode_with_mido(pitches, velocities, durations, program=0):
+    """従来の mido によるエンコード"""
+    mid = mido.MidiFile()
+    track = mido.MidiTrack()
+    mid.tracks.append(track)
+    track.append(mido.Message('program_change', program=program, time=0))
+    for note, velocity, duration in zip(pitches, velocities, durations):
+        track.append(mido.Message('note_on', note=note, velocity=velocity, time=0))
+        track.append(mido.Message('note_off', note=note, velocity=0, time=duration))
+    buffer = io.BytesIO()
+    mid.save(file=buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+class TestEncodeSmf:
+    """encode_smf テストクラス"""
+
+    def test_byte_identical_to_mido(self):
+        """mido と同じバイト列になるテスト"""
+        rng = random.Random(0)
+        for _ in range(50):
+            n = rng.randint(10, 30)
+            pitches = [rng.randint(24, 108) for _ in range(n)]
+            velocities = [rng.randint(40, 100) for _ in range(n)]
+            durations = [rng.choice([120, 240, 480]) for _ in range(n)]
+            assert encode_smf(pitches, velocities, durations) == encode_with_mido(pitches, velocities, durations)
+
+    @pytest.mark.parametrize("duration", [0, 127, 128, 16383, 16384, 0x0FFFFFFF])
+    def test_variable_length_delta_times(self, duration):
+        """可変長デルタタイムの境界値テスト"""
+        assert encode_smf([60], [64], [duration]) == encode_with_mido([60], [64], [duration])
+
+    def test_empty_melody(self):
+        """ノートなしでも mido と一致するテスト"""
+        assert encode_smf([], [], []) == encode_with_mido([], [], [])
+
+    def test_program(self):
+        """音色指定のテスト"""
+        assert encode_smf([60], [64], [120], program=40) == encode_with_mido([60], [64], [120], program=40)
+
+    def test_readable_by_mido(self):
+        """mido で読み込めるテスト"""
+        midi = mido.MidiFile(file=io.BytesIO(encode_smf([60, 64], [80, 90], [120, 480])))
+        notes = [msg.note for msg in midi.tracks[0] if msg.type == 'note_on']
+        assert notes == [60, 64]
+
+    def test_encodes_batch_melodies(self):
+        """バッチ生成したNumPy配列をエンコードできるテスト"""
+        melody = generate_batch('major', 60, 1, seed=1)[0]
+        expected = encode_with_mido(melody['pitches'].tolist(), melody['velocities'].tolist(), melody['durations'].tolist())
+        assert encode_smf(**melody) == expected
+
+    @pytest.mark.parametrize("pitches,velocities", [([128], [64]), ([-1], [64]), ([60], [128])])
+    def test_out_of_range_values_rejected(self, pitches, velocities):
+        """範囲外の値で ValueError になるテスト"""
+        with pytest.raises(ValueError):
+            encode_smf(pitches, velocities, [120])
+
+    def test_negative_delta_time_rejected(self):
+        """負のデルタタイムで ValueError になるテスト"""
+        with pytest.raises(ValueError):
+            encode_smf([60], [64], [-1])
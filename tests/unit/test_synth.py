@@ -0,0 +1,177 @@
+"""
+内蔵シンセサイザーのユニットテスト
+"""
+import pytest
+import io
+import os
+import wave
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from synth import Synthesizer, render_with_synth, render_midi_segments, wav_header, to_pcm16
+from midi_timeline import NoteEvent
+from app import generate_seeded_midi, sequence_timeline, encode_smf
+
+
+@pytest.fixture(scope='module')
+def synthesizer():
+    return Synthesizer(sample_rate=8000)
+
+
+@pytest.mark.unit
+class TestSynthesizer:
+    """Synthesizer テストクラス"""
+
+    def test_render_midi_is_valid_wav(self, synthesizer):
+        """有効なWAVを返すテスト"""
+        midi_bytes, _ = generate_seeded_midi('major', 60, 1)
+        with wave.open(io.BytesIO(synthesizer.render_midi(midi_bytes))) as reader:
+            assert reader.getframerate() == 8000
+            assert reader.getnchannels() == 1
+            assert reader.getsampwidth() == 2
+            assert reader.getnframes() > 0
+
+    def test_length_includes_release(self, synthesizer):
+        """長さが最後のノートの終わり + リリースになるテスト（120BPM, 480tpb）"""
+        notes = synthesizer.schedule(sequence_timeline([60, 62], [100, 100], [480, 480]))
+        assert notes[1][0] == 4000  # 480ティック = 0.5秒
+        assert synthesizer.total_samples(notes) == 8000 + synthesizer.release
+
+    def test_windows_concatenate_to_full_render(self, synthesizer):
+        """区間ごとの合成をつなげると全体と一致するテスト"""
+        notes = synthesizer.schedule(sequence_timeline([60, 64, 67, 72], [80, 90, 100, 110], [120, 240, 480, 120]))
+        full = synthesizer.render(notes)
+        parts = [synthesizer.render(notes, start, min(start + 777, len(full))) for start in range(0, len(full), 777)]
+        assert np.array_equal(np.concatenate(parts), full)
+
+    def test_envelope_shape(self, synthesizer):
+        """ADSR エンベロープが0から始まり0で終わるテスト"""
+        envelope = synthesizer.envelope(4000)
+        assert len(envelope) == 4000 + synthesizer.release
+        assert envelope[0] == 0
+        assert envelope.max() == pytest.approx(1.0, abs=1e-3)
+        assert envelope[3999] == pytest.approx(synthesizer.sustain, abs=1e-3)
+        assert envelope[-1] == pytest.approx(0.0, abs=1e-3)
+
+    def test_short_note_envelope_released_from_current_level(self, synthesizer):
+        """アタック中に離したノートは、その時点のレベルからリリースするテスト"""
+        held = synthesizer.attack // 2
+        envelope = synthesizer.envelope(held)
+        assert envelope[held] == pytest.approx(0.5, abs=0.01)
+
+    def test_wave_cache_grows(self, synthesizer):
+        """波形キャッシュが必要な長さまで伸びるテスト"""
+        short = synthesizer.wave(69, 100)
+        long = synthesizer.wave(69, 50000)
+        assert len(long) >= 50000
+        assert np.array_equal(long[:100], short[:100])
+
+    def test_velocity_scales_amplitude(self, synthesizer):
+        """ベロシティで音量が変わるテスト"""
+        soft = synthesizer.render(synthesizer.schedule([NoteEvent(60, 4, 0, 480, 32)]))
+        loud = synthesizer.render(synthesizer.schedule([NoteEvent(60, 4, 0, 480, 127)]))
+        assert np.abs(loud).max() > np.abs(soft).max()
+
+    def test_empty_timeline(self, synthesizer):
+        """ノートがなければ空になるテスト"""
+        assert len(synthesizer.render([])) == 0
+
+
+@pytest.mark.unit
+class TestWavEncoding:
+    """WAVエンコードのテスト"""
+
+    def test_header_matches_wave_module(self):
+        """wave モジュールで読めるヘッダのテスト"""
+        samples = np.linspace(-1, 1, 100, dtype=np.float32)
+        data = wav_header(100, 22050) + to_pcm16(samples)
+        with wave.open(io.BytesIO(data)) as reader:
+            assert reader.getnframes() == 100
+            frames = np.frombuffer(reader.readframes(100), dtype='<i2')
+        assert frames[0] == -32767 and frames[-1] == 32767
+
+    def test_render_with_synth_writes_file(self, temp_dir):
+        """レンダラーとしてWAVファイルを書き出すテスト"""
+        midi_path = os.path.join(temp_dir, 'in.mid')
+        output_path = os.path.join(temp_dir, 'out.wav')
+        with open(midi_path, 'wb') as f:
+            f.write(generate_seeded_midi('minor', 48, 2)[0])
+        assert render_with_synth(midi_path, output_path, sample_rate=8000) == output_path
+        with open(output_path, 'rb') as f:
+            assert f.read(4) == b'RIFF'
+        assert sorted(os.listdir(temp_dir)) == ['in.mid', 'out.wav']
+
+
+@pytest.mark.unit
+class TestStreaming:
+    """区間ごとの合成のテスト"""
+
+    def test_chunks_concatenate_to_full_render(self, synthesizer):
+        """チャンクをつなげると全体と一致するテスト"""
+        notes = synthesizer.schedule(sequence_timeline([60, 64, 67, 72, 76], [80] * 5, [120, 480, 240, 120, 480]))
+        full = synthesizer.render(notes)
+        chunks = list(synthesizer.iter_chunks(notes, 500))
+        assert all(len(chunk) == 500 for chunk in chunks[:-1])
+        assert np.array_equal(np.concatenate(chunks), full)
+
+    def test_iter_wav_matches_render_midi(self, synthesizer):
+        """ストリーミングしたWAVが一括合成と同じになるテスト"""
+        midi_bytes, _ = generate_seeded_midi('major', 60, 4)
+        assert b''.join(synthesizer.iter_wav(midi_bytes, 1000)) == synthesizer.render_midi(midi_bytes)
+
+    def test_first_chunk_cost_independent_of_length(self, synthesizer, mocker):
+        """最初のチャンクでは区間にかかるノートだけを合成するテスト"""
+        timeline = sequence_timeline([60] * 1000, [80] * 1000, [480] * 1000)
+        notes = synthesizer.schedule(timeline)
+        render = mocker.spy(synthesizer, 'render')
+        next(synthesizer.iter_chunks(notes, 2000))
+        assert len(render.call_args.args[0]) <= 2
+
+    def test_iter_wav_rejects_invalid_midi(self, synthesizer):
+        """不正なMIDIは呼び出し時に例外になるテスト"""
+        with pytest.raises(ValueError):
+            synthesizer.iter_wav(b'not midi', 1000)
+
+
+def long_midi(count=200):
+    """数分の長さのメロディ"""
+    return encode_smf([48 + i % 36 for i in range(count)], [64 + i % 60 for i in range(count)],
+                      [(120, 240, 480, 960)[i % 4] for i in range(count)])
+
+
+@pytest.mark.unit
+class TestSegmentRendering:
+    """区間ごとの並列合成のテスト"""
+
+    def test_segments_match_full_render(self, synthesizer):
+        """区間ごとに合成してつなげた結果が一括合成と一致するテスト"""
+        midi_bytes = long_midi()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert render_midi_segments(midi_bytes, executor, 8000, sample_rate=8000) == synthesizer.render_midi(midi_bytes)
+
+    def test_segment_count(self, synthesizer, mocker):
+        """全体の長さを区間の長さで割った数だけジョブを投入するテスト"""
+        midi_bytes = long_midi()
+        total = len(synthesizer.render_midi(midi_bytes)) // 2 - 22
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            submit = mocker.spy(executor, 'submit')
+            render_midi_segments(midi_bytes, executor, 8000, sample_rate=8000)
+        assert submit.call_count == -(-total // 8000)
+
+    def test_segment_receives_only_overlapping_notes(self, synthesizer):
+        """区間にかかるノートだけを渡すテスト"""
+        notes = synthesizer.schedule(sequence_timeline([60, 62, 64], [100] * 3, [480] * 3))
+        release = synthesizer.release
+        assert synthesizer.notes_in(notes, 0, 4000) == notes[:1]
+        assert synthesizer.notes_in(notes, 8000 + release - 1, 8000 + release) == notes[1:]
+
+    def test_render_with_synth_uses_executor(self, temp_dir):
+        """executor を渡すと区間に分けて合成したWAVを書き出すテスト"""
+        midi_path = os.path.join(temp_dir, 'long.mid')
+        with open(midi_path, 'wb') as f:
+            f.write(long_midi())
+        serial = render_with_synth(midi_path, os.path.join(temp_dir, 'serial.wav'), sample_rate=8000)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parallel = render_with_synth(midi_path, os.path.join(temp_dir, 'parallel.wav'), sample_rate=8000,
+                                         executor=executor, segment_samples=4000)
+        with open(serial, 'rb') as a, open(parallel, 'rb') as b:
+            assert a.read() == b.read()